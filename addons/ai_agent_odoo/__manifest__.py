@@ -10,16 +10,40 @@
     'license': 'LGPL-3',
     'author': 'Cory Hisey',
     'website': 'https://coryhisey.com',
-    'depends': ['web', 'mail'],  # 'base' is included with 'web', so it's not strictly needed here
+    'depends': ['web', 'bus', 'mail'],  # 'base' is included with 'web', so it's not strictly needed here
+    'data': [
+        'security/ir.model.access.csv',
+        'security/ai_agent_security.xml',
+        'data/ir_cron_data.xml',
+        'views/ai_agent_trace_views.xml',
+    ],
 
     'assets': {
+        # Only the systray button is loaded with every backend page; it loads
+        # the chat bundle the first time the assistant is used.
         'web.assets_backend': [
             # Corrected paths relative to the addon root directory
+            'ai_agent_odoo/static/src/css/ai_agent_systray.css',
+            'ai_agent_odoo/static/src/js/ai_agent_systray.js',
+            'ai_agent_odoo/static/src/xml/ai_agent_systray.xml',
+        ],
+        # The markdown worker, static/src/js/ai_agent_markdown_worker.js, is
+        # loaded by URL and must stay out of the bundles.
+        'ai_agent_odoo.assets_chat': [
+            'ai_agent_odoo/static/src/js/lib/marked.min.js',
+            'ai_agent_odoo/static/src/js/lib/dompurify.min.js',
+            'ai_agent_odoo/static/src/js/ai_agent_markdown_policy.js',
             'ai_agent_odoo/static/src/css/ai_agent.css',
+            'ai_agent_odoo/static/src/js/ai_agent_markdown.js',
             'ai_agent_odoo/static/src/js/ai_agent.js',
             'ai_agent_odoo/static/src/xml/ai_agent.xml',
+        ],
+        'web.assets_unit_tests': [
             'ai_agent_odoo/static/src/js/lib/marked.min.js',
-            'ai_agent_odoo/static/src/js/lib/dompurify.min,js',
+            'ai_agent_odoo/static/src/js/lib/dompurify.min.js',
+            'ai_agent_odoo/static/src/js/ai_agent_markdown_policy.js',
+            'ai_agent_odoo/static/src/js/ai_agent_markdown.js',
+            'ai_agent_odoo/static/tests/**/*',
         ],
     },
     'images': ['static/images/thumbnail.png'],
@@ -1,23 +1,645 @@
 # -*- coding: utf-8 -*-
-from odoo import http
-from odoo.http import request
+import contextlib
+import functools
+import json
+import logging
+import time
+
+import requests
+from werkzeug.exceptions import Forbidden
+
+from odoo import SUPERUSER_ID, api, http, _
+from odoo.api import call_kw
+from odoo.exceptions import AccessError, UserError
+from odoo.http import request, Response
+from odoo.modules.registry import Registry
+from odoo.tools.misc import consteq, str2bool
+
+from ..models.ai_agent_inflight import POLL_INTERVAL
+from ..models.ai_agent_job import LANES
+from ..tools import gateway, metrics, params, tracing
+from ..tools.ratelimit import RateLimitExceeded
+from ..tools.signing import DEFAULT_TOOL_TOKEN_TTL, sign_tool_token
+
+_logger = logging.getLogger(__name__)
+
+TOOL_EXECUTE_ROUTE = '/ai_agent_odoo/tool/execute'
+TOOL_BATCH_ROUTE = '/ai_agent_odoo/tool/batch'
+TOOL_SIMILAR_ROUTE = '/ai_agent_odoo/tool/similar'
+TOOL_SEARCH_ROUTE = '/ai_agent_odoo/tool/search'
+TOOL_RESOLVE_ROUTE = '/ai_agent_odoo/tool/resolve'
+SCHEMA_ROUTE = '/ai_agent_odoo/schema'
+FIELDS_GET_ROUTE = '/ai_agent_odoo/tool/fields_get'
+METRICS_ROUTE = '/ai_agent_odoo/metrics'
+MAX_BATCH_CALLS = 50
+
+# ORM methods the AI service may call through the tool routes. They run with
+# the turn user's access rights, like any call from the web client.
+TOOL_WRITE_METHODS = frozenset(['create', 'write'])
+# The methods whose result depends on the model's records.
+TOOL_READ_METHODS = frozenset(['search', 'search_read', 'search_count', 'read', 'read_group', 'name_search'])
+TOOL_METHODS = TOOL_READ_METHODS | frozenset(['fields_get', 'default_get']) | TOOL_WRITE_METHODS
+
+
+def _sse_event(data, event=None):
+    """Formats a single Server-Sent Event carrying a JSON payload."""
+    chunk = ''
+    if event:
+        chunk += 'event: %s\n' % event
+    chunk += 'data: %s\n\n' % json.dumps(data)
+    return chunk.encode()
+
+
+def _finish_streamed_turn(dbname, uid, context, conversation_id, user_message_id, response, cache_key):
+    """
+    Saves a streamed answer once the stream is over. The request's cursor is
+    already closed by then, so this runs in a transaction of its own.
+    """
+    with Registry(dbname).cursor() as cr:
+        env = api.Environment(cr, uid, context)
+        conversation = env['ai.agent.conversation'].browse(conversation_id)
+        conversation._finish_turn(env['ai.agent.message'].browse(user_message_id), response, cache_key)
+
+
+def _tool_route(tool):
+    """
+    Instruments a tool route: records its latency in the
+    ``ai_agent_tool_call_seconds`` histogram and, when the AI service passes
+    the turn's ``traceparent`` header on, adds its spans to the turn's trace.
+    """
+    def decorator(endpoint):
+        @functools.wraps(endpoint)
+        def wrapper(self, *args, **kwargs):
+            Trace = request.env['ai.agent.trace'].sudo()
+            traceparent = request.httprequest.headers.get('traceparent')
+            trace = Trace._new_trace('tool.%s' % tool, traceparent, cr=request.env.cr) if traceparent else None
+            error = None
+            try:
+                with metrics.timer(request.env.cr.dbname, 'ai_agent_tool_call_seconds', tool=tool), \
+                        tracing.activate(trace):
+                    return endpoint(self, *args, **kwargs)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                if trace:
+                    trace.finish(error)
+                    Trace._save(trace, final=False)
+        return wrapper
+    return decorator
+
+
+def _count_in_flight(dbname, route, value):
+    """
+    Adjusts the ``ai_agent_requests_in_flight`` gauge and publishes it at
+    once, as the worker may not flush its measurements again for a while.
+    """
+    metrics.adjust(dbname, 'ai_agent_requests_in_flight', value, route=route)
+    with Registry(dbname).cursor() as cr:
+        api.Environment(cr, SUPERUSER_ID, {})['ai.agent.metric']._flush()
+
+
+def _close_stream(chunks, callback):
+    try:
+        yield from chunks
+    finally:
+        callback()
+
+
+def _in_flight_route(route):
+    """
+    Counts the requests of a turn route in the ``ai_agent_requests_in_flight``
+    gauge, which tells how many HTTP workers the turns occupy: unlike their
+    database connections, which are idle while the AI service answers. A
+    streamed response is counted until it is sent.
+    """
+    def decorator(endpoint):
+        @functools.wraps(endpoint)
+        def wrapper(self, *args, **kwargs):
+            dbname = request.env.cr.dbname
+            _count_in_flight(dbname, route, 1)
+            done = functools.partial(_count_in_flight, dbname, route, -1)
+            try:
+                response = endpoint(self, *args, **kwargs)
+            except BaseException:
+                done()
+                raise
+            if isinstance(response, Response) and response.is_streamed:
+                response.response = _close_stream(response.response, done)
+            else:
+                done()
+            return response
+        return wrapper
+    return decorator
+
+
+def _resolve_references(value, results):
+    """
+    Replaces ``{"$ref": <index>, "path": "a.b"}`` placeholders in the arguments
+    of a batched call with the result of an earlier call of the same batch.
+
+    The optional dotted ``path`` is applied to every item of list results and
+    flattened, so ``{"$ref": 0, "path": "partner_id"}`` on a ``search_read``
+    result gives the list of partner ids (many2one pairs are reduced to ids).
+    """
+    if isinstance(value, list):
+        return [_resolve_references(item, results) for item in value]
+    if not isinstance(value, dict):
+        return value
+    if '$ref' not in value:
+        return {key: _resolve_references(item, results) for key, item in value.items()}
+    index = value['$ref']
+    if not isinstance(index, int) or not 0 <= index < len(results):
+        raise UserError(_("Invalid reference to call %s: only earlier calls can be referenced.", index))
+    resolved = results[index]
+    for key in filter(None, (value.get('path') or '').split('.')):
+        resolved = _extract_path(resolved, key)
+    return resolved
+
+
+def _extract_path(value, key):
+    if isinstance(value, list):
+        extracted = []
+        for item in value:
+            item = _extract_path(item, key)
+            extracted.extend(item if isinstance(item, list) else [item])
+        return extracted
+    if isinstance(value, dict):
+        value = value.get(key)
+        # many2one values are read as [id, display_name]
+        if isinstance(value, (list, tuple)) and len(value) == 2 and isinstance(value[1], str):
+            return value[0]
+        return value
+    raise UserError(_("Cannot read %(key)s from %(value)r.", key=key, value=value))
+
 
 class AIAgentController(http.Controller):
 
+    def _admit(self):
+        """
+        Admission control: takes a token from the user's, company's and API
+        key's rate limit buckets, or raises ``RateLimitExceeded`` (429).
+        Committed at once so the shared bucket rows are not kept locked for
+        the rest of the turn.
+        """
+        with tracing.span('admission'):
+            request.env['ai.agent.rate.bucket'].sudo()._admit(request.env)
+            request.env.cr.commit()
+
+    @contextlib.contextmanager
+    def _trace_turn(self, name):
+        """
+        Traces the turn handled in the ``with`` block, which is saved when the
+        block exits unless the route marked it ``deferred`` to finish it later.
+        """
+        Trace = request.env['ai.agent.trace'].sudo()
+        trace = Trace._new_trace(name, request.httprequest.headers.get('traceparent'), cr=request.env.cr)
+        trace.info['user_id'] = request.env.uid
+        error = None
+        with tracing.activate(trace):
+            try:
+                yield trace
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                if not trace.deferred:
+                    trace.finish(error)
+                    Trace._save(trace)
+
+    def _start_turn(self, payload):
+        """
+        Records the user's new message on its conversation, creating one when
+        the widget does not have one yet, and completes the payload with the
+        prompt and history stored on the server.
+
+        Returns the conversation, the user message, the payload and the
+        response cache key of the turn.
+        """
+        Conversation = request.env['ai.agent.conversation']
+        conversation_id = payload.pop('conversation_id', None)
+        with tracing.span('conversation.add_message'):
+            conversation = conversation_id and Conversation.search([('id', '=', int(conversation_id))])
+            if not conversation:
+                conversation = Conversation.create({})
+            message = conversation._add_message('user', payload.pop('message', ''))
+        with tracing.span('conversation.prepare_payload'):
+            payload.update(conversation._prepare_agent_payload())
+        payload['odoo_credentials'] = self._get_tool_credentials(message)
+        with tracing.span('cache.make_key'):
+            cache_key = request.env['ai.agent.response.cache'].sudo()._make_key(conversation, request.env)
+        # The AI service's tool calls run in their own transactions and must
+        # see this turn; do not keep a transaction open while the model thinks.
+        with tracing.span('commit'):
+            request.env.cr.commit()
+        if tracing.current():
+            tracing.current().info['conversation_id'] = conversation.id
+        return conversation, message, payload, cache_key
+
+    def _get_tool_credentials(self, message):
+        """
+        Tells the AI service how to call back into Odoo for this turn: a signed
+        token for the tool routes replaces the user's login and password.
+        """
+        ttl = params.get_int(request.env, 'ai_agent_odoo.tool_token_ttl', DEFAULT_TOOL_TOKEN_TTL, minimum=1)
+        url = request.httprequest.host_url.rstrip('/')
+        return {
+            'url': url,
+            'db': request.env.cr.dbname,
+            'tool_url': url + TOOL_EXECUTE_ROUTE,
+            'tool_batch_url': url + TOOL_BATCH_ROUTE,
+            'tool_similar_url': url + TOOL_SIMILAR_ROUTE,
+            'tool_search_url': url + TOOL_SEARCH_ROUTE,
+            'tool_resolve_url': url + TOOL_RESOLVE_ROUTE,
+            'schema_url': url + SCHEMA_ROUTE,
+            'fields_get_url': url + FIELDS_GET_ROUTE,
+            'tool_token': sign_tool_token(
+                request.env, ttl, message_id=message.id),
+        }
+
+    def _execute_tool_call(self, model, method, args=None, kwargs=None):
+        """Runs one whitelisted ORM method as the current user."""
+        if method not in TOOL_METHODS:
+            raise AccessError(_("The AI Agent is not allowed to call %s.", method))
+        if model not in request.env:
+            raise UserError(_("Unknown model: %s", model))
+        message_id = request.env.context.get('ai_agent_message_id')
+        if method in TOOL_WRITE_METHODS and message_id:
+            # Answers that changed data must not be replayed from the cache.
+            request.env['ai.agent.message'].sudo().browse(message_id).tool_write = True
+        elif method in TOOL_READ_METHODS:
+            self._record_reads([model])
+        with tracing.span('%s.%s' % (model, method)):
+            return call_kw(request.env[model], method, args or [], kwargs or {})
+
+    def _record_reads(self, model_names):
+        """Notes that the turn's answer is based on the records of ``model_names``."""
+        message_id = request.env.context.get('ai_agent_message_id')
+        if message_id:
+            request.env['ai.agent.message'].sudo().browse(message_id)._record_reads(model_names)
+
     @http.route('/ai_agent_odoo/get_config', type='json', auth='user')
     def get_config(self):
         """
-        Securely provides the AI Agent service URL to the frontend.
+        Securely provides the AI Agent configuration to the frontend.
         The URL is stored in Odoo's System Parameters for easy configuration.
+        The API key is not sent: requests to the AI service go through
+        the controller, which adds it server-side.
+        The version lets the widget cache this for the whole session; it is
+        notified over the bus when the parameters change.
         """
-        get_param = request.env['ir.config_parameter'].sudo().get_param
-        ai_agent_url = get_param('ai_agent_odoo.service_url')
-        ai_agent_api_key = get_param('ai_agent_odoo.api_key')
-        db = request.session.db
-        login = request.session.login
-        return {
-            'ai_agent_url': ai_agent_url,
-            'ai_agent_api_key': ai_agent_api_key,
-            'db': db,
-            'login': login,
-        }
\ No newline at end of file
+        start = time.monotonic()
+        ICP = request.env['ir.config_parameter'].sudo()
+        config = {
+            'version': ICP._get_ai_agent_config_version(),
+            'ai_agent_url': ICP.get_param('ai_agent_odoo.service_url'),
+            'async_jobs': str2bool(ICP.get_param('ai_agent_odoo.async_jobs'), default=False),
+            'db': request.session.db,
+            'login': request.session.login,
+        }
+        metrics.observe(request.env.cr.dbname, 'ai_agent_config_fetch_seconds', time.monotonic() - start)
+        return config
+
+    @http.route('/ai_agent_odoo/invoke', type='json', auth='user')
+    @_in_flight_route('invoke')
+    def invoke(self, **payload):
+        """
+        Forwards an agent request to the AI service over this worker's pool of
+        keep-alive connections and returns its JSON answer. Being same-origin,
+        it spares the browser a CORS preflight and a new TLS handshake per turn.
+
+        The payload only carries ``conversation_id`` and the new ``message``;
+        the history is read from the stored conversation.
+
+        With ``async`` set, the turn is run by a background job instead and
+        this returns its ``job_id`` at once; the answer is pushed to the
+        browser over the bus (``ai_agent_odoo/job_update`` notifications).
+        ``lane='batch'`` queues such a job behind interactive turns.
+
+        Concurrent requests with the same cache key are coalesced: the first
+        one calls the AI service and the others wait for its answer. The key
+        includes the user, so only a user's own identical requests (a double
+        submit, two tabs) are coalesced, unless ``ai_agent_odoo.share_across_users``
+        lets users with the same access share first questions.
+
+        A request rejected by the rate limits returns ``{"error": "rate_limited",
+        "retry_after": <seconds>, "message": ...}``.
+        """
+        lane = payload.pop('lane', 'interactive')
+        if lane not in dict(LANES):
+            raise UserError(_("Unknown job lane: %s", lane))
+        run_async = payload.pop('async', False) or lane == 'batch'
+        config = gateway.GatewayConfig(request.env)
+        if not config.service_url:
+            raise UserError(_("AI Agent URL is not configured in Odoo's System Parameters."))
+        with self._trace_turn('invoke') as trace:
+            try:
+                self._admit()
+            except RateLimitExceeded as e:
+                # JSON routes answer errors with HTTP 200 and no Retry-After:
+                # the delay is returned for the client to wait it out.
+                return {'error': 'rate_limited', 'retry_after': e.retry_after, 'message': e.description}
+            conversation, message, payload, cache_key = self._start_turn(payload)
+            with tracing.span('cache.lookup'):
+                cached = request.env['ai.agent.response.cache'].sudo()._lookup(cache_key, message.content)
+            if cached is not None:
+                with tracing.span('conversation.finish_turn'):
+                    conversation._finish_turn(message, cached)
+                return {'response': cached, 'conversation_id': conversation.id, 'cached': True}
+            if run_async:
+                with tracing.span('job.enqueue'):
+                    job = request.env['ai.agent.job']._enqueue(conversation, message, payload, cache_key, lane=lane)
+                # The job finishes the trace.
+                trace.deferred = True
+                trace.finish()
+                request.env['ai.agent.trace'].sudo()._save(trace, final=False)
+                return {'job_id': job.id, 'conversation_id': conversation.id}
+            # Identical concurrent requests share a single upstream call.
+            Inflight = request.env['ai.agent.inflight'].sudo()
+            stale_after = Inflight._get_stale_after(config)
+            with tracing.span('inflight.acquire'):
+                leader = Inflight._acquire(cache_key, stale_after)
+            if not leader:
+                with tracing.span('inflight.follow'):
+                    response = next(value for kind, value in Inflight._follow(cache_key, stale_after) if kind == 'done')
+                with tracing.span('conversation.finish_turn'):
+                    conversation._finish_turn(message, response)
+                return {'response': response, 'conversation_id': conversation.id, 'coalesced': True}
+            request.env.cr.commit()
+            try:
+                try:
+                    start = time.monotonic()
+                    with tracing.span('upstream'):
+                        response = gateway.post(config, gateway.INVOKE_PATH, payload)
+                except requests.RequestException as e:
+                    _logger.warning("AI Agent request failed: %s", e)
+                    raise UserError(_("The AI service could not be reached: %s", e)) from e
+                if not response.ok:
+                    raise UserError(_("The AI service returned an error (%(status)s): %(error)s",
+                                      status=response.status_code, error=response.text))
+                dbname = request.env.cr.dbname
+                # Without streaming, the first token arrives with the response headers.
+                metrics.observe(dbname, 'ai_agent_upstream_first_token_seconds', response.elapsed.total_seconds(),
+                                route='invoke')
+                metrics.observe(dbname, 'ai_agent_upstream_seconds', time.monotonic() - start, route='invoke')
+                metrics.increment(dbname, 'ai_agent_upstream_bytes_received_total', len(response.content),
+                                  route='invoke')
+                data = response.json()
+                with tracing.span('conversation.finish_turn'):
+                    conversation._finish_turn(message, data.get('response', ''), cache_key)
+                Inflight._resolve(cache_key, data.get('response', ''))
+            except Exception as e:
+                # Whatever failed, the followers must not wait for this leader
+                # until it goes stale. The turn was committed before the call,
+                # so the failed transaction can be rolled back first.
+                request.env.cr.rollback()
+                Inflight._fail(cache_key, str(e) if isinstance(e, UserError) else _("The AI service request failed."))
+                request.env.cr.commit()
+                raise
+            return dict(data, conversation_id=conversation.id)
+
+    @http.route('/ai_agent_odoo/stream', type='http', auth='user', methods=['POST'])
+    @_in_flight_route('stream')
+    def stream(self, **kwargs):
+        """
+        Relays the AI service's answer to the browser as Server-Sent Events while
+        it is being generated, so the widget can render the first tokens right
+        away instead of waiting for the complete response.
+
+        Emits a ``conversation`` event with the conversation id, then
+        ``data: {"delta": ...}`` events, then a final ``done`` event with the
+        full response, or an ``error`` event if the upstream call fails.
+
+        A request identical to one already being streamed follows it instead
+        of calling the AI service again.
+        """
+        payload = json.loads(request.httprequest.get_data() or b'{}')
+        config = gateway.GatewayConfig(request.env)
+        if not config.service_url:
+            return request.make_json_response(
+                {'error': "AI Agent URL is not configured in Odoo's System Parameters."}, status=503)
+        with self._trace_turn('stream') as trace:
+            try:
+                self._admit()
+            except RateLimitExceeded as e:
+                return request.make_json_response(
+                    {'error': e.description}, status=e.code, headers=[('Retry-After', str(e.retry_after))])
+            conversation, message, payload, cache_key = self._start_turn(payload)
+            dbname, uid, context = request.env.cr.dbname, request.env.uid, dict(request.env.context)
+            conversation_id, message_id = conversation.id, message.id
+            with tracing.span('cache.lookup'):
+                cached = request.env['ai.agent.response.cache'].sudo()._lookup(cache_key, message.content)
+            if cached is not None:
+                with tracing.span('conversation.finish_turn'):
+                    conversation._finish_turn(message, cached)
+                leader = False
+            else:
+                stale_after = request.env['ai.agent.inflight']._get_stale_after(config)
+                with tracing.span('inflight.acquire'):
+                    leader = request.env['ai.agent.inflight'].sudo()._acquire(cache_key, stale_after)
+                    request.env.cr.commit()
+            # The response is generated after this method returns.
+            trace.deferred = True
+
+        def generate():
+            error = None
+            with Registry(dbname).cursor() as cr, tracing.activate(trace):
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                trace.cr = cr
+                try:
+                    yield from respond(env['ai.agent.inflight'])
+                except Exception as e:
+                    error = e
+                    raise
+                finally:
+                    # Also reached when the browser disconnects mid-stream.
+                    trace.finish(error)
+                    env['ai.agent.trace']._save(trace)
+
+        def respond(Inflight):
+            # Sent first so the browser sees the response start immediately.
+            yield _sse_event({'conversation_id': conversation_id}, event='conversation')
+            if cached is not None:
+                yield _sse_event({'delta': cached})
+                yield _sse_event({'response': cached, 'conversation_id': conversation_id, 'cached': True}, event='done')
+                return
+            if leader:
+                yield from lead(Inflight)
+                return
+            try:
+                with tracing.span('inflight.follow'):
+                    for kind, value in Inflight._follow(cache_key, stale_after):
+                        if kind == 'delta':
+                            yield _sse_event({'delta': value})
+            except UserError as e:
+                trace.finish(e)
+                yield _sse_event({'error': str(e)}, event='error')
+                return
+            with tracing.span('conversation.finish_turn'):
+                _finish_streamed_turn(dbname, uid, context, conversation_id, message_id, value, None)
+            yield _sse_event({'response': value, 'conversation_id': conversation_id, 'coalesced': True}, event='done')
+
+        def lead(Inflight):
+            # Streams the upstream answer, publishing it for the followers.
+            parts, error = [], "The request was interrupted."
+            last_publish = start = time.monotonic()
+            try:
+                with tracing.span('upstream') as upstream, gateway.post(
+                    config, gateway.INVOKE_PATH, dict(payload, stream=True),
+                    stream=True, headers={'Accept': 'text/event-stream'},
+                ) as response:
+                    if not response.ok:
+                        error = response.text
+                        yield _sse_event({'error': response.text, 'status': response.status_code}, event='error')
+                        return
+                    for delta in metrics.timed_deltas(dbname, gateway.iter_deltas(response), start, 'stream'):
+                        if not parts:
+                            upstream['attributes']['first_token_ms'] = round((time.monotonic() - start) * 1000, 1)
+                        parts.append(delta)
+                        yield _sse_event({'delta': delta})
+                        if time.monotonic() - last_publish >= POLL_INTERVAL:
+                            Inflight._publish(cache_key, ''.join(parts))
+                            Inflight.env.cr.commit()
+                            last_publish = time.monotonic()
+                full_response = ''.join(parts)
+                with tracing.span('conversation.finish_turn'):
+                    _finish_streamed_turn(dbname, uid, context, conversation_id, message_id, full_response, cache_key)
+                Inflight._resolve(cache_key, full_response)
+                Inflight.env.cr.commit()
+                error = None
+                yield _sse_event({'response': full_response, 'conversation_id': conversation_id}, event='done')
+            except requests.RequestException as e:
+                _logger.warning("AI Agent streaming request failed: %s", e)
+                error = str(e)
+                yield _sse_event({'error': str(e)}, event='error')
+            finally:
+                if error is not None:
+                    Inflight._fail(cache_key, error)
+                    Inflight.env.cr.commit()
+                    trace.finish(error)
+
+        return Response(
+            generate(),
+            headers=[
+                ('Content-Type', 'text/event-stream; charset=utf-8'),
+                ('Cache-Control', 'no-cache'),
+                # Disable response buffering in nginx-like reverse proxies.
+                ('X-Accel-Buffering', 'no'),
+            ],
+            direct_passthrough=True,
+        )
+
+    @http.route(TOOL_EXECUTE_ROUTE, type='json', auth='ai_agent_tool')
+    @_tool_route('execute')
+    def tool_execute(self, model, method, args=None, kwargs=None):
+        """
+        Executes an ORM call for the AI service in-process, in place of an
+        XML-RPC ``authenticate`` + ``execute_kw`` round trip. The request is
+        authorised by the turn's signed token (see ``_get_tool_credentials``)
+        and should name the database in the ``X-Odoo-Database`` header when
+        the server hosts several.
+        """
+        return {'result': self._execute_tool_call(model, method, args, kwargs)}
+
+    @http.route(TOOL_BATCH_ROUTE, type='json', auth='ai_agent_tool')
+    @_tool_route('batch')
+    def tool_batch(self, calls):
+        """
+        Executes an ordered list of ORM calls in a single request and
+        transaction, and returns all their results at once. Each call is a
+        ``{"model", "method", "args", "kwargs"}`` dict; its arguments may refer
+        to the result of an earlier call with ``{"$ref": index, "path": ...}``.
+
+        If a call fails, the whole batch is rolled back.
+        """
+        if len(calls) > MAX_BATCH_CALLS:
+            raise UserError(_("A batch cannot contain more than %s calls.", MAX_BATCH_CALLS))
+        results = []
+        for index, call in enumerate(calls):
+            args = _resolve_references(call.get('args') or [], results)
+            kwargs = _resolve_references(call.get('kwargs') or {}, results)
+            try:
+                results.append(self._execute_tool_call(call.get('model'), call.get('method'), args, kwargs))
+            except UserError as e:
+                raise UserError(_("Call %(index)s (%(model)s.%(method)s) failed: %(error)s",
+                                index=index, model=call.get('model'), method=call.get('method'),
+                                error=e.args[0] if e.args else e)) from e
+        return {'results': results}
+
+    @http.route(TOOL_SIMILAR_ROUTE, type='json', auth='ai_agent_tool')
+    @_tool_route('similar')
+    def tool_similar(self, query, limit=5, models=None):
+        """
+        Returns the records most similar to ``query`` from the embedding index,
+        restricted to ``models`` if given and to what the user may read.
+        """
+        Embedding = request.env['ai.agent.embedding']
+        self._record_reads(models or list(Embedding._get_indexed_fields()))
+        return {'results': Embedding._search_similar(query, min(int(limit), 50), models)}
+
+    @http.route(TOOL_SEARCH_ROUTE, type='json', auth='ai_agent_tool')
+    @_tool_route('search')
+    def tool_search(self, query, limit=10, models=None):
+        """
+        Ranked full-text search (web search syntax, language-aware stemming)
+        over the indexed models, restricted to ``models`` if given and to what
+        the user may read.
+        """
+        Fulltext = request.env['ai.agent.fulltext']
+        self._record_reads(models or list(Fulltext._get_fts_fields()))
+        return {'results': Fulltext._search_fulltext(query, min(int(limit), 50), models)}
+
+    @http.route(TOOL_RESOLVE_ROUTE, type='json', auth='ai_agent_tool')
+    @_tool_route('resolve')
+    def tool_resolve(self, query, models=None, limit=5):
+        """
+        Resolves a fuzzy name to ranked candidate records across the configured
+        models, in place of one ``name_search`` round trip per model.
+        """
+        Resolver = request.env['ai.agent.entity.resolver']
+        self._record_reads(models or list(Resolver._get_configured_fields()))
+        return {'results': Resolver._resolve(query, models, min(int(limit), 50))}
+
+    @http.route(SCHEMA_ROUTE, type='http', auth='ai_agent_tool', methods=['GET'])
+    @_tool_route('schema')
+    def schema(self, **kwargs):
+        """
+        Serves the compact digest of the models and fields the user can see.
+        Supports ``If-None-Match``, so the AI service can keep its copy and only
+        download it again when the schema or the user's groups change.
+        """
+        digest, etag = request.env['ai.agent.schema']._get_schema_digest()
+        headers = [('ETag', '"%s"' % etag), ('Cache-Control', 'private, no-cache')]
+        if request.httprequest.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+        return request.make_response(digest, headers=headers + [('Content-Type', 'text/plain; charset=utf-8')])
+
+    @http.route(FIELDS_GET_ROUTE, type='json', auth='ai_agent_tool')
+    @_tool_route('fields_get')
+    def tool_fields_get(self, models, attributes=None):
+        """
+        Returns the field metadata of several models in one response, in place
+        of one XML-RPC ``fields_get`` per model. ``models`` is a list of model
+        names, or a dict of model names to the field names wanted.
+        """
+        return {'results': request.env['ai.agent.schema']._get_models_metadata(models, attributes)}
+
+    @http.route(METRICS_ROUTE, type='http', auth='public', methods=['GET'], save_session=False)
+    def prometheus_metrics(self, **kwargs):
+        """
+        Exports the AI Assistant metrics of all workers in the Prometheus text
+        format. Scrapers authenticate with ``Authorization: Bearer <token>``,
+        the token being the ``ai_agent_odoo.metrics_token`` parameter;
+        administrators may also open it in their browser session.
+        """
+        token = request.env['ir.config_parameter'].sudo().get_param('ai_agent_odoo.metrics_token')
+        scheme, _sep, given = request.httprequest.headers.get('Authorization', '').partition(' ')
+        if not (token and scheme.lower() == 'bearer' and consteq(given.strip(), token)) \
+                and not request.env.user._is_system():
+            raise Forbidden()
+        Metric = request.env['ai.agent.metric'].sudo()
+        Metric._flush()
+        return request.make_response(
+            Metric._export_prometheus(),
+            headers=[('Content-Type', 'text/plain; version=0.0.4; charset=utf-8'), ('Cache-Control', 'no-store')],
+        )
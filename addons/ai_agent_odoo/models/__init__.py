@@ -1 +1,14 @@
-from . import ai_agent 
\ No newline at end of file
+from . import ai_agent 
+from . import ai_agent_embedding
+from . import ai_agent_entity
+from . import ai_agent_fulltext
+from . import ai_agent_inflight
+from . import ai_agent_job
+from . import ai_agent_metric
+from . import ai_agent_rate_limit
+from . import ai_agent_response_cache
+from . import ai_agent_schema
+from . import ai_agent_trace
+from . import base
+from . import ir_config_parameter
+from . import ir_http
\ No newline at end of file
@@ -1,9 +1,195 @@
 # -*- coding: utf-8 -*-
-from odoo import models
-
-# We are creating a placeholder model because the original views referred to it.
-# For a pure JavaScript widget, this isn't strictly necessary, but it's good practice
-# to keep the file structure. No fields or methods are needed here for now.
-class AIAgent(models.Model):
-    _name = 'ai.agent'
-    _description = 'AI Assistant Configuration (Placeholder)'
\ No newline at end of file
+import textwrap
+
+from odoo import api, fields, models
+from odoo.tools import html2plaintext
+
+from ..tools import params
+from ..tools.tokens import count_tokens
+
+DEFAULT_TOKEN_BUDGET = 4000
+DEFAULT_KEEP_LAST_TURNS = 6
+# Share of the token budget the rolling summary may use.
+SUMMARY_BUDGET_RATIO = 0.25
+SUMMARY_LINE_WIDTH = 240
+
+
+def _default_token_budget(env):
+    return params.get_int(env, 'ai_agent_odoo.token_budget', DEFAULT_TOKEN_BUDGET, minimum=1)
+
+
+class AIAgentConversation(models.Model):
+    """
+    A chat session between a user and the AI assistant. The history lives here
+    on the server, so each turn from the widget only carries the conversation id
+    and the new message instead of the whole transcript.
+    """
+    _name = 'ai.agent.conversation'
+    _description = 'AI Assistant Conversation'
+    _order = 'id desc'
+
+    name = fields.Char(string='Title')
+    user_id = fields.Many2one(
+        'res.users', string='User', required=True, index=True, ondelete='cascade',
+        default=lambda self: self.env.user)
+    company_id = fields.Many2one(
+        'res.company', string='Company', required=True,
+        default=lambda self: self.env.company)
+    message_ids = fields.One2many('ai.agent.message', 'conversation_id', string='Messages')
+    token_budget = fields.Integer(
+        string='Token Budget', default=lambda self: _default_token_budget(self.env),
+        help="Maximum size, in tokens, of the history sent to the AI service for this conversation.")
+    summary = fields.Text(
+        string='Summary', readonly=True,
+        help="Rolling summary of the messages that were folded out of the verbatim history.")
+
+    def _add_message(self, role, content):
+        """Appends a message to the conversation and returns it."""
+        self.ensure_one()
+        if not self.name and role == 'user':
+            self.name = content[:80]
+        return self.env['ai.agent.message'].create({
+            'conversation_id': self.id,
+            'role': role,
+            'content': content,
+        })
+
+    def _finish_turn(self, user_message, response, cache_key=None):
+        """
+        Records the answer to ``user_message`` and caches it under ``cache_key``,
+        unless the agent changed data while answering: replaying such an answer
+        from the cache would skip the changes.
+        """
+        self.ensure_one()
+        message = self._add_message('assistant', response)
+        # Set by the tool calls, in transactions of their own.
+        user_message.invalidate_recordset(['tool_write', 'read_models'])
+        if cache_key and not user_message.tool_write:
+            self.env['ai.agent.response.cache'].sudo()._store(
+                cache_key, response, user_message.content, user_message.read_models)
+        return message
+
+    def _get_keep_last_turns(self):
+        return params.get_int(self.env, 'ai_agent_odoo.keep_last_turns', DEFAULT_KEEP_LAST_TURNS, minimum=0)
+
+    def _summarize_messages(self, summary, messages):
+        """
+        Folds ``messages`` into the existing ``summary`` and returns the new one.
+        Only the new messages are processed, the previous summary is kept as is.
+
+        The default implementation is extractive (one shortened line per message)
+        so it works offline; override it to have a model write the summary.
+        """
+        lines = [summary] if summary else []
+        for message in messages:
+            text = ' '.join(html2plaintext(message.content or '').split())
+            lines.append('- %s: %s' % (
+                dict(message._fields['role'].selection)[message.role],
+                textwrap.shorten(text, SUMMARY_LINE_WIDTH, placeholder=' …'),
+            ))
+        return '\n'.join(lines)
+
+    def _trim_summary(self, summary, budget):
+        """Drops the oldest summary lines until the summary fits in ``budget``."""
+        lines = summary.split('\n')
+        while len(lines) > 1 and count_tokens('\n'.join(lines)) > budget:
+            lines.pop(0)
+        return '\n'.join(lines)
+
+    def _compact_history(self):
+        """
+        Keeps the last turns verbatim and folds everything older into the rolling
+        summary, so the history sent to the AI service stays within the token
+        budget however long the conversation gets. Folding is incremental:
+        messages are summarized once and flagged, the summary is never rebuilt.
+        """
+        self.ensure_one()
+        verbatim = self.message_ids.filtered(lambda m: not m.is_summarized)
+        keep = self._get_keep_last_turns() * 2
+        to_fold = verbatim[:-keep] if len(verbatim) > keep else self.env['ai.agent.message']
+        verbatim -= to_fold
+
+        # The last turns may still be too large: fold from the oldest, but
+        # always keep the message being answered.
+        summary_budget = int(self.token_budget * SUMMARY_BUDGET_RATIO)
+        verbatim_budget = self.token_budget - summary_budget
+        # Token counts are cached on the messages, this only sums them.
+        verbatim_tokens = sum(verbatim.mapped('token_count'))
+        while len(verbatim) > 1 and verbatim_tokens > verbatim_budget:
+            verbatim_tokens -= verbatim[0].token_count
+            to_fold |= verbatim[0]
+            verbatim = verbatim[1:]
+
+        if to_fold:
+            summary = self._summarize_messages(self.summary, to_fold)
+            self.summary = self._trim_summary(summary, summary_budget)
+            to_fold.is_summarized = True
+        return verbatim
+
+    def _get_history(self):
+        """
+        Returns the compacted transcript in the format expected by the AI
+        service: the rolling summary, if any, followed by the recent messages.
+        """
+        self.ensure_one()
+        messages = self._compact_history()
+        history = []
+        if self.summary:
+            history.append({
+                'role': 'system',
+                'content': 'Summary of the earlier conversation:\n%s' % self.summary,
+            })
+        history += [{'role': message.role, 'content': message.content or ''} for message in messages]
+        return history
+
+    def _prepare_agent_payload(self):
+        """
+        Builds the prompt and history for ``/api/v1/agent/invoke`` from the
+        stored messages; the last message is the prompt being answered.
+        """
+        self.ensure_one()
+        history = self._get_history()
+        return {
+            'prompt': history[-1]['content'] if history else '',
+            'conversation_history': history,
+        }
+
+
+class AIAgentMessage(models.Model):
+    _name = 'ai.agent.message'
+    _description = 'AI Assistant Message'
+    _order = 'conversation_id, id'
+
+    conversation_id = fields.Many2one(
+        'ai.agent.conversation', string='Conversation', required=True, index=True, ondelete='cascade')
+    role = fields.Selection(
+        [('user', 'User'), ('assistant', 'Assistant')], string='Role', required=True)
+    content = fields.Text(string='Content')
+    is_summarized = fields.Boolean(
+        string='Summarized', index=True, readonly=True,
+        help="Set once the message is folded into the conversation's rolling summary.")
+    tool_write = fields.Boolean(
+        string='Changed Data', readonly=True,
+        help="Set on a user message when the agent changed data while answering it, "
+             "so that the answer is not cached.")
+    read_models = fields.Json(
+        string='Read Models', readonly=True,
+        help="Models the agent read while answering a user message, with their freshness token as of "
+             "the first read: the cached answer is only served while these tokens are unchanged.")
+    token_count = fields.Integer(
+        string='Tokens', compute='_compute_token_count', store=True,
+        help="Size of the content in tokens, counted once and summed when budgeting the history.")
+
+    @api.depends('content')
+    def _compute_token_count(self):
+        for message in self:
+            message.token_count = count_tokens(message.content)
+
+    def _record_reads(self, model_names):
+        """Adds ``model_names`` to the models read to answer this user message."""
+        self.ensure_one()
+        read_models = self.read_models or {}
+        new = [name for name in model_names if name not in read_models]
+        if new:
+            token = self.env['ai.agent.response.cache'].sudo()._get_freshness_token(new)
+            self.read_models = dict(read_models, **token)
\ No newline at end of file
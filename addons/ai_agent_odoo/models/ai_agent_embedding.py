@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import logging
+
+from odoo import api, fields, models
+from odoo.tools import html2plaintext
+from odoo.tools.sql import SQL, column_exists
+
+from ..tools import embeddings, params
+from ..tools.access import readable_matches
+
+_logger = logging.getLogger(__name__)
+
+EMBEDDING_BATCH_SIZE = 500
+# Entries claimed per transaction. The claim is committed before the vectors
+# are computed, so the hooks never wait on the rows the cron is working on.
+EMBEDDING_CLAIM_SIZE = 50
+# Claims older than this, in seconds, were left by a cron run that died.
+EMBEDDING_CLAIM_TIMEOUT = 600
+# Candidates fetched per requested result, to leave room for access filtering.
+SEARCH_OVERFETCH = 4
+
+
+def _to_indexed_fields(config):
+    return {model: frozenset(field_names) for model, field_names in config.items()}
+
+
+class AIAgentEmbedding(models.Model):
+    """
+    Vector index over Odoo records, used by the agent's similarity search tool.
+
+    The records and fields to index are set in the ``ai_agent_odoo.embedding_fields``
+    system parameter, as JSON: ``{"res.partner": ["name", "comment"], ...}``.
+    Creating, writing or deleting such records only flags their index entry as
+    pending (see ``models/base.py``); a cron computes the vectors in chunked
+    batches, so user writes are never slowed down by embedding. The cron marks
+    a small batch as processing and commits before embedding it: no row stays
+    locked while it works, and an entry flagged again meanwhile is redone.
+
+    Vectors are stored as packed float32 and scored with NumPy; when the
+    ``vector`` extension (pgvector) is available they are also kept in a
+    ``pg_vector`` column and searched by the database.
+    """
+    _name = 'ai.agent.embedding'
+    _description = 'AI Assistant Record Embedding'
+    _rec_name = 'res_model'
+
+    res_model = fields.Char(string='Model', required=True, readonly=True, index=True)
+    res_id = fields.Many2oneReference(string='Record ID', model_field='res_model', required=True, readonly=True)
+    state = fields.Selection(
+        [('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Indexed')], string='Status',
+        required=True, default='pending', readonly=True, index=True)
+    claimed_at = fields.Datetime(string='Claimed At', readonly=True)
+    content_hash = fields.Char(string='Content Hash', readonly=True)
+    # L2-normalised float32 vector, read and written in SQL only.
+    vector = fields.Binary(string='Vector', attachment=False, readonly=True)
+
+    _sql_constraints = [
+        ('record_unique', 'unique(res_model, res_id)', "A record is indexed only once."),
+    ]
+
+    def init(self):
+        super().init()
+        cr = self.env.cr
+        if column_exists(cr, self._table, 'pg_vector'):
+            return
+        dimensions = len(embeddings.embed('')) // 4
+        try:
+            with cr.savepoint():
+                cr.execute("CREATE EXTENSION IF NOT EXISTS vector")
+                cr.execute(SQL("ALTER TABLE ai_agent_embedding ADD COLUMN pg_vector vector(%s)", dimensions))
+        except Exception as e:  # noqa: BLE001 - the extension is optional
+            _logger.info("pgvector is not available, record embeddings are scored with NumPy: %s", e)
+            return
+        try:
+            with cr.savepoint():
+                cr.execute("CREATE INDEX ai_agent_embedding_pg_vector_index"
+                           " ON ai_agent_embedding USING hnsw (pg_vector vector_cosine_ops)")
+        except Exception as e:  # noqa: BLE001 - older pgvector versions have no hnsw
+            _logger.info("Could not create the pgvector HNSW index: %s", e)
+
+    def _has_pgvector(self):
+        return column_exists(self.env.cr, self._table, 'pg_vector')
+
+    @api.model
+    def _get_indexed_fields(self):
+        """Returns ``{model name: frozenset of field names}`` to index."""
+        return params.get_json(self.env, 'ai_agent_odoo.embedding_fields', convert=_to_indexed_fields)
+
+    @api.model
+    def _enqueue(self, model_name, ids):
+        """Flags the index entries of the given records as pending."""
+        if not ids:
+            return
+        self.env.cr.execute(SQL(
+            """
+            INSERT INTO ai_agent_embedding (res_model, res_id, state, create_uid, create_date, write_uid, write_date)
+                 SELECT %(model)s, unnest(%(ids)s), 'pending', %(uid)s, now() AT TIME ZONE 'UTC',
+                        %(uid)s, now() AT TIME ZONE 'UTC'
+            ON CONFLICT (res_model, res_id) DO UPDATE SET state = 'pending'
+            """, model=model_name, ids=list(ids), uid=self.env.uid,
+        ))
+
+    @api.model
+    def _enqueue_all(self):
+        """Flags every record of the indexed models, e.g. after a configuration change."""
+        for model_name in self._get_indexed_fields():
+            model = self.env.get(model_name)
+            if model is None or not model._auto:
+                continue
+            self.env.cr.execute(SQL(
+                """
+                INSERT INTO ai_agent_embedding (res_model, res_id, state, create_uid, create_date, write_uid, write_date)
+                     SELECT %(model)s, id, 'pending', %(uid)s, now() AT TIME ZONE 'UTC',
+                            %(uid)s, now() AT TIME ZONE 'UTC'
+                       FROM %(table)s
+                ON CONFLICT (res_model, res_id) DO UPDATE SET state = 'pending'
+                """, model=model_name, table=SQL.identifier(model._table), uid=self.env.uid,
+            ))
+        self.env.ref('ai_agent_odoo.ir_cron_ai_agent_embedding_index')._trigger()
+
+    @api.model
+    def _remove(self, model_name, ids):
+        self.env.cr.execute(SQL(
+            "DELETE FROM ai_agent_embedding WHERE res_model = %s AND res_id = ANY(%s)",
+            model_name, list(ids),
+        ))
+
+    @api.model
+    def _get_record_text(self, record, field_names):
+        """Text embedded for ``record``: one ``label: value`` line per indexed field."""
+        lines = []
+        for field_name in sorted(field_names):
+            field = record._fields.get(field_name)
+            value = field and record[field_name]
+            if not value:
+                continue
+            if field.relational:
+                value = ', '.join(value.mapped('display_name'))
+            elif field.type == 'html':
+                value = html2plaintext(value)
+            elif field.type == 'selection':
+                value = dict(field._description_selection(self.env)).get(value, value)
+            lines.append('%s: %s' % (field.string, value))
+        return '\n'.join(lines)
+
+    @api.model
+    def _claim_pending(self, limit):
+        """
+        Marks up to ``limit`` pending entries as processing and commits, and
+        returns their ``(id, res_model, res_id, content_hash)`` rows.
+        """
+        cr = self.env.cr
+        cr.execute(SQL(
+            """
+            UPDATE ai_agent_embedding
+               SET state = 'processing', claimed_at = now() AT TIME ZONE 'UTC'
+             WHERE id IN (SELECT id FROM ai_agent_embedding
+                           WHERE state = 'pending'
+                        ORDER BY id
+                           LIMIT %s
+                      FOR UPDATE SKIP LOCKED)
+         RETURNING id, res_model, res_id, content_hash
+            """, limit,
+        ))
+        rows = cr.fetchall()
+        cr.commit()
+        return rows
+
+    @api.model
+    def _requeue_stale_claims(self):
+        self.env.cr.execute(SQL(
+            """
+            UPDATE ai_agent_embedding SET state = 'pending'
+             WHERE state = 'processing'
+               AND claimed_at < now() AT TIME ZONE 'UTC' - make_interval(secs => %s)
+            """, EMBEDDING_CLAIM_TIMEOUT,
+        ))
+
+    @api.model
+    def _index_entries(self, rows):
+        """
+        Computes the vectors of the claimed entries ``rows``. Entries flagged
+        pending again since they were claimed are left for the next batch.
+        """
+        cr = self.env.cr
+        indexed_fields = self._get_indexed_fields()
+        has_pgvector = self._has_pgvector()
+        to_delete = []
+        for model_name in {row[1] for row in rows}:
+            model_rows = [row for row in rows if row[1] == model_name]
+            field_names = indexed_fields.get(model_name)
+            if field_names is None or model_name not in self.env:
+                to_delete += [row[0] for row in model_rows]
+                continue
+            records = self.env[model_name].sudo().with_context(active_test=False).browse(
+                [row[2] for row in model_rows]).exists()
+            records_by_id = {record.id: record for record in records}
+            for entry_id, _model, res_id, content_hash in model_rows:
+                record = records_by_id.get(res_id)
+                if not record:
+                    to_delete.append(entry_id)
+                    continue
+                text = self._get_record_text(record, field_names)
+                new_hash = hashlib.sha1(text.encode()).hexdigest()
+                if new_hash == content_hash:
+                    cr.execute(SQL(
+                        "UPDATE ai_agent_embedding SET state = 'done' WHERE id = %s AND state = 'processing'",
+                        entry_id,
+                    ))
+                    continue
+                vector = embeddings.embed(text)
+                cr.execute(SQL(
+                    "UPDATE ai_agent_embedding SET state = 'done', content_hash = %s, vector = %s%s"
+                    " WHERE id = %s AND state = 'processing'",
+                    new_hash, vector,
+                    SQL(", pg_vector = %s::vector", embeddings.to_pgvector(vector)) if has_pgvector else SQL(),
+                    entry_id,
+                ))
+        if to_delete:
+            cr.execute(SQL(
+                "DELETE FROM ai_agent_embedding WHERE id = ANY(%s) AND state = 'processing'", to_delete,
+            ))
+
+    @api.model
+    def _process_pending(self, limit=EMBEDDING_BATCH_SIZE):
+        """
+        Computes the vectors of up to ``limit`` pending entries, claimed and
+        committed in batches of ``EMBEDDING_CLAIM_SIZE``, and returns the
+        number of entries processed and the number still pending.
+        """
+        cr = self.env.cr
+        self._requeue_stale_claims()
+        done = 0
+        while done < limit:
+            rows = self._claim_pending(min(EMBEDDING_CLAIM_SIZE, limit - done))
+            if not rows:
+                break
+            self._index_entries(rows)
+            cr.commit()
+            done += len(rows)
+        cr.execute("SELECT count(*) FROM ai_agent_embedding WHERE state = 'pending'")
+        return done, cr.fetchone()[0]
+
+    @api.model
+    def _cron_process_pending(self):
+        done, remaining = self._process_pending()
+        self.env['ir.cron']._notify_progress(done=done, remaining=remaining)
+
+    @api.model
+    def _search_similar(self, query, limit=5, model_names=None):
+        """
+        Returns the ``limit`` records most similar to ``query`` that the current
+        user may read, as ``{"model", "id", "display_name", "score"}`` dicts.
+        """
+        indexed = set(self._get_indexed_fields())
+        model_names = [name for name in (model_names or indexed) if name in indexed and name in self.env]
+        if not model_names:
+            return []
+        query_vector = embeddings.embed(query)
+        cr = self.env.cr
+        if self._has_pgvector():
+            cr.execute(SQL(
+                """
+                SELECT res_model, res_id, 1 - (pg_vector <=> %(query)s::vector)
+                  FROM ai_agent_embedding
+                 WHERE res_model = ANY(%(models)s) AND pg_vector IS NOT NULL
+              ORDER BY pg_vector <=> %(query)s::vector
+                 LIMIT %(limit)s
+                """, query=embeddings.to_pgvector(query_vector), models=model_names, limit=limit * SEARCH_OVERFETCH,
+            ))
+            candidates = cr.fetchall()
+        else:
+            cr.execute(SQL(
+                "SELECT res_model, res_id, vector FROM ai_agent_embedding"
+                " WHERE res_model = ANY(%s) AND vector IS NOT NULL", model_names,
+            ))
+            rows = cr.fetchall()
+            best = embeddings.top_k(query_vector, [bytes(row[2]) for row in rows], limit * SEARCH_OVERFETCH)
+            candidates = [(rows[index][0], rows[index][1], score) for index, score in best]
+
+        # Only keep the records the user can read (access rights and record rules).
+        return readable_matches(self.env, candidates, limit)
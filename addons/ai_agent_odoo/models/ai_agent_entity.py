@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+import collections
+import json
+import logging
+import re
+
+from odoo import api, models
+from odoo.tools.sql import SQL
+
+from ..tools import indexes, params
+from ..tools.access import readable_matches
+from ..tools.lru import LRUCache
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_ENTITY_FIELDS = json.dumps({
+    'res.partner': ['complete_name'],
+    'product.template': ['name', 'default_code'],
+    'product.product': ['default_code'],
+    'sale.order': ['name'],
+    'account.move': ['name'],
+})
+DEFAULT_SIMILARITY_THRESHOLD = 0.3
+CACHE_SIZE = 512
+CACHE_TTL = 60
+TRIGRAM_INDEX_PREFIX = 'ai_agent_trgm_'
+
+# Per-company LRU caches of recent resolutions, keyed on (dbname, company id).
+# Each entry remembers the freshness token of the models it covers, which is
+# read from the database: a change made by any worker invalidates it.
+_caches = collections.defaultdict(lambda: LRUCache(CACHE_SIZE, CACHE_TTL))
+
+
+def _to_entity_fields(config):
+    return {model: tuple(field_names) for model, field_names in config.items()}
+
+
+class AIAgentEntityResolver(models.AbstractModel):
+    """
+    Resolves the fuzzy names the agent is given ("acme", "widget XL") to record
+    ids across several models in one query, using ``pg_trgm`` word similarity
+    backed by GIN trigram indexes.
+
+    The models and name-like fields to match are set in the
+    ``ai_agent_odoo.entity_fields`` system parameter, as JSON. Their indexes
+    are built ``CONCURRENTLY`` by a cron triggered on configuration changes,
+    like the full-text search ones.
+    """
+    _name = 'ai.agent.entity.resolver'
+    _description = 'AI Assistant Entity Resolver'
+
+    def init(self):
+        super().init()
+        self._apply_entity_config()
+
+    @api.model
+    def _get_configured_fields(self):
+        return params.get_json(self.env, 'ai_agent_odoo.entity_fields', DEFAULT_ENTITY_FIELDS, _to_entity_fields)
+
+    @api.model
+    def _get_entity_fields(self):
+        """Returns ``{model name: (field names)}``, restricted to the matchable fields."""
+        result = {}
+        for model_name, field_names in self._get_configured_fields().items():
+            model = self.env.get(model_name)
+            if model is None or not model._auto or model._abstract:
+                continue
+            fields_ = tuple(
+                name for name in field_names
+                if name in model._fields and model._fields[name].store and model._fields[name].type in ('char', 'text')
+            )
+            if fields_:
+                result[model_name] = fields_
+        return result
+
+    @api.model
+    def _get_field_expression(self, model, field_name):
+        """Matched expression, identical to the one of Odoo's own trigram indexes."""
+        column = SQL.identifier(field_name)
+        if model._fields[field_name].translate:
+            return SQL("(jsonb_path_query_array(%s, '$.*')::text)", column)
+        return SQL("(%s)", column)
+
+    @api.model
+    def _apply_entity_config(self):
+        """Schedules the build of the trigram indexes after a configuration change."""
+        cron = self.env.ref('ai_agent_odoo.ir_cron_ai_agent_entity_index', raise_if_not_found=False)
+        if cron:
+            cron._trigger()
+
+    @api.model
+    def _build_trigram_indexes(self):
+        """
+        Creates, or drops, the GIN trigram indexes of the configured fields
+        that Odoo does not index already. Indexes whose concurrent build
+        failed are invalid and are rebuilt. See ``tools/indexes.py`` for the
+        concurrent builds.
+        """
+        with indexes.autocommit_cursor(self.env) as cr:
+            if not self.env.registry.has_trigram:
+                try:
+                    cr.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+                except Exception as e:  # noqa: BLE001 - the extension is optional
+                    _logger.info("pg_trgm is not available, entity resolution is disabled: %s", e)
+                    return
+                # The other workers load the registry again, which tells them.
+                self.env.registry.has_trigram = True
+                self.env.registry.registry_invalidated = True
+            wanted = {}
+            for model_name, field_names in self._get_entity_fields().items():
+                model = self.env[model_name]
+                for field_name in field_names:
+                    if model._fields[field_name].index != 'trigram':
+                        name = indexes.index_name(TRIGRAM_INDEX_PREFIX, '%s_%s' % (model._table, field_name))
+                        wanted[name] = (model._table, self._get_field_expression(model, field_name))
+            existing = indexes.get_indexes(cr, TRIGRAM_INDEX_PREFIX)
+            for name, (_table, _comment, valid) in existing.items():
+                if not valid or name not in wanted:
+                    indexes.drop_index_concurrently(cr, name)
+                    existing[name] = None
+            for name, (table, expression) in wanted.items():
+                if not existing.get(name):
+                    indexes.create_index_concurrently(cr, name, table, SQL("USING gin (%s gin_trgm_ops)", expression))
+
+    @api.model
+    def _normalize_query(self, query):
+        return re.sub(r'\s+', ' ', query or '').strip().lower()
+
+    @api.model
+    def _resolve(self, query, model_names=None, limit=5):
+        """
+        Returns the best matches of ``query`` among the configured models the
+        current user may read, as ``{"model", "id", "display_name", "score"}``
+        dicts, best first.
+        """
+        query = self._normalize_query(query)
+        entity_fields = self._get_entity_fields()
+        model_names = sorted(name for name in (model_names or entity_fields) if name in entity_fields)
+        if not query or not model_names or not self.env.registry.has_trigram:
+            return []
+
+        cache = _caches[(self.env.cr.dbname, self.env.company.id)]
+        freshness = self.env['ai.agent.response.cache'].sudo()._get_freshness_token(model_names)
+        key = (query, tuple(model_names), limit)
+        cached = cache.get(key)
+        if cached is not None and cached[0] == freshness:
+            candidates = cached[1]
+        else:
+            candidates = self._query_candidates(query, model_names, entity_fields, limit)
+            cache.set(key, (freshness, candidates))
+
+        # The cache is shared by the company's users: check access every time.
+        return readable_matches(self.env, candidates, limit)
+
+    @api.model
+    def _query_candidates(self, query, model_names, entity_fields, limit):
+        """Single ``UNION ALL`` trigram query over all the models."""
+        threshold = params.get_float(
+            self.env, 'ai_agent_odoo.entity_similarity_threshold', DEFAULT_SIMILARITY_THRESHOLD, minimum=0)
+        self.env.cr.execute(SQL(
+            "SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)", str(threshold)))
+        subqueries = []
+        for model_name in model_names:
+            model = self.env[model_name]
+            for field_name in entity_fields[model_name]:
+                expression = self._get_field_expression(model, field_name)
+                subqueries.append(SQL(
+                    """
+                    (SELECT %(model)s AS model, id, word_similarity(%(query)s, %(expr)s) AS score
+                       FROM %(table)s
+                      WHERE %(query)s <%% %(expr)s
+                   ORDER BY score DESC
+                      LIMIT %(limit)s)
+                    """, model=model_name, query=query, expr=expression,
+                    table=SQL.identifier(model._table), limit=limit * 4,
+                ))
+        self.env.cr.execute(SQL(
+            "SELECT model, id, max(score) AS score FROM (%s) candidates GROUP BY model, id ORDER BY score DESC",
+            SQL(" UNION ALL ").join(subqueries),
+        ))
+        return self.env.cr.fetchall()
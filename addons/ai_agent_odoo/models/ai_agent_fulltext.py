@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import logging
+
+from odoo import api, models
+from odoo.tools.sql import SQL
+
+from ..tools import indexes, params
+from ..tools.access import readable_matches
+
+_logger = logging.getLogger(__name__)
+
+FTS_INDEX_PREFIX = 'ai_agent_fts_'
+# PostgreSQL text search configurations, by language code.
+TS_CONFIGS = {
+    'da': 'danish', 'de': 'german', 'en': 'english', 'es': 'spanish', 'fi': 'finnish',
+    'fr': 'french', 'hu': 'hungarian', 'it': 'italian', 'nb': 'norwegian', 'nl': 'dutch',
+    'pt': 'portuguese', 'ro': 'romanian', 'ru': 'russian', 'sv': 'swedish', 'tr': 'turkish',
+}
+TEXT_FIELD_TYPES = ('char', 'text', 'html', 'selection')
+
+
+def _index_name(table):
+    return indexes.index_name(FTS_INDEX_PREFIX, table)
+
+
+class AIAgentFulltext(models.AbstractModel):
+    """
+    Full-text search over Odoo records for the agent's lookups, instead of
+    ``ilike`` domains that scan whole tables.
+
+    The fields to index are set in the ``ai_agent_odoo.fts_fields`` system
+    parameter, as JSON: ``{"res.partner": ["name", "email", "comment"], ...}``
+    (the first field gets the highest rank weight). Each configured table gets
+    a GIN index on the tsvector expression of those fields, which searches
+    repeat so that PostgreSQL uses the index. Stemming follows the language of
+    ``ai_agent_odoo.fts_lang`` (by default the main company's language).
+
+    Indexes are built ``CONCURRENTLY`` by a cron triggered on configuration
+    changes, so building one neither blocks writes to the table nor runs in a
+    user's request; a model is only searched once its index is ready.
+    """
+    _name = 'ai.agent.fulltext'
+    _description = 'AI Assistant Full-Text Search'
+
+    def init(self):
+        super().init()
+        self._apply_fts_config()
+
+    @api.model
+    def _get_fts_fields(self):
+        return params.get_json(self.env, 'ai_agent_odoo.fts_fields')
+
+    @api.model
+    def _get_fts_lang(self):
+        return (self.env['ir.config_parameter'].sudo().get_param('ai_agent_odoo.fts_lang')
+                or self.env.ref('base.main_company').partner_id.lang or 'en_US')
+
+    @api.model
+    def _get_ts_config(self):
+        """PostgreSQL text search configuration matching the indexing language."""
+        config = TS_CONFIGS.get(self._get_fts_lang()[:2], 'simple')
+        self.env.cr.execute(SQL("SELECT 1 FROM pg_ts_config WHERE cfgname = %s", config))
+        return config if self.env.cr.rowcount else 'simple'
+
+    @api.model
+    def _get_tsvector_expression(self, model, field_names, ts_config, lang):
+        """Immutable ``tsvector`` expression over the indexed columns of ``model``."""
+        parts = []
+        for position, field_name in enumerate(field_names):
+            field = model._fields.get(field_name)
+            if not field or not field.store or not field.column_type or field.type not in TEXT_FIELD_TYPES:
+                _logger.warning("Field %s.%s cannot be full-text indexed", model._name, field_name)
+                continue
+            column = SQL.identifier(field_name)
+            if field.translate:
+                value = SQL("coalesce(%s->>%s, %s->>'en_US', '')", column, lang, column)
+            else:
+                value = SQL("coalesce(%s::text, '')", column)
+            weight = 'A' if position == 0 else 'B'
+            parts.append(SQL("setweight(to_tsvector(%s::regconfig, %s), %s::\"char\")", ts_config, value, weight))
+        return SQL(" || ").join(parts) if parts else None
+
+    @api.model
+    def _get_documents(self):
+        """
+        Returns ``{model: (tsvector expression, signature)}`` for the configured
+        models; the signature identifies the expression an index was built on.
+        """
+        ts_config, lang = self._get_ts_config(), self._get_fts_lang()
+        documents = {}
+        for model_name, field_names in self._get_fts_fields().items():
+            model = self.env.get(model_name)
+            if model is None or not model._auto or model._abstract:
+                continue
+            expression = self._get_tsvector_expression(model, field_names, ts_config, lang)
+            if expression:
+                signature = hashlib.sha1(expression.code.encode() + repr(expression.params).encode()).hexdigest()
+                documents[model] = (expression, signature)
+        return documents
+
+    @api.model
+    def _get_fts_indexes(self, cr=None):
+        """Returns ``{table: (index name, signature, valid)}`` of the existing full-text indexes."""
+        return {
+            table: (index, signature, valid)
+            for index, (table, signature, valid) in indexes.get_indexes(cr or self.env.cr, FTS_INDEX_PREFIX).items()
+        }
+
+    @api.model
+    def _apply_fts_config(self):
+        """Schedules the build of the full-text indexes after a configuration change."""
+        cron = self.env.ref('ai_agent_odoo.ir_cron_ai_agent_fulltext_index', raise_if_not_found=False)
+        if cron:
+            cron._trigger()
+
+    @api.model
+    def _build_fts_indexes(self):
+        """
+        Creates, rebuilds or drops the GIN indexes to match the configuration.
+        Up-to-date indexes are left untouched: the signature of their expression
+        is kept in the index comment. Indexes whose concurrent build failed are
+        invalid and are rebuilt.
+
+        See ``tools/indexes.py`` for the concurrent builds.
+        """
+        wanted = {model._table: document for model, document in self._get_documents().items()}
+        with indexes.autocommit_cursor(self.env) as cr:
+            existing = self._get_fts_indexes(cr)
+            for table, (index, signature, valid) in existing.items():
+                if not valid or table not in wanted or wanted[table][1] != signature:
+                    indexes.drop_index_concurrently(cr, index)
+                    existing[table] = None
+            for table, (expression, signature) in wanted.items():
+                if not existing.get(table):
+                    indexes.create_index_concurrently(
+                        cr, _index_name(table), table, SQL("USING gin ((%s))", expression), comment=signature)
+
+    @api.model
+    def _search_fulltext(self, query, limit=10, model_names=None):
+        """
+        Ranked full-text search across the indexed models, in a single query.
+        Returns the ``limit`` best records the current user may read, as
+        ``{"model", "id", "display_name", "rank"}`` dicts.
+        """
+        if not (query or '').strip():
+            return []
+        documents = {model._name: (model, expression, signature)
+                     for model, (expression, signature) in self._get_documents().items()}
+        indexes = self._get_fts_indexes()
+        # Only models whose index is built on the current expression.
+        targets = []
+        for model_name in model_names or list(documents):
+            model, expression, signature = documents.get(model_name, (None, None, None))
+            index = model is not None and indexes.get(model._table)
+            if index and index[1] == signature and index[2]:
+                targets.append((model, expression))
+        if not targets:
+            return []
+        ts_config = self._get_ts_config()
+        # Fetch more candidates than needed, to leave room for access filtering.
+        subqueries = [SQL(
+            """
+            (SELECT %(model)s AS model, id, ts_rank_cd(%(document)s, query) AS rank
+               FROM %(table)s, websearch_to_tsquery(%(config)s::regconfig, %(query)s) query
+              WHERE %(document)s @@ query
+           ORDER BY rank DESC
+              LIMIT %(limit)s)
+            """, model=model._name, table=SQL.identifier(model._table), document=expression,
+            config=ts_config, query=query, limit=limit * 4,
+        ) for model, expression in targets]
+        self.env.cr.execute(SQL("%s ORDER BY rank DESC", SQL(" UNION ALL ").join(subqueries)))
+        candidates = self.env.cr.fetchall()
+
+        return readable_matches(self.env, candidates, limit, score_name='rank')
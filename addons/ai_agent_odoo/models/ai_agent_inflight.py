@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+import time
+
+from odoo import _, api, fields, models
+from odoo.exceptions import UserError
+from odoo.tools import SQL
+
+from ..tools import metrics
+
+# How often followers poll the shared row, and the leader publishes its
+# partial answer to it, in seconds.
+POLL_INTERVAL = 0.3
+# Margin added to the AI service timeouts before a computation whose leader
+# stopped updating it is considered abandoned, in seconds.
+STALE_MARGIN = 30
+# Finished computations are kept this long for late followers, in seconds.
+INFLIGHT_GC_AGE = 3600
+
+
+class AIAgentInflight(models.Model):
+    """
+    Single-flight coalescing of identical agent requests. The first request
+    for a response cache key becomes the leader and calls the AI service;
+    concurrent requests with the same key, in any worker, follow the shared
+    row instead, receiving the partial answer as the leader publishes it and
+    the final answer once it is done.
+
+    The cache key covers the user's access context, so only requests that
+    would have been answered from the same cache entry are coalesced. By
+    default the context includes the user id, and coalescing joins a user's
+    own identical requests, such as a double submit or the same question
+    asked from two tabs. With ``ai_agent_odoo.share_across_users`` set, the
+    first questions of users with the same groups, companies and language
+    are coalesced too; see ``ai.agent.response.cache._get_access_key``.
+    """
+    _name = 'ai.agent.inflight'
+    _description = 'AI Assistant In-flight Request'
+    _log_access = False
+
+    key = fields.Char(string='Key', required=True, readonly=True)
+    state = fields.Selection(
+        [('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')],
+        string='Status', required=True, readonly=True)
+    partial = fields.Text(string='Partial Response', readonly=True)
+    response = fields.Text(string='Response', readonly=True)
+    error = fields.Text(string='Error', readonly=True)
+    updated_at = fields.Datetime(string='Updated At', required=True, readonly=True)
+
+    _sql_constraints = [
+        ('key_unique', 'unique(key)', "Only one request may be in flight per key."),
+    ]
+
+    @api.model
+    def _get_stale_after(self, config):
+        """Seconds without update after which a leader is presumed dead."""
+        return sum(config.timeout) + STALE_MARGIN
+
+    @api.model
+    def _acquire(self, key, stale_after):
+        """
+        Registers a computation for ``key`` and returns whether this request
+        leads it. A finished or abandoned computation is taken over. The
+        caller must commit right away for followers to see the claim.
+        """
+        self.env.cr.execute(SQL("""
+            INSERT INTO ai_agent_inflight AS inflight (key, state, partial, updated_at)
+                 VALUES (%(key)s, 'running', '', clock_timestamp() at time zone 'UTC')
+            ON CONFLICT (key) DO UPDATE
+                    SET state = 'running', partial = '', response = NULL, error = NULL,
+                        updated_at = EXCLUDED.updated_at
+                  WHERE inflight.state != 'running'
+                     OR inflight.updated_at < EXCLUDED.updated_at - make_interval(secs => %(stale_after)s)
+              RETURNING id
+        """, key=key, stale_after=stale_after))
+        leader = bool(self.env.cr.fetchone())
+        if not leader:
+            metrics.increment(self.env.cr.dbname, 'ai_agent_coalesced_requests_total')
+        return leader
+
+    @api.model
+    def _publish(self, key, partial):
+        """Shares the leader's partial answer, which also proves it is alive."""
+        self._update(key, SQL("partial = %s", partial))
+
+    @api.model
+    def _resolve(self, key, response):
+        self._update(key, SQL("state = 'done', partial = %(response)s, response = %(response)s", response=response))
+
+    @api.model
+    def _fail(self, key, error):
+        self._update(key, SQL("state = 'failed', error = %s", error))
+
+    @api.model
+    def _update(self, key, assignments):
+        self.env.cr.execute(SQL(
+            "UPDATE ai_agent_inflight SET %s, updated_at = clock_timestamp() at time zone 'UTC'"
+            " WHERE key = %s AND state = 'running'",
+            assignments, key,
+        ))
+
+    @api.model
+    def _follow(self, key, stale_after):
+        """
+        Waits for the computation of ``key`` led by another request. Yields
+        ``('delta', text)`` as the partial answer grows, then ``('done',
+        response)``; raises ``UserError`` if the leader fails or vanishes.
+
+        The cursor is committed between polls to see the leader's updates,
+        so it must hold no pending work of the caller.
+        """
+        sent = 0
+        while True:
+            self.env.cr.commit()
+            self.env.cr.execute(SQL("""
+                SELECT state, partial, response, error,
+                       updated_at < now() at time zone 'UTC' - make_interval(secs => %s)
+                  FROM ai_agent_inflight
+                 WHERE key = %s
+            """, stale_after, key))
+            row = self.env.cr.fetchone()
+            if not row:
+                raise UserError(_("The identical request this one was waiting for was lost."))
+            state, partial, response, error, stale = row
+            if state == 'done':
+                if len(response) > sent:
+                    yield 'delta', response[sent:]
+                yield 'done', response
+                return
+            if state == 'failed':
+                raise UserError(error)
+            if stale:
+                raise UserError(_("The identical request this one was waiting for stopped responding."))
+            if partial and len(partial) > sent:
+                yield 'delta', partial[sent:]
+                sent = len(partial)
+            time.sleep(POLL_INTERVAL)
+
+    @api.autovacuum
+    def _gc_inflight(self):
+        self.env.cr.execute(SQL(
+            "DELETE FROM ai_agent_inflight WHERE updated_at < now() at time zone 'UTC' - make_interval(secs => %s)",
+            INFLIGHT_GC_AGE,
+        ))
@@ -0,0 +1,458 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta, timezone
+
+import requests
+
+from odoo import SUPERUSER_ID, _, api, fields, models
+from odoo.exceptions import UserError
+from odoo.modules.registry import Registry
+from odoo.tools import SQL, config
+
+from ..tools import gateway, metrics, params, tracing
+from ..tools.signing import DEFAULT_TOOL_TOKEN_TTL, sign_tool_token
+
+_logger = logging.getLogger(__name__)
+
+# Streamed deltas are pushed to the browser at most this often, in seconds.
+DELTA_FLUSH_INTERVAL = 0.3
+# A running job whose lease was not renewed for this long, in seconds, is
+# considered orphaned by a crashed worker and is requeued.
+DEFAULT_JOB_LEASE = 60
+DEFAULT_JOB_MAX_ATTEMPTS = 3
+# Priority lanes. Each one has its own budget of jobs run concurrently on a
+# single node, across all of its cron workers, so interactive turns never
+# queue behind batch work.
+LANES = [('interactive', 'Interactive'), ('batch', 'Batch')]
+DEFAULT_LANE_CONCURRENCY = {'interactive': 4, 'batch': 2}
+# Seconds a queued job must wait to gain the priority of one running job of
+# its user; this keeps heavy users from starving forever.
+DEFAULT_JOB_AGING = 30
+# How often, in seconds, busy runners look for newly queued jobs.
+POLL_INTERVAL = 1
+# Number of runner crons: each one can be picked up by a different node.
+DEFAULT_RUNNER_SLOTS = 4
+# Seconds a runner keeps claiming jobs before it hands over to a new cron run,
+# so that a busy queue doesn't hold a cron worker forever. The cron worker's
+# real-time limit lowers it, see _get_runner_claim_seconds().
+DEFAULT_RUNNER_MAX_SECONDS = 300
+# Seconds kept in hand before the cron worker's real-time limit.
+RUNNER_TIME_MARGIN = 10
+RUNNER_CODE = 'model._run_queued_jobs()'
+
+
+def _to_user_weights(config):
+    return {login: float(weight) for login, weight in config.items() if float(weight) > 0}
+
+
+def _get_cron_time_limit():
+    """Real time, in seconds, a cron worker may run before it is killed, or None."""
+    if not config['workers']:
+        return None
+    limit = config['limit_time_real_cron']
+    if limit is None or limit < 0:
+        limit = config['limit_time_real']
+    return limit or None
+
+
+def _get_node():
+    """Name of the host this worker runs on, used for per-node limits."""
+    return socket.gethostname()
+
+
+def _timestamp(value):
+    """Unix timestamp of a naive UTC datetime."""
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+def _run_job(dbname, job_id):
+    """Runs a claimed job in its own cursor, from a runner thread."""
+    with Registry(dbname).cursor() as cr:
+        env = api.Environment(cr, SUPERUSER_ID, {})
+        env['ai.agent.job'].browse(job_id)._run()
+
+
+class AIAgentJob(models.Model):
+    """
+    An agent turn executed in the background. The invoke route only enqueues
+    the job and returns; a cron worker calls the AI service and pushes the
+    answer to the user's browser over the bus, as it is generated. HTTP
+    workers are therefore never held for the duration of a model call.
+
+    Jobs are scheduled in priority lanes with separate budgets. Within a
+    lane, users get a share of the slots proportional to their weight, and
+    jobs gain priority as they wait.
+    """
+    _name = 'ai.agent.job'
+    _description = 'AI Assistant Job'
+    _order = 'id'
+
+    conversation_id = fields.Many2one(
+        'ai.agent.conversation', string='Conversation', required=True, index=True, ondelete='cascade')
+    message_id = fields.Many2one('ai.agent.message', string='Message', required=True, ondelete='cascade')
+    user_id = fields.Many2one('res.users', string='User', required=True, index=True, ondelete='cascade')
+    lane = fields.Selection(LANES, string='Lane', required=True, default='interactive', index=True)
+    state = fields.Selection(
+        [('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')],
+        string='Status', required=True, default='queued', index=True)
+    payload = fields.Json(string='Payload')
+    context = fields.Json(string='Context', help="Companies and language of the request that created the job.")
+    cache_key = fields.Char(string='Cache Key')
+    error = fields.Text(string='Error')
+    enqueued_at = fields.Datetime(string='Enqueued At', default=fields.Datetime.now)
+    started_at = fields.Datetime(string='Started At')
+    finished_at = fields.Datetime(string='Finished At')
+    node = fields.Char(string='Node', help="Host running the job.")
+    worker = fields.Char(string='Worker', help="Process running the job, as host:pid.")
+    heartbeat_at = fields.Datetime(string='Last Heartbeat')
+    lease_expires_at = fields.Datetime(string='Lease Expires At', index=True)
+    attempts = fields.Integer(string='Attempts', default=0)
+    traceparent = fields.Char(string='Trace Parent', help="Trace of the turn, continued by the job.")
+    trace_start = fields.Float(string='Turn Start', help="Start time of the turn, as a Unix timestamp.")
+
+    @api.model
+    def _enqueue(self, conversation, message, payload, cache_key, lane='interactive'):
+        # The tool token is issued when the job starts, don't store this one.
+        payload = dict(payload, odoo_credentials={
+            key: value for key, value in (payload.get('odoo_credentials') or {}).items() if key != 'tool_token'})
+        job = self.sudo().create({
+            'conversation_id': conversation.id,
+            'message_id': message.id,
+            'user_id': self.env.uid,
+            'payload': payload,
+            'context': {'allowed_company_ids': self.env.companies.ids, 'lang': self.env.lang},
+            'cache_key': cache_key,
+            'lane': lane,
+            'traceparent': tracing.current() and tracing.current().traceparent(),
+            'trace_start': tracing.current() and tracing.current().start,
+        })
+        self._trigger_runners()
+        return job
+
+    @api.model
+    def _get_job_param(self, key, default):
+        return params.get_int(self.env, 'ai_agent_odoo.%s' % key, default)
+
+    @api.model
+    def _get_runner_crons(self):
+        return self.env['ir.cron'].sudo().search([
+            ('model_id.model', '=', self._name), ('code', '=', RUNNER_CODE)], order='id')
+
+    @api.model
+    def _ensure_runner_crons(self):
+        """
+        Creates one runner cron per slot. A cron only runs on one node at a
+        time, so several of them are needed to spread jobs across nodes.
+        """
+        crons = self._get_runner_crons()
+        slots = max(1, self._get_job_param('job_runner_slots', DEFAULT_RUNNER_SLOTS))
+        template = self.env.ref('ai_agent_odoo.ir_cron_ai_agent_job_runner', raise_if_not_found=False)
+        if not template:
+            return crons
+        for slot in range(len(crons) + 1, slots + 1):
+            crons |= template.copy({'name': _("%(name)s (slot %(slot)s)", name=template.name, slot=slot)})
+        crons[slots:].unlink()
+        return crons[:slots]
+
+    @api.model
+    def _trigger_runners(self, at=None):
+        """Wakes up as many runner crons as there are queued jobs."""
+        self.env.flush_all()
+        self.env.cr.execute("SELECT count(*) FROM ai_agent_job WHERE state = 'queued'")
+        queued = self.env.cr.fetchone()[0]
+        for cron in self._get_runner_crons()[:max(queued, 1)]:
+            cron._trigger(at)
+
+    def _notify(self, values):
+        """Pushes a job update to the user's browser tabs."""
+        self.ensure_one()
+        self.env['bus.bus']._sendone(self.user_id.partner_id, 'ai_agent_odoo/job_update', dict(
+            values, job_id=self.id, conversation_id=self.conversation_id.id))
+
+    @api.model
+    def _requeue_expired_jobs(self):
+        """
+        Requeues running jobs whose lease expired, i.e. whose worker died
+        without finishing them. Jobs that already used up their attempts are
+        marked as failed instead.
+        """
+        max_attempts = self._get_job_param('job_max_attempts', DEFAULT_JOB_MAX_ATTEMPTS)
+        self.env.cr.execute(SQL("""
+            UPDATE ai_agent_job
+               SET state = CASE WHEN attempts < %(max_attempts)s THEN 'queued' ELSE 'failed' END,
+                   finished_at = CASE WHEN attempts < %(max_attempts)s THEN NULL ELSE now() at time zone 'UTC' END,
+                   error = CASE WHEN attempts < %(max_attempts)s THEN error ELSE %(error)s END,
+                   node = NULL, worker = NULL, lease_expires_at = NULL
+             WHERE id IN (
+                SELECT id FROM ai_agent_job
+                 WHERE state = 'running' AND lease_expires_at < now() at time zone 'UTC'
+                   FOR UPDATE SKIP LOCKED)
+         RETURNING id, state
+        """, max_attempts=max_attempts, error=_("The job was interrupted too many times.")))
+        rows = self.env.cr.fetchall()
+        if rows:
+            _logger.warning("Requeued %s orphaned AI Agent job(s)", len(rows))
+            self.invalidate_model()
+            for job in self.browse([job_id for job_id, state in rows if state == 'failed']):
+                job._notify({'state': 'failed', 'error': job.error})
+        return rows
+
+    @api.model
+    def _get_user_weights(self):
+        """Scheduling weight of each user id, from ``job_user_weights`` keyed by login."""
+        weights = params.get_json(self.env, 'ai_agent_odoo.job_user_weights', convert=_to_user_weights)
+        if not weights:
+            return {}
+        users = self.env['res.users'].sudo().with_context(active_test=False).search([('login', 'in', list(weights))])
+        return {str(user.id): weights[user.login] for user in users}
+
+    @api.model
+    def _claim_jobs(self, lane, limit):
+        """
+        Claims up to ``limit`` queued jobs of ``lane`` for this worker. Rows
+        locked by another node's claim are skipped, so concurrent runners
+        never pick the same job and never wait on each other.
+
+        Jobs are taken in weighted fair order: a user's next job ranks after
+        the jobs that user already runs or has queued before it, divided by
+        the user's weight, minus one rank per ``job_aging`` seconds waited.
+        """
+        if limit <= 0:
+            return self.browse()
+        lease = self._get_job_param('job_lease', DEFAULT_JOB_LEASE)
+        aging = max(1, self._get_job_param('job_aging', DEFAULT_JOB_AGING))
+        # Window functions can't be combined with FOR UPDATE: the candidates
+        # are ranked first, then locked in that order.
+        self.env.cr.execute(SQL("""
+            WITH running AS (
+                SELECT user_id, count(*) AS jobs
+                  FROM ai_agent_job
+                 WHERE state = 'running' AND lane = %(lane)s
+              GROUP BY user_id
+            ), ranked AS (
+                SELECT ARRAY(
+                    SELECT job.id
+                      FROM ai_agent_job job
+                 LEFT JOIN running ON running.user_id = job.user_id
+                     WHERE job.state = 'queued' AND job.lane = %(lane)s
+                  ORDER BY (COALESCE(running.jobs, 0) + row_number() OVER (PARTITION BY job.user_id ORDER BY job.id))
+                           / COALESCE((%(weights)s::jsonb ->> job.user_id::text)::float, 1)
+                           - extract(epoch FROM now() at time zone 'UTC' - job.enqueued_at) / %(aging)s,
+                           job.id
+                     LIMIT %(window)s
+                ) AS ids
+            )
+            UPDATE ai_agent_job
+               SET state = 'running', node = %(node)s, worker = %(worker)s,
+                   started_at = now() at time zone 'UTC', heartbeat_at = now() at time zone 'UTC',
+                   lease_expires_at = now() at time zone 'UTC' + make_interval(secs => %(lease)s),
+                   attempts = attempts + 1
+             WHERE id IN (
+                SELECT job.id
+                  FROM ai_agent_job job, ranked
+                 WHERE job.id = ANY(ranked.ids) AND job.state = 'queued'
+              ORDER BY array_position(ranked.ids, job.id)
+                 LIMIT %(limit)s
+                   FOR UPDATE OF job SKIP LOCKED)
+         RETURNING id
+        """, lane=lane, weights=json.dumps(self._get_user_weights()), aging=aging, window=limit * 4 + 16,
+            node=_get_node(), worker='%s:%s' % (_get_node(), os.getpid()), lease=lease, limit=limit))
+        jobs = self.browse(sorted(row[0] for row in self.env.cr.fetchall()))
+        self.invalidate_model()
+        # Release the row locks right away, the claim is recorded in the lease.
+        self.env.cr.commit()
+        return jobs
+
+    @api.model
+    def _get_lane_budgets(self):
+        return {
+            lane: max(0, self._get_job_param('job_concurrency_%s' % lane, DEFAULT_LANE_CONCURRENCY[lane]))
+            for lane, _label in LANES
+        }
+
+    @api.model
+    def _get_node_capacity(self):
+        """Number of jobs of each lane this node may still start."""
+        self.env.cr.execute(SQL("""
+            SELECT lane, count(*) FROM ai_agent_job
+             WHERE state = 'running' AND node = %s AND lease_expires_at >= now() at time zone 'UTC'
+          GROUP BY lane
+        """, _get_node()))
+        running = dict(self.env.cr.fetchall())
+        return {lane: budget - running.get(lane, 0) for lane, budget in self._get_lane_budgets().items()}
+
+    @api.model
+    def _claim_node_jobs(self, lane, limit):
+        """
+        Claims up to ``limit`` queued jobs of ``lane``, within what is left of
+        the lane's budget on this node. The node's runners take turns, under an
+        advisory lock, to count the running jobs and claim: otherwise two of
+        them could both fill the same free slots.
+        """
+        cr = self.env.cr
+        key = 'ai_agent_job:%s:%s' % (_get_node(), lane)
+        cr.execute(SQL("SELECT pg_advisory_lock(hashtext(%s))", key))
+        try:
+            # A session lock, committed at once: the snapshot of the transaction
+            # that waited for it predates the previous holder's claim.
+            cr.commit()
+            return self._claim_jobs(lane, min(limit, self._get_node_capacity()[lane]))
+        except Exception:
+            cr.rollback()
+            raise
+        finally:
+            cr.execute(SQL("SELECT pg_advisory_unlock(hashtext(%s))", key))
+
+    def _heartbeat(self):
+        """Renews the lease of the jobs in ``self``, which this worker runs."""
+        if not self:
+            return
+        lease = self._get_job_param('job_lease', DEFAULT_JOB_LEASE)
+        self.env.cr.execute(SQL("""
+            UPDATE ai_agent_job
+               SET heartbeat_at = now() at time zone 'UTC',
+                   lease_expires_at = now() at time zone 'UTC' + make_interval(secs => %s)
+             WHERE id IN %s AND state = 'running'
+        """, lease, tuple(self.ids)))
+        self.env.cr.commit()
+
+    @api.model
+    def _get_runner_claim_seconds(self):
+        """
+        Seconds a runner may keep claiming jobs: ``job_runner_max_seconds``,
+        lowered so that the jobs claimed last can still finish before the
+        cron worker is killed by ``limit_time_real_cron`` (or
+        ``limit_time_real``). A job is given one gateway read timeout, plus
+        a safety margin. Jobs still running at the limit are killed with the
+        worker and requeued when their lease expires.
+        """
+        seconds = max(0, self._get_job_param('job_runner_max_seconds', DEFAULT_RUNNER_MAX_SECONDS))
+        limit = _get_cron_time_limit()
+        if limit:
+            read_timeout = gateway.GatewayConfig(self.env).timeout[1]
+            seconds = min(seconds, max(0, limit - read_timeout - RUNNER_TIME_MARGIN))
+        return seconds
+
+    @api.model
+    def _run_queued_jobs(self):
+        """
+        Cron entry point: claims queued jobs and runs them in parallel threads,
+        up to each lane's budget on this node, until the queue is empty. New
+        jobs are polled for while waiting, so an interactive turn is started
+        within a second even when this runner is busy with batch jobs. Leases
+        of running jobs are renewed meanwhile.
+
+        Once the time given by :meth:`_get_runner_claim_seconds` is spent, no
+        more jobs are claimed: the runner waits for its running jobs, wakes
+        the runner crons up again, and returns. Jobs are always claimed once.
+        """
+        self._requeue_expired_jobs()
+        self.env.cr.commit()
+        lease = self._get_job_param('job_lease', DEFAULT_JOB_LEASE)
+        deadline = time.monotonic() + self._get_runner_claim_seconds()
+        budgets = self._get_lane_budgets()
+        dbname = self.env.cr.dbname
+        running = {}
+        expired = False
+        last_heartbeat = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(1, sum(budgets.values())), thread_name_prefix='ai_agent_job') as executor:
+            while True:
+                if not expired:
+                    for lane, _label in LANES:
+                        # Bounded by this runner's own lane usage too, in case
+                        # another runner's jobs on this node just finished.
+                        mine = sum(1 for _job_id, job_lane in running.values() if job_lane == lane)
+                        for job in self._claim_node_jobs(lane, budgets[lane] - mine):
+                            running[executor.submit(_run_job, dbname, job.id)] = (job.id, lane)
+                if not running:
+                    break
+                expired = time.monotonic() >= deadline
+                done, _pending = wait(running, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_id, _lane = running.pop(future)
+                    if future.exception():
+                        _logger.error("AI Agent job %s crashed", job_id, exc_info=future.exception())
+                if time.monotonic() - last_heartbeat >= lease / 3:
+                    self.browse([job_id for job_id, _lane in running.values()])._heartbeat()
+                    last_heartbeat = time.monotonic()
+        if expired:
+            # The cron deletes the triggers that are due when this run ends:
+            # schedule the next run just after it.
+            self._trigger_runners(at=fields.Datetime.now() + timedelta(seconds=POLL_INTERVAL))
+            self.env.cr.commit()
+
+    def _run(self):
+        self.ensure_one()
+        metrics.observe(self.env.cr.dbname, 'ai_agent_job_queue_seconds',
+                        (self.started_at - self.enqueued_at).total_seconds(), lane=self.lane)
+        # Datetimes are truncated to the second: don't start before the turn.
+        enqueued = max(_timestamp(self.enqueued_at), self.trace_start or 0)
+        started = max(_timestamp(self.started_at), enqueued)
+        Trace = self.env['ai.agent.trace']
+        trace = Trace._new_trace('job', self.traceparent, cr=self.env.cr, start=enqueued)
+        trace.info.update(user_id=self.user_id.id, conversation_id=self.conversation_id.id)
+        trace.add_span('queue', enqueued, started, lane=self.lane, attempt=self.attempts)
+        error = None
+        with tracing.activate(trace):
+            try:
+                response = self._call_agent()
+                user_env = self._get_user_env()
+                with tracing.span('conversation.finish_turn'):
+                    user_env['ai.agent.conversation'].browse(self.conversation_id.id)._finish_turn(
+                        user_env['ai.agent.message'].browse(self.message_id.id), response, self.cache_key)
+                self._set_finished({'state': 'done'})
+                self._notify({'state': 'done', 'response': response})
+            except Exception as e:  # noqa: BLE001 - report every failure to the user
+                error = e
+                self.env.cr.rollback()
+                _logger.warning("AI Agent job %s failed: %s", self.id, e, exc_info=not isinstance(
+                    e, (UserError, requests.RequestException)))
+                self._set_finished({'state': 'failed', 'error': str(e)})
+                self._notify({'state': 'failed', 'error': str(e)})
+        self.env.cr.commit()
+        trace.finish(error)
+        Trace._save(trace, duration=time.time() - (self.trace_start or trace.start))
+        self.env['ai.agent.metric']._flush_if_due()
+
+    def _set_finished(self, values):
+        self.write(dict(values, finished_at=fields.Datetime.now(), lease_expires_at=False))
+
+    def _get_user_env(self):
+        """Environment of the user and companies who submitted the job."""
+        self.ensure_one()
+        return self.with_user(self.user_id).with_context(**(self.context or {})).env
+
+    def _call_agent(self):
+        """Streams the answer from the AI service, pushing deltas over the bus."""
+        self.ensure_one()
+        config = gateway.GatewayConfig(self.env)
+        if not config.service_url:
+            raise UserError(_("AI Agent URL is not configured in Odoo's System Parameters."))
+        payload = dict(self.payload or {}, stream=True)
+        # The job may have waited in the queue: issue the tool token now.
+        ttl = params.get_int(self.env, 'ai_agent_odoo.tool_token_ttl', DEFAULT_TOOL_TOKEN_TTL, minimum=1)
+        payload['odoo_credentials'] = dict(payload.get('odoo_credentials') or {}, tool_token=sign_tool_token(
+            self._get_user_env(), ttl, message_id=self.message_id.id))
+
+        parts, pending, last_flush = [], [], time.monotonic()
+        start = last_flush
+        with tracing.span('upstream'), gateway.post(
+            config, gateway.INVOKE_PATH, payload, stream=True, headers={'Accept': 'text/event-stream'},
+        ) as response:
+            if not response.ok:
+                raise UserError(_("The AI service returned an error (%(status)s): %(error)s",
+                                  status=response.status_code, error=response.text))
+            for delta in metrics.timed_deltas(self.env.cr.dbname, gateway.iter_deltas(response), start, 'job'):
+                parts.append(delta)
+                pending.append(delta)
+                if time.monotonic() - last_flush >= DELTA_FLUSH_INTERVAL:
+                    self._notify({'state': 'running', 'delta': ''.join(pending)})
+                    # Bus notifications are only sent on commit.
+                    self.env.cr.commit()
+                    pending, last_flush = [], time.monotonic()
+        return ''.join(parts)
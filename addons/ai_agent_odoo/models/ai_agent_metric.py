@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+import logging
+import math
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+from ..tools import metrics
+from .ai_agent_job import LANES
+
+_logger = logging.getLogger(__name__)
+
+# Workers add their buffered measurements to the shared table at most this
+# often, in seconds.
+FLUSH_INTERVAL = 5
+
+
+class AIAgentMetric(models.Model):
+    """
+    Totals of the AI Assistant metrics, summed over every worker process.
+    Workers buffer measurements in memory (see ``tools.metrics``) and add them
+    here with one upsert per flush; the metrics route exports the table in
+    the Prometheus text format, with the gauges of the job queue, which are
+    read from the jobs themselves.
+    """
+    _name = 'ai.agent.metric'
+    _description = 'AI Assistant Metric'
+    _log_access = False
+
+    name = fields.Char(string='Name', required=True, readonly=True)
+    labels = fields.Char(string='Labels', required=True, readonly=True, default='')
+    le = fields.Char(string='Bucket', required=True, readonly=True, default='')
+    value = fields.Float(string='Value', readonly=True)
+
+    _sql_constraints = [
+        ('series_unique', 'unique(name, labels, le)', "A metric series is stored only once."),
+    ]
+
+    @api.model
+    def _flush(self, interval=0):
+        """
+        Adds this worker's buffered measurements to the shared totals, in a
+        transaction of its own so they survive a rollback of the caller's.
+        """
+        dbname = self.env.cr.dbname
+        series = metrics.drain(dbname, interval)
+        if not series:
+            return
+        # Sorted so concurrent flushes lock the rows in the same order.
+        rows = sorted(
+            (name, ','.join('%s="%s"' % pair for pair in labels), le, value)
+            for (name, labels, le), value in series.items()
+        )
+        try:
+            with self.pool.cursor() as cr:
+                cr.execute(SQL("""
+                    INSERT INTO ai_agent_metric AS metric (name, labels, le, value)
+                         VALUES %s
+                    ON CONFLICT (name, labels, le) DO UPDATE
+                            SET value = metric.value + EXCLUDED.value
+                """, SQL(', ').join(SQL('(%s, %s, %s, %s)', *row) for row in rows)))
+        except Exception:  # noqa: BLE001 - metrics must never break a request
+            _logger.warning("Could not flush the AI Agent metrics", exc_info=True)
+            metrics.restore(dbname, series)
+
+    @api.model
+    def _flush_if_due(self):
+        self._flush(FLUSH_INTERVAL)
+
+    @api.model
+    def _export_prometheus(self):
+        """Returns the metrics in the Prometheus text exposition format."""
+        self.env.cr.execute("SELECT name, labels, le, value FROM ai_agent_metric ORDER BY name, labels")
+        counters, histograms = {}, {}
+        for name, labels, le, value in self.env.cr.fetchall() + self._get_job_gauges():
+            if name.endswith('_bucket'):
+                histograms.setdefault(name[:-len('_bucket')], {}).setdefault(labels, []).append((le, value))
+            else:
+                counters[name, labels] = value
+        lines = []
+        histogram_series = {
+            base + suffix for base in histograms for suffix in ('_sum', '_count')
+        }
+        typed = set()
+        for (name, labels), value in counters.items():
+            if name in histogram_series:
+                continue
+            if name not in typed:
+                lines.append('# TYPE %s %s' % (name, 'counter' if name.endswith('_total') else 'gauge'))
+                typed.add(name)
+            lines.append(self._format_sample(name, labels, value))
+        for base, series in sorted(histograms.items()):
+            lines.append('# TYPE %s histogram' % base)
+            for labels, buckets in sorted(series.items()):
+                counts = dict(buckets)
+                cumulative = 0
+                for bound in [str(bound) for bound in metrics.LATENCY_BUCKETS] + ['+Inf']:
+                    cumulative += counts.get(bound, 0)
+                    le = 'le="%s"' % bound
+                    lines.append(self._format_sample(
+                        base + '_bucket', ','.join(filter(None, [labels, le])), cumulative))
+                for suffix in ('_sum', '_count'):
+                    lines.append(self._format_sample(
+                        base + suffix, labels, counters.get((base + suffix, labels), 0)))
+        return '\n'.join(lines) + '\n'
+
+    @api.model
+    def _get_job_gauges(self):
+        """Rows of the ``ai_agent_jobs`` gauge: the queued and running jobs, by lane."""
+        self.env.cr.execute(SQL(
+            """
+            SELECT lane, state, count(*) FROM ai_agent_job
+             WHERE state IN ('queued', 'running')
+          GROUP BY lane, state
+            """
+        ))
+        counts = {(lane, state): count for lane, state, count in self.env.cr.fetchall()}
+        return sorted(
+            ('ai_agent_jobs', 'lane="%s",state="%s"' % (lane, state), '', counts.get((lane, state), 0))
+            for lane, _label in LANES for state in ('queued', 'running')
+        )
+
+    @api.model
+    def _format_sample(self, name, labels, value):
+        value = int(value) if math.isfinite(value) and value == int(value) else value
+        return '%s{%s} %s' % (name, labels, value) if labels else '%s %s' % (name, value)
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import logging
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+from ..tools import metrics
+from ..tools.ratelimit import LocalBuckets, RateLimitExceeded, parse_limit
+
+_logger = logging.getLogger(__name__)
+
+# Limits as "<requests>/<seconds>", overridable with the
+# ``ai_agent_odoo.rate_limit_<scope>`` parameters; an empty value or 0 disables one.
+DEFAULT_RATE_LIMITS = {
+    'user': '20/60',
+    'company': '300/60',
+    'api_key': '1200/60',
+}
+# Where buckets are kept, set with ``ai_agent_odoo.rate_limit_backend``:
+# 'database' shares them between all workers and nodes; 'memory' keeps them in
+# each process, which only limits correctly with a single Odoo process.
+RATE_LIMIT_BACKENDS = ('database', 'memory')
+DEFAULT_RATE_LIMIT_BACKEND = 'database'
+# Buckets idle for this long are full again and can be dropped, in seconds.
+BUCKET_GC_AGE = 86400
+
+_local_buckets = LocalBuckets()
+
+
+class AIAgentRateBucket(models.Model):
+    """
+    Token buckets limiting the rate of agent requests per user, per company
+    and per AI service API key, so a single user or tenant can't saturate the
+    AI service and the Odoo workers.
+
+    Buckets live in the database so all workers share them, and are consumed
+    with one upsert each. With ``ai_agent_odoo.rate_limit_backend`` set to
+    ``memory``, they are kept in the process instead, for single-process
+    deployments.
+    """
+    _name = 'ai.agent.rate.bucket'
+    _description = 'AI Assistant Rate Limit Bucket'
+    _log_access = False
+
+    key = fields.Char(string='Key', required=True, readonly=True)
+    tokens = fields.Float(string='Tokens', readonly=True)
+    refilled_at = fields.Datetime(string='Refilled At', required=True, readonly=True)
+
+    _sql_constraints = [
+        ('key_unique', 'unique(key)', "A rate limit bucket must be unique."),
+    ]
+
+    @api.model
+    def _get_limits(self, env):
+        """Returns the ``(key, capacity, rate)`` buckets a request of ``env`` draws from."""
+        get_param = self.env['ir.config_parameter'].sudo().get_param
+        api_key = get_param('ai_agent_odoo.api_key')
+        keys = {
+            'user': 'user:%s' % env.uid,
+            'company': 'company:%s' % env.company.id,
+            'api_key': api_key and 'api_key:%s' % hashlib.sha256(api_key.encode()).hexdigest()[:16],
+        }
+        limits = []
+        for scope, default in DEFAULT_RATE_LIMITS.items():
+            limit = keys[scope] and parse_limit(get_param('ai_agent_odoo.rate_limit_%s' % scope, default))
+            if limit:
+                limits.append((keys[scope], *limit))
+        return limits
+
+    @api.model
+    def _get_backend(self):
+        backend = self.env['ir.config_parameter'].sudo().get_param(
+            'ai_agent_odoo.rate_limit_backend', DEFAULT_RATE_LIMIT_BACKEND)
+        if backend not in RATE_LIMIT_BACKENDS:
+            _logger.warning("Invalid ai_agent_odoo.rate_limit_backend parameter: %r", backend)
+            return DEFAULT_RATE_LIMIT_BACKEND
+        return backend
+
+    @api.model
+    def _admit(self, env):
+        """
+        Takes a token from every bucket of the request of ``env``, or raises
+        :class:`RateLimitExceeded` with the delay after which it may retry.
+        A rejected request takes no token.
+        """
+        limits = self._get_limits(env)
+        if not limits:
+            return
+        if self._get_backend() == 'memory':
+            rejected = _local_buckets.consume(limits)
+        else:
+            rejected = self._consume(limits)
+        if rejected:
+            key, retry_after = rejected
+            scope = key.partition(':')[0]
+            metrics.increment(self.env.cr.dbname, 'ai_agent_rate_limit_rejections_total', scope=scope)
+            _logger.info("AI Agent request of user %s rejected by the %s rate limit", env.uid, scope)
+            raise RateLimitExceeded(scope, retry_after)
+
+    @api.model
+    def _consume(self, limits):
+        """Shared-bucket counterpart of :meth:`LocalBuckets.consume`."""
+        wait = None
+        with self.env.cr.savepoint(flush=False) as savepoint:
+            for key, capacity, rate in limits:
+                self.env.cr.execute(SQL("""
+                    INSERT INTO ai_agent_rate_bucket AS bucket (key, tokens, refilled_at)
+                         VALUES (%(key)s, %(capacity)s - 1, clock_timestamp() at time zone 'UTC')
+                    ON CONFLICT (key) DO UPDATE
+                            SET tokens = LEAST(%(capacity)s, bucket.tokens + %(rate)s
+                                               * extract(epoch FROM EXCLUDED.refilled_at - bucket.refilled_at)) - 1,
+                                refilled_at = EXCLUDED.refilled_at
+                      RETURNING tokens
+                """, key=key, capacity=capacity, rate=rate))
+                tokens = self.env.cr.fetchone()[0]
+                if tokens < 0 and (wait is None or -tokens / rate > wait[1]):
+                    wait = (key, -tokens / rate)
+            if wait:
+                savepoint.rollback()
+        return wait
+
+    @api.autovacuum
+    def _gc_rate_buckets(self):
+        self.env.cr.execute(SQL(
+            "DELETE FROM ai_agent_rate_bucket WHERE refilled_at < now() at time zone 'UTC' - make_interval(secs => %s)",
+            BUCKET_GC_AGE,
+        ))
@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import re
+
+from odoo import api, fields, models, tools
+from odoo.tools import str2bool
+from odoo.tools.sql import SQL, create_index
+
+from ..tools import embeddings, indexes, metrics, params
+
+DEFAULT_CACHE_TTL = 3600
+DEFAULT_SEMANTIC_THRESHOLD = 0.95
+DEFAULT_CACHE_MAX_ENTRIES = 1000
+# Models answers are commonly based on: their write date is indexed before a
+# turn reads them, and their record rules decide whether users may share
+# answers (see _get_access_key()).
+DEFAULT_CACHE_MODELS = 'res.partner,product.template,product.product,sale.order,sale.order.line,account.move'
+FRESHNESS_INDEX_PREFIX = 'ai_agent_write_date_'
+# Words by which a prompt refers to the user asking it, whose answer then
+# depends on who asks. English only: see _make_key().
+PERSONAL_PROMPT_RE = re.compile(r"\b(?:i|i'm|i've|i'd|me|my|mine|myself)\b")
+USER_DEPENDENT_RULE_RE = re.compile(r'\buser\b')
+
+
+class AIAgentResponseCache(models.Model):
+    """
+    Exact-match cache of AI answers, stored in the database so all Odoo workers
+    share it. A hit answers the turn without calling the AI service.
+
+    Entries are keyed on the normalised prompt, the verbatim history and summary,
+    and the user's access context. Each entry also records the models the agent
+    read to answer, with their freshness token as of the read (see
+    :meth:`_get_freshness_token`), and is only served while these tokens are
+    unchanged. They expire after ``ai_agent_odoo.cache_ttl`` seconds and the
+    least recently used ones are evicted beyond ``ai_agent_odoo.cache_max_entries``.
+
+    When ``ai_agent_odoo.semantic_cache`` is set, a second tier also reuses the
+    answer to a paraphrase: the prompt embedding is compared to those of the
+    fresh entries sharing the same context (access and history), and the best
+    one is reused above ``ai_agent_odoo.semantic_cache_threshold``.
+    """
+    _name = 'ai.agent.response.cache'
+    _description = 'AI Assistant Response Cache'
+    _order = 'last_hit_at desc'
+
+    key = fields.Char(string='Key', required=True, readonly=True)
+    context_key = fields.Char(string='Context Key', readonly=True, index=True)
+    prompt = fields.Text(string='Prompt', readonly=True)
+    response = fields.Text(string='Response', readonly=True)
+    # L2-normalised float32 vector of the prompt, read and written in SQL only.
+    embedding = fields.Binary(string='Embedding', attachment=False, readonly=True)
+    # {model name: freshness token} of the models read to answer.
+    freshness = fields.Json(string='Freshness', readonly=True)
+    expires_at = fields.Datetime(string='Expires At', required=True, readonly=True, index=True)
+    last_hit_at = fields.Datetime(string='Last Hit At', required=True, readonly=True, index=True)
+    hit_count = fields.Integer(string='Hits', readonly=True)
+
+    _sql_constraints = [
+        ('key_unique', 'unique(key)', "A response is cached only once per key."),
+    ]
+
+    def init(self):
+        super().init()
+        self._apply_freshness_config()
+
+    @api.model
+    def _get_models(self, names):
+        models_ = (self.env.get(name.strip()) for name in names)
+        return [model for model in models_ if model is not None and model._auto and not model._abstract]
+
+    @api.model
+    def _get_tracked_models(self):
+        names = self.env['ir.config_parameter'].sudo().get_param('ai_agent_odoo.cache_models', DEFAULT_CACHE_MODELS)
+        return self._get_models(names.split(','))
+
+    @api.model
+    def _apply_freshness_config(self):
+        """Schedules the build of the write date indexes after a configuration change."""
+        cron = self.env.ref('ai_agent_odoo.ir_cron_ai_agent_freshness_index', raise_if_not_found=False)
+        if cron:
+            cron._trigger()
+
+    @api.model
+    def _build_freshness_indexes(self):
+        """
+        Indexes ``write_date`` on the tracked models, on the models read by
+        the cached answers and on the entity resolver's models, whose cache is
+        also checked with freshness tokens, so these stay cheap to compute.
+        Indexes are kept when their model is not read any more, as it likely
+        will be again; those whose concurrent build failed are rebuilt. See
+        ``tools/indexes.py`` for the concurrent builds.
+        """
+        self.env.cr.execute(SQL(
+            "SELECT DISTINCT jsonb_object_keys(freshness) FROM ai_agent_response_cache WHERE freshness IS NOT NULL"
+        ))
+        models_ = self._get_tracked_models() + self._get_models(
+            [row[0] for row in self.env.cr.fetchall()] + list(self.env['ai.agent.entity.resolver']._get_entity_fields()))
+        wanted = {model._table for model in models_ if model._log_access}
+        with indexes.autocommit_cursor(self.env) as cr:
+            existing = indexes.get_indexes(cr, FRESHNESS_INDEX_PREFIX)
+            for index, (_table, _comment, valid) in existing.items():
+                if not valid:
+                    indexes.drop_index_concurrently(cr, index)
+            wanted -= {table for table, _comment, valid in existing.values() if valid}
+            for table in wanted:
+                indexes.create_index_concurrently(
+                    cr, indexes.index_name(FRESHNESS_INDEX_PREFIX, table), table, SQL("(write_date)"))
+
+    @api.model
+    def _get_freshness_token(self, model_names):
+        """
+        Returns ``{model name: [last write date, last deletion]}`` of the given
+        models, which changes whenever one of their records is created, written
+        or deleted through the ORM.
+        """
+        Deletion = self.env['ai.agent.deletion.log']
+        token = {}
+        for model in self._get_models(model_names):
+            write_date = None
+            if model._log_access:
+                model.flush_model(['write_date'])
+                self.env.cr.execute(SQL("SELECT max(write_date) FROM %s", SQL.identifier(model._table)))
+                write_date = str(self.env.cr.fetchone()[0])
+            token[model._name] = [write_date, Deletion._get_last(model._name)]
+        return token
+
+    @api.model
+    def _is_fresh(self, freshness, current=None):
+        """
+        Whether the models read by an answer are unchanged since, given the
+        ``freshness`` tokens recorded with it and, optionally, the ``current``
+        tokens of these models.
+        """
+        if not freshness:
+            return True
+        if current is None:
+            current = self._get_freshness_token(freshness)
+        return all(current.get(name) == token for name, token in freshness.items())
+
+    @api.model
+    def _normalize_prompt(self, prompt):
+        return re.sub(r'\s+', ' ', prompt or '').strip().rstrip('?!.').strip().lower()
+
+    @api.model
+    def _make_key(self, conversation, env=None):
+        """
+        Returns the cache key of the turn being answered in ``conversation``,
+        whose history must already be compacted. ``env`` is the requesting
+        user's environment, whose access context the answer depends on.
+
+        The key is ``<context hash>:<prompt hash>``; the context part is what a
+        semantic match must share. Entries, and the coalescing of in-flight
+        requests (``ai.agent.inflight``), are only shared by requests with the
+        same key, see :meth:`_get_access_key` for the users involved.
+        """
+        env = env or self.env
+        messages = conversation.message_ids.filtered(lambda m: not m.is_summarized)
+        history = [(message.role, message.content or '') for message in messages[:-1]]
+        prompt = self._normalize_prompt(messages[-1].content if messages else '')
+        first_turn = not history and not conversation.summary
+        context = {
+            'summary': conversation.summary or '',
+            'history': history,
+            'access': self._get_access_key(env, shared=first_turn and not PERSONAL_PROMPT_RE.search(prompt)),
+        }
+        return '%s:%s' % (
+            hashlib.sha256(json.dumps(context, sort_keys=True).encode()).hexdigest(),
+            hashlib.sha256(prompt.encode()).hexdigest(),
+        )
+
+    @api.model
+    def _get_access_key(self, env, shared=False):
+        """
+        What the answer depends on about the user of ``env``: their companies,
+        their language and the user id.
+
+        With ``ai_agent_odoo.share_across_users`` set, a ``shared`` question
+        (the first of a conversation, which doesn't refer to the user) is
+        keyed on the user's groups instead of the user id, so that identical
+        questions of a team share cache entries and in-flight requests. Users
+        of the same groups don't see the same records when a record rule
+        depends on the user itself: they are then kept apart.
+
+        Only the rules of the tracked models (``ai_agent_odoo.cache_models``),
+        which answers are assumed to be based on, are considered: Odoo has
+        such rules on many technical models, for every internal user. Nor can
+        the words by which a question in another language than English refers
+        to the user be told. This is why the sharing must be enabled.
+        """
+        key = [env.company.id, sorted(env.companies.ids), env.lang]
+        groups = None
+        if shared and self._is_shared_across_users():
+            groups = self._get_group_access_key(env.uid)
+        return key + (['user', env.uid] if groups is None else ['groups', list(groups)])
+
+    @api.model
+    def _is_shared_across_users(self):
+        return str2bool(self.env['ir.config_parameter'].sudo().get_param('ai_agent_odoo.share_across_users'), default=False)
+
+    @api.model
+    @tools.ormcache('uid')
+    def _get_group_access_key(self, uid):
+        """
+        Ids of the user's groups, or ``None`` if a read rule of a tracked
+        model that applies to the user depends on the user itself
+        (``user.id``, ``user.partner_id``...). Rule, group and parameter
+        changes clear the registry caches, and this one.
+        """
+        groups = self.env['res.users'].sudo().browse(uid).groups_id
+        rules = self.env['ir.rule'].sudo().search([
+            ('model_id.model', 'in', [model._name for model in self._get_tracked_models()]),
+            ('perm_read', '=', True),
+            '|', ('global', '=', True), ('groups', 'in', groups.ids),
+        ])
+        if any(USER_DEPENDENT_RULE_RE.search(rule.domain_force or '') for rule in rules):
+            return None
+        return tuple(sorted(groups.ids))
+
+    @api.model
+    def _lookup(self, key, prompt=None):
+        """
+        Returns the cached response for ``key``, or for a paraphrase of
+        ``prompt`` if the semantic tier is enabled, or ``None``.
+        """
+        response = self._lookup_exact(key)
+        result = 'hit' if response is not None else 'miss'
+        if response is None and prompt and self._is_semantic_cache_enabled():
+            response = self._lookup_similar(key, prompt)
+            result = 'semantic_hit' if response is not None else 'miss'
+        metrics.increment(self.env.cr.dbname, 'ai_agent_cache_requests_total', result=result)
+        return response
+
+    @api.model
+    def _is_semantic_cache_enabled(self):
+        return str2bool(self.env['ir.config_parameter'].sudo().get_param('ai_agent_odoo.semantic_cache'), default=False)
+
+    @api.model
+    def _lookup_similar(self, key, prompt):
+        """Nearest-neighbour lookup among the live entries sharing ``key``'s context."""
+        self.env.cr.execute(SQL(
+            """
+            SELECT id, embedding, freshness
+              FROM ai_agent_response_cache
+             WHERE context_key = %s AND embedding IS NOT NULL
+               AND expires_at > now() AT TIME ZONE 'UTC'
+            """, key.partition(':')[0],
+        ))
+        rows = self.env.cr.fetchall()
+        current = self._get_freshness_token({name for row in rows for name in row[2] or ()})
+        rows = [row for row in rows if self._is_fresh(row[2], current)]
+        matches = embeddings.top_k(
+            embeddings.embed(self._normalize_prompt(prompt)), [bytes(row[1]) for row in rows])
+        threshold = params.get_float(self.env, 'ai_agent_odoo.semantic_cache_threshold', DEFAULT_SEMANTIC_THRESHOLD)
+        if not matches or matches[0][1] < threshold:
+            return None
+        return self._hit(rows[matches[0][0]][0])
+
+    @api.model
+    def _lookup_exact(self, key):
+        self.env.cr.execute(SQL(
+            """
+            SELECT id, freshness
+              FROM ai_agent_response_cache
+             WHERE key = %s AND expires_at > now() AT TIME ZONE 'UTC'
+            """, key,
+        ))
+        row = self.env.cr.fetchone()
+        return self._hit(row[0]) if row and self._is_fresh(row[1]) else None
+
+    @api.model
+    def _hit(self, entry_id):
+        """Counts a hit of the entry ``entry_id`` and returns its response."""
+        self.env.cr.execute(SQL(
+            """
+            UPDATE ai_agent_response_cache
+               SET last_hit_at = now() AT TIME ZONE 'UTC', hit_count = hit_count + 1
+             WHERE id = %s
+         RETURNING response
+            """, entry_id,
+        ))
+        row = self.env.cr.fetchone()
+        return row[0] if row else None
+
+    @api.model
+    def _store(self, key, response, prompt=None, freshness=None):
+        """
+        Caches ``response`` under ``key``. ``freshness`` holds the freshness
+        tokens of the models read to answer, as recorded on the user message.
+        """
+        ttl = params.get_int(self.env, 'ai_agent_odoo.cache_ttl', DEFAULT_CACHE_TTL)
+        embedding = None
+        if prompt and self._is_semantic_cache_enabled():
+            embedding = embeddings.embed(self._normalize_prompt(prompt))
+        self.env.cr.execute(SQL(
+            """
+            INSERT INTO ai_agent_response_cache
+                   (key, context_key, prompt, embedding, freshness, response, expires_at, last_hit_at, hit_count,
+                    create_uid, create_date, write_uid, write_date)
+            VALUES (%(key)s, %(context_key)s, %(prompt)s, %(embedding)s, %(freshness)s, %(response)s,
+                    now() AT TIME ZONE 'UTC' + make_interval(secs => %(ttl)s),
+                    now() AT TIME ZONE 'UTC', 0,
+                    %(uid)s, now() AT TIME ZONE 'UTC', %(uid)s, now() AT TIME ZONE 'UTC')
+            ON CONFLICT (key) DO UPDATE
+               SET response = EXCLUDED.response,
+                   embedding = EXCLUDED.embedding,
+                   freshness = EXCLUDED.freshness,
+                   expires_at = EXCLUDED.expires_at,
+                   last_hit_at = EXCLUDED.last_hit_at,
+                   write_date = EXCLUDED.write_date
+            """, key=key, context_key=key.partition(':')[0], prompt=prompt,
+            embedding=embedding, freshness=json.dumps(freshness) if freshness else None, response=response,
+            ttl=ttl, uid=self.env.uid,
+        ))
+        self._evict()
+
+    @api.model
+    def _evict(self):
+        """Drops expired entries, then the least recently used ones over the size limit."""
+        max_entries = params.get_int(self.env, 'ai_agent_odoo.cache_max_entries', DEFAULT_CACHE_MAX_ENTRIES)
+        self.env.cr.execute(SQL(
+            """
+            DELETE FROM ai_agent_response_cache
+             WHERE expires_at <= now() AT TIME ZONE 'UTC'
+                OR id IN (SELECT id FROM ai_agent_response_cache
+                           ORDER BY last_hit_at DESC OFFSET %s)
+            """, max_entries,
+        ))
+
+    @api.model
+    def _gc_response_cache(self):
+        self._evict()
+        self.env['ai.agent.deletion.log']._compact()
+
+
+class AIAgentDeletionLog(models.Model):
+    """
+    Deletions of records, which don't move the latest write date of their
+    model, for the response cache's freshness tokens. A row is inserted per
+    deletion rather than a counter updated, so that concurrent deletions don't
+    wait on each other; only the latest row of each model is kept.
+    """
+    _name = 'ai.agent.deletion.log'
+    _description = 'AI Assistant Deletion Log'
+    _log_access = False
+
+    res_model = fields.Char(string='Model', required=True, readonly=True)
+
+    def init(self):
+        super().init()
+        create_index(self.env.cr, 'ai_agent_deletion_log_res_model_id_index', self._table, ['res_model', 'id'])
+
+    @api.model
+    def _log(self, model_name):
+        self.env.cr.execute(SQL("INSERT INTO ai_agent_deletion_log (res_model) VALUES (%s)", model_name))
+
+    @api.model
+    def _get_last(self, model_name):
+        self.env.cr.execute(SQL("SELECT max(id) FROM ai_agent_deletion_log WHERE res_model = %s", model_name))
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _compact(self):
+        self.env.cr.execute(SQL(
+            """
+            DELETE FROM ai_agent_deletion_log log
+             WHERE EXISTS (SELECT 1 FROM ai_agent_deletion_log later
+                            WHERE later.res_model = log.res_model AND later.id > log.id)
+            """
+        ))
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import hashlib
+
+from odoo import _, api, models, tools
+
+# Model prefixes left out of the digest unless ``ai_agent_odoo.schema_models``
+# lists the models explicitly: technical models the agent has no use for.
+EXCLUDED_MODEL_PREFIXES = (
+    'ir.', 'base', 'bus.', 'web_', 'web.', 'res.users.', 'res.config', 'mail.', 'report.',
+    'ai.agent.', 'auth_', 'iap.', 'digest.', 'onboarding.', 'spreadsheet.',
+)
+# Fields inherited from mixins or maintained by the framework.
+EXCLUDED_FIELDS = {'create_uid', 'create_date', 'write_uid', 'write_date', 'display_name'}
+EXCLUDED_FIELD_PREFIXES = ('message_', 'activity_', 'website_message', 'has_message', 'rating_')
+FIELD_TYPE_ABBREVIATIONS = {
+    'many2one': 'm2o', 'one2many': 'o2m', 'many2many': 'm2m', 'selection': 'sel',
+    'boolean': 'bool', 'integer': 'int', 'monetary': 'money', 'datetime': 'dt',
+    'many2one_reference': 'ref',
+}
+
+
+class AIAgentSchema(models.AbstractModel):
+    """
+    Compact description of the models and fields a user can see, to include
+    in the agent's prompts instead of calling ``fields_get`` on each model.
+
+    One line per model, e.g.::
+
+        sale.order "Sales Order": name:char!, partner_id:m2o>res.partner!, state:sel(draft|sent|sale|cancel)
+
+    ``!`` marks required fields and ``~`` computed, non-stored ones. Digests
+    are cached per registry and group set.
+
+    Full ``fields_get`` metadata is also served from here, for several models
+    at once and cached per registry, group set and language.
+    """
+    _name = 'ai.agent.schema'
+    _description = 'AI Assistant Schema Digest'
+
+    @api.model
+    def _get_schema_digest(self):
+        """Returns ``(digest, etag)`` for the current user."""
+        return self._get_schema_digest_for_groups(tuple(sorted(self.env.user.groups_id.ids)))
+
+    @tools.ormcache('groups', 'self.env.lang')
+    def _get_schema_digest_for_groups(self, groups):
+        lines = [self._describe_model(self.env[name]) for name in self._get_digest_models()]
+        digest = '\n'.join(line for line in lines if line)
+        return digest, hashlib.sha1(digest.encode()).hexdigest()
+
+    @api.model
+    def _get_digest_models(self):
+        listed = self.env['ir.config_parameter'].sudo().get_param('ai_agent_odoo.schema_models')
+        if listed:
+            names = [name.strip() for name in listed.split(',') if name.strip() in self.env]
+        else:
+            names = [
+                name for name, model in self.env.registry.items()
+                if not model._transient and not model._abstract and model._auto
+                and not name.startswith(EXCLUDED_MODEL_PREFIXES)
+            ]
+        access = self.env['ir.model.access']
+        return sorted(name for name in names if access.check(name, 'read', raise_exception=False))
+
+    @api.model
+    def _describe_model(self, model):
+        descriptions = []
+        for name, field in sorted(model._fields.items()):
+            if name in EXCLUDED_FIELDS or name.startswith(EXCLUDED_FIELD_PREFIXES):
+                continue
+            if field.groups and not self.env.user.has_groups(field.groups):
+                continue
+            descriptions.append(self._describe_field(field))
+        return '%s "%s": %s' % (model._name, model._description, ', '.join(descriptions))
+
+    @api.model
+    def _describe_field(self, field):
+        description = '%s:%s' % (field.name, FIELD_TYPE_ABBREVIATIONS.get(field.type, field.type))
+        if field.relational:
+            description += '>%s' % field.comodel_name
+        elif field.type == 'selection' and isinstance(field.selection, list):
+            description += '(%s)' % '|'.join(str(value) for value, _label in field.selection)
+        if field.required:
+            description += '!'
+        if not field.store:
+            description += '~'
+        return description
+
+    @api.model
+    def _get_models_metadata(self, models_, attributes=None):
+        """
+        Returns ``fields_get`` for several models at once, as ``{model: fields}``.
+        ``models_`` is a list of model names, or a dict mapping model names to
+        the field names to return (all fields when empty). Models the user
+        cannot read are returned as ``{"error": ...}``.
+        """
+        if not isinstance(models_, dict):
+            models_ = dict.fromkeys(models_)
+        attributes = tuple(sorted(attributes)) if attributes else None
+        groups = tuple(sorted(self.env.user.groups_id.ids))
+        access = self.env['ir.model.access']
+        result = {}
+        for model_name, field_names in models_.items():
+            if model_name not in self.env or not access.check(model_name, 'read', raise_exception=False):
+                result[model_name] = {'error': _("Unknown model or access denied: %s", model_name)}
+                continue
+            fields_ = self._get_fields_get(model_name, attributes, groups)
+            if field_names:
+                fields_ = {name: fields_[name] for name in field_names if name in fields_}
+            result[model_name] = fields_
+        return result
+
+    @tools.ormcache('model_name', 'attributes', 'groups', 'self.env.lang')
+    def _get_fields_get(self, model_name, attributes, groups):
+        # ``groups`` is part of the key because fields_get hides fields by group.
+        return self.env[model_name].fields_get(attributes=list(attributes) if attributes else None)
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import socket
+from datetime import datetime, timezone
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+from ..tools import params
+from ..tools.tracing import Trace
+
+_logger = logging.getLogger(__name__)
+
+# Share of turns traced whatever their duration (head sampling).
+DEFAULT_TRACE_SAMPLE_RATE = 0.01
+# Turns slower than this, in seconds, or failed, are always kept (tail sampling).
+DEFAULT_TRACE_SLOW_THRESHOLD = 5.0
+DEFAULT_TRACE_RETENTION_DAYS = 14
+# Spans of turns not finished after this long, in seconds, are dropped.
+PENDING_TRACE_GC_AGE = 3600
+
+
+class AIAgentTrace(models.Model):
+    """
+    Timing of one agent turn, split in spans: the controller's phases, the
+    time spent queued, the AI service call and the tool calls it made back,
+    with the number of SQL queries each one ran.
+
+    Every turn is traced in memory; a trace is stored if the turn was picked
+    by head sampling (``ai_agent_odoo.trace_sample_rate``), failed, or took
+    longer than ``ai_agent_odoo.trace_slow_threshold`` seconds. Tool calls
+    run in other requests, so their spans are stored at once and dropped if
+    the turn is not kept.
+    """
+    _name = 'ai.agent.trace'
+    _description = 'AI Assistant Trace'
+    _order = 'started_at desc, id desc'
+    _log_access = False
+
+    trace_uid = fields.Char(string='Trace ID', required=True, readonly=True)
+    name = fields.Char(string='Operation', readonly=True)
+    state = fields.Selection(
+        [('pending', 'In Progress'), ('done', 'Done')], string='Status', required=True, readonly=True)
+    sampling = fields.Selection(
+        [('head', 'Sampled'), ('slow', 'Slow'), ('error', 'Failed')], string='Kept Because', readonly=True)
+    user_id = fields.Many2one('res.users', string='User', readonly=True, ondelete='set null')
+    conversation_id = fields.Many2one(
+        'ai.agent.conversation', string='Conversation', readonly=True, ondelete='set null')
+    started_at = fields.Datetime(string='Started At', readonly=True, index=True)
+    start_ts = fields.Float(string='Start Timestamp', digits=(16, 6), readonly=True)
+    duration_ms = fields.Float(string='Duration (ms)', digits=(16, 1), readonly=True)
+    sql_count = fields.Integer(string='SQL Queries', compute='_compute_sql_count')
+    error = fields.Text(string='Error', readonly=True)
+    span_ids = fields.One2many('ai.agent.trace.span', 'trace_id', string='Spans', readonly=True)
+
+    _sql_constraints = [
+        ('trace_uid_unique', 'unique(trace_uid)', "A trace is stored only once."),
+    ]
+
+    @api.depends('span_ids.sql_count')
+    def _compute_sql_count(self):
+        for trace in self:
+            trace.sql_count = sum(trace.span_ids.mapped('sql_count'))
+
+    @api.model
+    def _new_trace(self, name, traceparent=None, cr=None, start=None):
+        rate = params.get_float(self.env, 'ai_agent_odoo.trace_sample_rate', DEFAULT_TRACE_SAMPLE_RATE)
+        return Trace(name, traceparent, sample_rate=rate, cr=cr, start=start)
+
+    @api.model
+    def _get_keep_reason(self, trace, duration):
+        if trace.error:
+            return 'error'
+        threshold = params.get_float(self.env, 'ai_agent_odoo.trace_slow_threshold', DEFAULT_TRACE_SLOW_THRESHOLD)
+        if duration >= threshold:
+            return 'slow'
+        return 'head' if trace.sampled else None
+
+    @api.model
+    def _save(self, trace, final=True, duration=None):
+        """
+        Stores the spans of ``trace``, in a transaction of its own so that the
+        spans of a failed request are kept too.
+
+        With ``final``, the trace is the end of the turn: it is kept or
+        dropped, with the spans stored earlier by other requests, depending
+        on the sampling. ``duration`` is the turn's duration when it started
+        before ``trace``, in seconds.
+        """
+        duration = trace.duration if duration is None else duration
+        reason = self._get_keep_reason(trace, duration) if final else None
+        try:
+            with self.pool.cursor() as cr:
+                if final and not reason:
+                    cr.execute(SQL("DELETE FROM ai_agent_trace WHERE trace_uid = %s", trace.trace_id))
+                    return
+                cr.execute(SQL("""
+                    INSERT INTO ai_agent_trace (trace_uid, state, started_at, start_ts)
+                         VALUES (%(uid)s, 'pending', %(started_at)s, %(start)s)
+                    ON CONFLICT (trace_uid) DO UPDATE
+                            SET start_ts = LEAST(ai_agent_trace.start_ts, EXCLUDED.start_ts),
+                                started_at = LEAST(ai_agent_trace.started_at, EXCLUDED.started_at)
+                      RETURNING id
+                """, uid=trace.trace_id, start=trace.start, started_at=_to_datetime(trace.start)))
+                trace_id = cr.fetchone()[0]
+                if final:
+                    cr.execute(SQL("""
+                        UPDATE ai_agent_trace
+                           SET state = 'done', sampling = %(reason)s, name = %(name)s,
+                               duration_ms = %(duration)s, error = %(error)s,
+                               user_id = %(user_id)s, conversation_id = %(conversation_id)s
+                         WHERE id = %(id)s
+                    """, id=trace_id, reason=reason, name=trace.root['name'], duration=duration * 1000,
+                        error=trace.error, user_id=trace.info.get('user_id'),
+                        conversation_id=trace.info.get('conversation_id')))
+                if not trace.spans:
+                    return
+                worker = '%s:%s' % (socket.gethostname(), os.getpid())
+                cr.execute(SQL("""
+                    INSERT INTO ai_agent_trace_span
+                           (trace_id, span_uid, parent_uid, name, start_ts, duration_ms, sql_count, worker, attributes)
+                    VALUES %s
+                """, SQL(', ').join(
+                    SQL('(%s, %s, %s, %s, %s, %s, %s, %s, %s)',
+                        trace_id, span['span_id'], span['parent_id'], span['name'], span['start'],
+                        (span['duration'] or 0) * 1000, span['sql_count'], worker,
+                        json.dumps(span['attributes'], default=str) if span['attributes'] else None)
+                    for span in trace.spans
+                )))
+        except Exception:  # noqa: BLE001 - tracing must never break a request
+            _logger.warning("Could not save AI Agent trace %s", trace.trace_id, exc_info=True)
+
+    @api.autovacuum
+    def _gc_traces(self):
+        days = params.get_int(self.env, 'ai_agent_odoo.trace_retention_days', DEFAULT_TRACE_RETENTION_DAYS, minimum=1)
+        self.env.cr.execute(SQL("""
+            DELETE FROM ai_agent_trace
+             WHERE started_at < now() at time zone 'UTC' - make_interval(days => %s)
+                OR (state = 'pending' AND started_at < now() at time zone 'UTC' - make_interval(secs => %s))
+        """, days, PENDING_TRACE_GC_AGE))
+
+
+class AIAgentTraceSpan(models.Model):
+    _name = 'ai.agent.trace.span'
+    _description = 'AI Assistant Trace Span'
+    _order = 'start_ts, id'
+    _log_access = False
+
+    trace_id = fields.Many2one('ai.agent.trace', string='Trace', required=True, index=True, ondelete='cascade')
+    span_uid = fields.Char(string='Span ID', readonly=True)
+    parent_uid = fields.Char(string='Parent Span ID', readonly=True)
+    name = fields.Char(string='Operation', readonly=True)
+    label = fields.Char(string='Span', compute='_compute_layout')
+    start_ts = fields.Float(string='Start Timestamp', digits=(16, 6), readonly=True)
+    offset_ms = fields.Float(string='Offset (ms)', digits=(16, 1), compute='_compute_layout')
+    duration_ms = fields.Float(string='Duration (ms)', digits=(16, 1), readonly=True)
+    share = fields.Float(string='Share of Turn', compute='_compute_layout')
+    sql_count = fields.Integer(string='SQL Queries', readonly=True)
+    worker = fields.Char(string='Worker', readonly=True)
+    attributes = fields.Text(string='Attributes', readonly=True)
+
+    @api.depends('trace_id.span_ids', 'trace_id.duration_ms', 'start_ts', 'duration_ms', 'parent_uid')
+    def _compute_layout(self):
+        """Indents spans under their parent and places them on the turn's timeline."""
+        for trace in self.trace_id:
+            spans = trace.span_ids
+            parents = {span.span_uid: span.parent_uid for span in spans}
+            start = min(spans.mapped('start_ts'), default=0)
+            total = trace.duration_ms or max(
+                (span.start_ts - start) * 1000 + span.duration_ms for span in spans) if spans else 0
+            for span in spans & self:
+                depth, parent = 0, span.parent_uid
+                while parent in parents and depth < 32:
+                    depth, parent = depth + 1, parents[parent]
+                span.label = '\u2003' * depth + (span.name or '')
+                span.offset_ms = (span.start_ts - start) * 1000
+                span.share = 100 * span.duration_ms / total if total else 0
+
+
+def _to_datetime(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None, microsecond=0)
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from odoo import api, models
+
+
+class Base(models.AbstractModel):
+    """
+    Keeps the AI Assistant's record indexes and caches up to date. The hooks
+    only flag index entries or log a deletion in a single statement; the
+    indexing itself is done later in background batches.
+    """
+    _inherit = 'base'
+
+    def _ai_agent_indexed_fields(self):
+        Embedding = self.env.get('ai.agent.embedding')
+        if Embedding is None or self._name == 'ai.agent.embedding':
+            return None
+        return Embedding._get_indexed_fields().get(self._name)
+
+    def _ai_agent_log_deletion(self):
+        # Cached answers that read this model must not be served any more.
+        Deletion = self.env.get('ai.agent.deletion.log')
+        if Deletion is not None and self and self._auto and not self._transient \
+                and not self._name.startswith('ai.agent.'):
+            Deletion._log(self._name)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        if records._ai_agent_indexed_fields() is not None:
+            self.env['ai.agent.embedding']._enqueue(records._name, records.ids)
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        field_names = self._ai_agent_indexed_fields()
+        if field_names and not field_names.isdisjoint(vals):
+            self.env['ai.agent.embedding']._enqueue(self._name, self.ids)
+        return res
+
+    def unlink(self):
+        if self._ai_agent_indexed_fields() is not None:
+            self.env['ai.agent.embedding']._remove(self._name, self.ids)
+        self._ai_agent_log_deletion()
+        return super().unlink()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import hashlib
+
+from odoo import api, models
+
+# System parameters the widget's cached configuration depends on.
+AI_AGENT_CONFIG_PARAMS = ('ai_agent_odoo.service_url', 'ai_agent_odoo.api_key')
+EMBEDDING_FIELDS_PARAM = 'ai_agent_odoo.embedding_fields'
+FTS_PARAMS = ('ai_agent_odoo.fts_fields', 'ai_agent_odoo.fts_lang')
+ENTITY_FIELDS_PARAM = 'ai_agent_odoo.entity_fields'
+CACHE_MODELS_PARAM = 'ai_agent_odoo.cache_models'
+JOB_RUNNER_SLOTS_PARAM = 'ai_agent_odoo.job_runner_slots'
+
+
+class IrConfigParameter(models.Model):
+    _inherit = 'ir.config_parameter'
+
+    @api.model
+    def _get_ai_agent_config_version(self):
+        """
+        Returns a short version tag derived from the AI Agent parameters, so
+        clients can tell whether the configuration they cached is still current.
+        """
+        get_param = self.sudo().get_param
+        values = '\x1f'.join(get_param(key) or '' for key in AI_AGENT_CONFIG_PARAMS)
+        return hashlib.sha256(values.encode()).hexdigest()[:16]
+
+    def _notify_ai_agent_config_changed(self):
+        """Tells every open widget to drop its cached configuration."""
+        self.env['bus.bus']._sendone(
+            self.env.ref('base.group_user'),
+            'ai_agent_odoo/config_updated',
+            {'version': self._get_ai_agent_config_version()},
+        )
+
+    def _ai_agent_params_changed(self, keys):
+        """Reacts to changes of the AI Agent parameters in ``keys``."""
+        if keys & set(AI_AGENT_CONFIG_PARAMS):
+            self._notify_ai_agent_config_changed()
+        if EMBEDDING_FIELDS_PARAM in keys:
+            self.env['ai.agent.embedding']._enqueue_all()
+        if keys & set(FTS_PARAMS):
+            self.env['ai.agent.fulltext']._apply_fts_config()
+        if CACHE_MODELS_PARAM in keys:
+            self.env['ai.agent.response.cache']._apply_freshness_config()
+        if ENTITY_FIELDS_PARAM in keys:
+            self.env['ai.agent.entity.resolver']._apply_entity_config()
+            self.env['ai.agent.response.cache']._apply_freshness_config()
+        if JOB_RUNNER_SLOTS_PARAM in keys:
+            self.env['ai.agent.job']._ensure_runner_crons()
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        records._ai_agent_params_changed({vals.get('key') for vals in vals_list})
+        return records
+
+    def write(self, vals):
+        keys = set(self.mapped('key'))
+        if 'key' in vals:
+            keys.add(vals['key'])
+        res = super().write(vals)
+        self._ai_agent_params_changed(keys)
+        return res
+
+    def unlink(self):
+        keys = set(self.mapped('key'))
+        res = super().unlink()
+        self._ai_agent_params_changed(keys)
+        return res
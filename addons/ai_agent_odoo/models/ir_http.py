@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+import werkzeug.exceptions
+
+from odoo import models
+from odoo.http import request
+
+from ..tools.signing import verify_tool_token
+
+
+class IrHttp(models.AbstractModel):
+    _inherit = 'ir.http'
+
+    @classmethod
+    def _auth_method_ai_agent_tool(cls):
+        """
+        Authenticates the AI service's tool calls with the signed token minted
+        for the current turn (``Authorization: Bearer <token>``), and runs the
+        request as that turn's user and companies. No password is involved.
+        """
+        scheme, _sep, token = request.httprequest.headers.get('Authorization', '').partition(' ')
+        payload = scheme.lower() == 'bearer' and verify_tool_token(request.env, token.strip())
+        if not payload:
+            raise werkzeug.exceptions.Unauthorized("Invalid or expired AI Agent tool token")
+        request.update_env(user=payload['uid'])
+        request.update_context(allowed_company_ids=payload['cids'], ai_agent_message_id=payload.get('mid'))
+
+    @classmethod
+    def _post_dispatch(cls, response):
+        super()._post_dispatch(response)
+        # Every worker adds its buffered AI Agent metrics to the shared totals
+        # as it serves requests.
+        if request.db:
+            request.env['ai.agent.metric']._flush_if_due()
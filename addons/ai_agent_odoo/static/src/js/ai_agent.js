@@ -2,66 +2,71 @@
 
 import { registry } from "@web/core/registry";
 import { rpc } from "@web/core/network/rpc";
-import { Component, useState, onMounted} from "@odoo/owl";
+import { useService } from "@web/core/utils/hooks";
+import { Component, useState, useEffect, markup } from "@odoo/owl";
+import { renderMarkdown } from "./ai_agent_markdown";
 
-// Password modal component
-export class PasswordModal extends Component {
-    setup() {
-        this.state = useState({ password: "" });
-    }
-    onInput(ev) {
-        this.state.password = ev.target.value;
-    }
-    onOk() {
-        this.props.onSubmit(this.state.password);
+// Agent configuration, fetched once per page load and shared by all widget
+// instances. Dropped when the server announces a new version over the bus.
+let configPromise = null;
+
+function getConfig() {
+    if (!configPromise) {
+        configPromise = rpc("/ai_agent_odoo/get_config", {}).catch((error) => {
+            configPromise = null;
+            throw error;
+        });
     }
-    onCancel() {
-        this.props.onCancel();
+    return configPromise;
+}
+
+// Times a turn rejected by the rate limits is retried, once the delay given
+// by the server has passed. A rejected request takes no token.
+const MAX_RATE_LIMIT_RETRIES = 2;
+
+function waitForRetry(seconds) {
+    return new Promise((resolve) => setTimeout(resolve, (seconds || 1) * 1000));
+}
+
+async function invalidateConfig({ version }) {
+    if (configPromise) {
+        const config = await configPromise.catch(() => null);
+        if (!config || config.version !== version) {
+            configPromise = null;
+        }
     }
 }
-PasswordModal.template = "ai_agent_odoo.PasswordModal";
-PasswordModal.props = ["onSubmit", "onCancel"];
 
-class AIAgentSystray extends Component {
+/**
+ * The assistant's chat window. It is loaded, with the markdown and sanitizer
+ * libraries, by the systray button the first time it is opened, and then
+ * stays mounted, hidden while closed.
+ */
+class AIAgentChat extends Component {
     setup() {
         this.state = useState({
             messages: [],
             inputMessage: "",
-            isOpen: false,
             isLoading: false,
-            conversationHistory: [],
-            odooPassword: null, // Store password in memory only
-            showPasswordModal: false,
-            passwordPromise: null,
-        });
-        onMounted(() => {
-            if (this.state.isOpen) {
-                this.scrollToBottom();
-            }
-        });
-    }
-
-    async promptForPassword() {
-        this.state.showPasswordModal = true;
-        return new Promise((resolve, reject) => {
-            this.state.passwordPromise = { resolve, reject };
+            isStreaming: false,
+            conversationId: null,
         });
-    }
-
-    onPasswordSubmit(password) {
-        this.state.odooPassword = password;
-        this.state.showPasswordModal = false;
-        if (this.state.passwordPromise) {
-            this.state.passwordPromise.resolve(password);
-            this.state.passwordPromise = null;
-        }
-    }
-    onPasswordCancel() {
-        this.state.showPasswordModal = false;
-        if (this.state.passwordPromise) {
-            this.state.passwordPromise.reject(new Error("Password is required to use the AI agent."));
-            this.state.passwordPromise = null;
-        }
+        this.busService = useService("bus_service");
+        this.busService.subscribe("ai_agent_odoo/config_updated", invalidateConfig);
+        // Background jobs waiting for their answer, by job id.
+        this.pendingJobs = new Map();
+        // Updates received while a job is being submitted, before its id is known.
+        this.earlyJobUpdates = null;
+        this.busService.subscribe("ai_agent_odoo/job_update", (update) => this.onJobUpdate(update));
+        useEffect(
+            (isOpen) => {
+                if (isOpen) {
+                    // Use setTimeout to ensure the DOM is updated before scrolling
+                    setTimeout(() => this.scrollToBottom(), 0);
+                }
+            },
+            () => [this.props.isOpen]
+        );
     }
 
     async sendMessage() {
@@ -73,64 +78,32 @@ class AIAgentSystray extends Component {
         this.state.isLoading = true;
 
         try {
-            // Prepare conversation history
-            const conversationHistory = this.state.conversationHistory.map(msg => ({
-                role: msg.isUser ? "user" : "assistant",
-                content: msg.content
-            }));
-
-            // Add current message to history
-            conversationHistory.push({
-                role: "user",
-                content: message
-            });
-
-            // Use rpc to get the configuration from the Odoo backend.
-            const config = await rpc("/ai_agent_odoo/get_config", {});
-            if (!config || !config.ai_agent_url || !config.ai_agent_api_key || !config.db || !config.login) {
+            // Get the configuration from the Odoo backend (cached for the session).
+            const config = await getConfig();
+            if (!config || !config.ai_agent_url || !config.db || !config.login) {
                 throw new Error("AI Agent URL or Odoo credentials are not configured in Odoo's System Parameters.");
             }
 
-            // Prompt for password if not already set
-            let password = this.state.odooPassword;
-            if (!password) {
-                password = await this.promptForPassword();
-            }
-
-            // Compose the payload for the new endpoint
+            // Compose the payload for the new endpoint. The server adds the
+            // credentials the AI service needs to call back into Odoo.
             const payload = {
-                odoo_credentials: {
-                    url: window.location.origin, // Use current Odoo instance URL
-                    db: config.db,
-                    username: config.login,
-                    password: password,
-                },
-                prompt: message,
-                conversation_history: conversationHistory,
+                // The history is stored server-side: only send the new message.
+                conversation_id: this.state.conversationId,
+                message: message,
             };
 
-            // Make the call to your Python AI service (new endpoint)
-            const response = await fetch(`${config.ai_agent_url}/api/v1/agent/invoke`, {
-                method: "POST",
-                headers: { "Content-Type": "application/json", "api-Key": config.ai_agent_api_key },
-                body: JSON.stringify(payload),
-            });
-
-            if (!response.ok) {
-                const errorData = await response.json();
-                console.error("API error details:", errorData);
-                throw new Error(JSON.stringify(errorData));
-            }
-
-            const data = await response.json();
-
-            // Render AI response as HTML (sanitize only, since LLM returns HTML)
-            const html = window.DOMPurify.sanitize(data.response);
-            this.state.messages.push({ content: html, isUser: false, isHtml: true });
-            this.state.conversationHistory = conversationHistory.concat([{
-                role: "assistant",
-                content: data.response
-            }]);
+            // Stream the answer through the Odoo controller, or have a background
+            // job push it over the bus, and render it as it arrives.
+            this.state.messages.push({ content: markup(""), isUser: false, isHtml: true });
+            const aiMessage = this.state.messages.at(-1);
+            const onText = (text) => {
+                this.state.isStreaming = true;
+                this.renderStreamedMessage(aiMessage, text);
+            };
+            const fullResponse = config.async_jobs
+                ? await this.runJob(payload, onText)
+                : await this.streamResponse(payload, onText);
+            await this.renderStreamedMessage(aiMessage, fullResponse);
 
             // Scroll to bottom of chat after DOM update
             setTimeout(() => this.scrollToBottom(), 0);
@@ -140,6 +113,160 @@ class AIAgentSystray extends Component {
             console.error("Error:", error);
         } finally {
             this.state.isLoading = false;
+            this.state.isStreaming = false;
+        }
+    }
+
+    /**
+     * Posts the payload to the streaming route and reads the Server-Sent Events
+     * it relays. `onText` is called with the accumulated text after each delta.
+     * Resolves with the full response once the stream is done. Rate limited
+     * requests (429) are retried after their `Retry-After` delay.
+     */
+    async streamResponse(payload, onText) {
+        let response;
+        for (let attempt = 0; ; attempt++) {
+            response = await fetch(`/ai_agent_odoo/stream?csrf_token=${encodeURIComponent(odoo.csrf_token)}`, {
+                method: "POST",
+                headers: { "Content-Type": "application/json", Accept: "text/event-stream" },
+                body: JSON.stringify(payload),
+            });
+            if (response.status !== 429 || attempt >= MAX_RATE_LIMIT_RETRIES) {
+                break;
+            }
+            await waitForRetry(Number(response.headers.get("Retry-After")));
+        }
+        if (!response.ok || !response.body) {
+            const errorData = await response.text();
+            console.error("API error details:", errorData);
+            throw new Error(errorData || response.statusText);
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+        let text = "";
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                let event = "message";
+                let data = "";
+                for (const line of rawEvent.split("\n")) {
+                    if (line.startsWith("event:")) {
+                        event = line.slice(6).trim();
+                    } else if (line.startsWith("data:")) {
+                        data += line.slice(5).trim();
+                    }
+                }
+                if (!data) {
+                    continue;
+                }
+                const parsed = JSON.parse(data);
+                if (event === "conversation") {
+                    this.state.conversationId = parsed.conversation_id;
+                } else if (event === "error") {
+                    console.error("API error details:", parsed);
+                    throw new Error(parsed.error);
+                } else if (event === "done") {
+                    return parsed.response;
+                } else if (parsed.delta) {
+                    text += parsed.delta;
+                    onText(text);
+                }
+            }
+        }
+        return text;
+    }
+
+    /**
+     * Submits the turn as a background job and resolves with the answer once
+     * the job reports it over the bus. `onText` is called with the accumulated
+     * text as deltas are pushed. Rate limited submissions are retried after
+     * the `retry_after` delay returned by the server.
+     */
+    async runJob(payload, onText) {
+        let result, earlyUpdates;
+        for (let attempt = 0; ; attempt++) {
+            this.earlyJobUpdates = [];
+            try {
+                result = await rpc("/ai_agent_odoo/invoke", { ...payload, async: true });
+            } finally {
+                earlyUpdates = this.earlyJobUpdates;
+                this.earlyJobUpdates = null;
+            }
+            if (result.error !== "rate_limited") {
+                break;
+            }
+            if (attempt >= MAX_RATE_LIMIT_RETRIES) {
+                throw new Error(result.message);
+            }
+            await waitForRetry(result.retry_after);
+        }
+        this.state.conversationId = result.conversation_id;
+        if (!result.job_id) {
+            // Answered from the cache.
+            return result.response;
+        }
+        return new Promise((resolve, reject) => {
+            this.pendingJobs.set(result.job_id, { text: "", onText, resolve, reject });
+            for (const update of earlyUpdates) {
+                this.onJobUpdate(update);
+            }
+        });
+    }
+
+    onJobUpdate(update) {
+        const job = this.pendingJobs.get(update.job_id);
+        if (!job) {
+            if (this.earlyJobUpdates) {
+                this.earlyJobUpdates.push(update);
+            }
+            return;
+        }
+        if (update.delta) {
+            job.text += update.delta;
+            job.onText(job.text);
+        }
+        if (update.state === "done") {
+            this.pendingJobs.delete(update.job_id);
+            job.resolve(update.response);
+        } else if (update.state === "failed") {
+            this.pendingJobs.delete(update.job_id);
+            job.reject(new Error(update.error));
+        }
+    }
+
+    /**
+     * Renders the text received so far as sanitized markdown, in a worker.
+     * One render runs at a time and text received meanwhile is rendered next,
+     * so fast token streams don't re-render the whole answer for every delta.
+     * Resolves once the latest text is displayed.
+     */
+    renderStreamedMessage(message, text) {
+        this.pendingRender = { message, text };
+        if (!this.rendering) {
+            this.rendering = this.flushRenders();
+        }
+        return this.rendering;
+    }
+
+    async flushRenders() {
+        try {
+            while (this.pendingRender) {
+                const { message, text } = this.pendingRender;
+                this.pendingRender = null;
+                message.content = markup(await renderMarkdown(text));
+                this.scrollToBottom();
+            }
+        } finally {
+            this.rendering = null;
         }
     }
 
@@ -157,21 +284,13 @@ class AIAgentSystray extends Component {
             chatContainer.scrollTop = chatContainer.scrollHeight;
         }
     }
-
-    toggleChat() {
-        this.state.isOpen = !this.state.isOpen;
-        if (this.state.isOpen) {
-            // Use setTimeout to ensure the DOM is updated before scrolling
-            setTimeout(() => this.scrollToBottom(), 0);
-        }
-    }
 }
 
-AIAgentSystray.template = "ai_agent_odoo.AIAgentSystray";
-AIAgentSystray.props = {};
-AIAgentSystray.components = { PasswordModal };
+AIAgentChat.template = "ai_agent_odoo.AIAgentChat";
+AIAgentChat.props = {
+    isOpen: Boolean,
+    close: Function,
+};
 
-// Add the widget to the systray
-registry.category("systray").add("ai_agent_odoo.AIAgentSystray", {
-    Component: AIAgentSystray,
-});
\ No newline at end of file
+// Rendered by the systray button through a LazyComponent once this bundle is loaded
+registry.category("lazy_components").add("ai_agent_odoo.AIAgentChat", AIAgentChat);
\ No newline at end of file
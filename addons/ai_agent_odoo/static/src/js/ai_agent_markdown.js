@@ -0,0 +1,65 @@
+/** @odoo-module **/
+
+// Answers are rendered from markdown to sanitized HTML in a Web Worker, so
+// that long ones don't block the UI. Where a worker can't be used, they are
+// rendered in the page with the same policy, ai_agent_markdown_policy.js, and
+// then passed through DOMPurify configured from it.
+const WORKER_URL = "/ai_agent_odoo/static/src/js/ai_agent_markdown_worker.js";
+
+let worker = null;
+let workerFailed = typeof Worker === "undefined";
+let nextId = 0;
+// Renders sent to the worker, by id.
+const pending = new Map();
+
+export function renderInPage(text) {
+    const policy = window.aiAgentMarkdown;
+    return window.DOMPurify.sanitize(policy.render(text), policy.domPurifyConfig);
+}
+
+function onWorkerFailure(error) {
+    console.warn("AI Agent: rendering answers in the page, the worker failed:", error);
+    workerFailed = true;
+    worker?.terminate();
+    worker = null;
+    for (const { text, resolve } of pending.values()) {
+        resolve(renderInPage(text));
+    }
+    pending.clear();
+}
+
+function getWorker() {
+    if (!worker && !workerFailed) {
+        try {
+            worker = new Worker(WORKER_URL);
+        } catch (error) {
+            onWorkerFailure(error);
+            return null;
+        }
+        worker.onmessage = ({ data }) => {
+            const render = pending.get(data.id);
+            if (!render) {
+                return;
+            }
+            pending.delete(data.id);
+            render.resolve(data.error ? renderInPage(render.text) : data.html);
+        };
+        worker.onerror = (ev) => onWorkerFailure(ev.message);
+    }
+    return worker;
+}
+
+/**
+ * Resolves with the sanitized HTML of the markdown `text`.
+ */
+export function renderMarkdown(text) {
+    const renderer = getWorker();
+    if (!renderer) {
+        return Promise.resolve(renderInPage(text));
+    }
+    return new Promise((resolve) => {
+        const id = ++nextId;
+        pending.set(id, { text, resolve });
+        renderer.postMessage({ id, text });
+    });
+}
@@ -0,0 +1,190 @@
+/** @odoo-module ignore **/
+/**
+ * Markdown rendering of the assistant's answers to safe HTML, shared by the
+ * rendering worker and the in-page fallback so that both apply one policy.
+ * It is a classic script, loaded with importScripts() by the worker and as
+ * part of the chat bundle in the page, and exposes `self.aiAgentMarkdown`.
+ *
+ * DOMPurify needs a DOM, which workers don't have. Instead, marked's whole
+ * output is rebuilt from an allowlist of tags and attributes, and link and
+ * image URLs are restricted to safe schemes. Anything that is not
+ * recognised is escaped or dropped, never passed through. The page also
+ * runs DOMPurify, configured from the same allowlist.
+ */
+/* global marked */
+(function (root) {
+    "use strict";
+
+    // Allowed tags, with their allowed attributes besides `title`.
+    const ALLOWED_TAGS = {
+        a: ["href"],
+        abbr: [],
+        b: [],
+        blockquote: [],
+        br: [],
+        caption: [],
+        code: [],
+        dd: [],
+        del: [],
+        div: [],
+        dl: [],
+        dt: [],
+        em: [],
+        h1: [],
+        h2: [],
+        h3: [],
+        h4: [],
+        h5: [],
+        h6: [],
+        hr: [],
+        i: [],
+        img: ["src", "alt", "width", "height"],
+        kbd: [],
+        li: [],
+        ol: ["start"],
+        p: [],
+        pre: [],
+        s: [],
+        small: [],
+        span: [],
+        strong: [],
+        sub: [],
+        sup: [],
+        table: [],
+        tbody: [],
+        td: ["colspan", "rowspan", "align"],
+        tfoot: [],
+        th: ["colspan", "rowspan", "align"],
+        thead: [],
+        tr: [],
+        u: [],
+        ul: [],
+    };
+    // Tags dropped together with their content.
+    const DROPPED_CONTENT = new Set(["script", "style", "iframe", "object", "embed", "template", "textarea", "title"]);
+    const URL_ATTRIBUTES = new Set(["href", "src"]);
+    const SAFE_SCHEMES = ["http", "https", "mailto", "tel"];
+    const ENTITIES = { amp: "&", lt: "<", gt: ">", quot: '"', apos: "'", nbsp: " " };
+
+    const TAG_RE =
+        /<!--[\s\S]*?-->|<(\/?)([a-zA-Z][a-zA-Z0-9]*)((?:\s+[^\s"'>\/=]+(?:\s*=\s*(?:"[^"]*"|'[^']*'|[^\s"'=<>`]+))?)*)\s*\/?>/g;
+    const ATTRIBUTE_RE = /([^\s"'>\/=]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'=<>`]+)))?/g;
+
+    function escapeText(text) {
+        return text.replace(/</g, "&lt;").replace(/>/g, "&gt;");
+    }
+
+    function escapeAttribute(value) {
+        return value.replace(/&/g, "&amp;").replace(/"/g, "&quot;").replace(/</g, "&lt;").replace(/>/g, "&gt;");
+    }
+
+    function decodeEntities(value) {
+        return value.replace(/&(?:#(\d+)|#x([0-9a-f]+)|([a-z]+));?/gi, (entity, decimal, hex, name) => {
+            if (decimal || hex) {
+                const codePoint = parseInt(decimal || hex, decimal ? 10 : 16);
+                return codePoint > 0 && codePoint <= 0x10ffff ? String.fromCodePoint(codePoint) : "";
+            }
+            return ENTITIES[name.toLowerCase()] ?? entity;
+        });
+    }
+
+    /** Whether a decoded URL is relative or uses a safe scheme, as the browser will read it. */
+    function isSafeUrl(url) {
+        const scheme = /^([a-z][a-z0-9+.-]*):/i.exec(url.replace(/[\u0000- \u007f-\u009f]/g, ""));
+        return !scheme || SAFE_SCHEMES.includes(scheme[1].toLowerCase());
+    }
+
+    function sanitizeAttributes(tag, attributes) {
+        let result = "";
+        for (const [, rawName, ...values] of attributes.matchAll(ATTRIBUTE_RE)) {
+            const name = rawName.toLowerCase();
+            if (name !== "title" && !ALLOWED_TAGS[tag].includes(name)) {
+                continue;
+            }
+            // Checked and written back decoded, so the browser reads the value that was checked.
+            const value = decodeEntities(values.find((value) => value !== undefined) ?? "");
+            if (URL_ATTRIBUTES.has(name) && !isSafeUrl(value)) {
+                continue;
+            }
+            result += ` ${name}="${escapeAttribute(value)}"`;
+        }
+        return result;
+    }
+
+    /** Rebuilds a fragment of HTML from the allowed tags and attributes. */
+    function sanitizeHtml(html) {
+        let result = "";
+        let last = 0;
+        let skipping = null;
+        for (const match of html.matchAll(TAG_RE)) {
+            if (!skipping) {
+                result += escapeText(html.slice(last, match.index));
+            }
+            last = match.index + match[0].length;
+            const [, closing, rawName, attributes] = match;
+            if (!rawName) {
+                continue; // comment
+            }
+            const tag = rawName.toLowerCase();
+            if (skipping) {
+                if (closing && tag === skipping) {
+                    skipping = null;
+                }
+            } else if (DROPPED_CONTENT.has(tag)) {
+                skipping = closing ? null : tag;
+            } else if (tag in ALLOWED_TAGS) {
+                result += closing ? `</${tag}>` : `<${tag}${sanitizeAttributes(tag, attributes)}>`;
+            }
+        }
+        if (!skipping) {
+            result += escapeText(html.slice(last));
+        }
+        return result;
+    }
+
+    function titleAttribute(title) {
+        return title ? ` title="${escapeAttribute(decodeEntities(title))}"` : "";
+    }
+
+    // marked's own link and image renderers write the alt text, and in some
+    // cases the URL, into attributes unescaped.
+    const parser = new marked.Marked({
+        renderer: {
+            link({ href, title, tokens }) {
+                const text = this.parser.parseInline(tokens);
+                const url = decodeEntities(href || "");
+                if (!isSafeUrl(url)) {
+                    return text;
+                }
+                return `<a href="${escapeAttribute(url)}"${titleAttribute(title)}>${text}</a>`;
+            },
+            image({ href, title, text, tokens }) {
+                const alt = decodeEntities(tokens ? this.parser.parseInline(tokens, this.parser.textRenderer) : text);
+                const url = decodeEntities(href || "");
+                if (!isSafeUrl(url)) {
+                    return escapeAttribute(alt);
+                }
+                return `<img src="${escapeAttribute(url)}" alt="${escapeAttribute(alt)}"${titleAttribute(title)}>`;
+            },
+        },
+        walkTokens(token) {
+            if (token.type === "text" && token.escaped) {
+                // Text inside raw HTML blocks such as <pre> is not escaped by marked.
+                token.text = escapeText(token.text);
+            }
+        },
+    });
+
+    root.aiAgentMarkdown = {
+        /** Renders the markdown `text` to HTML holding only the allowed tags, attributes and URLs. */
+        render(text) {
+            return sanitizeHtml(parser.parse(text || ""));
+        },
+        /** The same policy, as a DOMPurify configuration. */
+        domPurifyConfig: {
+            ALLOWED_TAGS: Object.keys(ALLOWED_TAGS),
+            ALLOWED_ATTR: [...new Set(["title", ...Object.values(ALLOWED_TAGS).flat()])],
+            ALLOWED_URI_REGEXP: new RegExp(`^(?:(?:${SAFE_SCHEMES.join("|")}):|[^a-z]|[a-z+.\\-]+(?:[^a-z+.\\-:]|$))`, "i"),
+        },
+    };
+})(self);
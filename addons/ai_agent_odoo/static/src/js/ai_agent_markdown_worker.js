@@ -0,0 +1,20 @@
+/**
+ * Web Worker rendering the assistant's markdown answers to safe HTML, so that
+ * long answers, such as tables of hundreds of rows, don't freeze the UI.
+ *
+ * Protocol: the page posts `{ id, text }` and receives `{ id, html }`, or
+ * `{ id, error }` if the text could not be rendered.
+ *
+ * The rendering and its sanitization policy live in ai_agent_markdown_policy.js,
+ * which the in-page fallback uses as well.
+ */
+/* global aiAgentMarkdown */
+importScripts("lib/marked.min.js", "ai_agent_markdown_policy.js");
+
+self.onmessage = ({ data: { id, text } }) => {
+    try {
+        self.postMessage({ id, html: aiAgentMarkdown.render(text) });
+    } catch (error) {
+        self.postMessage({ id, error: String(error && error.message || error) });
+    }
+};
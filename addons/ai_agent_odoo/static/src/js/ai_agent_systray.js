@@ -0,0 +1,46 @@
+/** @odoo-module **/
+
+import { registry } from "@web/core/registry";
+import { LazyComponent, loadBundle } from "@web/core/assets";
+import { Component, useState } from "@odoo/owl";
+
+// The chat, with its markdown and sanitizer libraries, lives in its own
+// bundle so that backend pages only load it once the assistant is used.
+const CHAT_BUNDLE = "ai_agent_odoo.assets_chat";
+
+class AIAgentSystray extends Component {
+    setup() {
+        this.chatBundle = CHAT_BUNDLE;
+        this.state = useState({
+            isOpen: false,
+            // The chat stays mounted once opened, so the conversation survives closing it.
+            isLoaded: false,
+        });
+    }
+
+    /** Starts downloading the chat bundle as soon as the button is hovered. */
+    prefetch() {
+        loadBundle(CHAT_BUNDLE).catch(() => {});
+    }
+
+    toggleChat() {
+        this.state.isOpen = !this.state.isOpen;
+        this.state.isLoaded = true;
+    }
+
+    get chatProps() {
+        return {
+            isOpen: this.state.isOpen,
+            close: () => this.toggleChat(),
+        };
+    }
+}
+
+AIAgentSystray.template = "ai_agent_odoo.AIAgentSystray";
+AIAgentSystray.components = { LazyComponent };
+AIAgentSystray.props = {};
+
+// Add the widget to the systray
+registry.category("systray").add("ai_agent_odoo.AIAgentSystray", {
+    Component: AIAgentSystray,
+});
@@ -0,0 +1,52 @@
+import { describe, expect, test } from "@odoo/hoot";
+import { renderInPage } from "@ai_agent_odoo/js/ai_agent_markdown";
+
+describe.current.tags("headless");
+
+// The worker's rendering, and the in-page fallback used without a worker.
+const RENDERERS = {
+    worker: (text) => window.aiAgentMarkdown.render(text),
+    page: renderInPage,
+};
+
+function render(renderer, text) {
+    const container = document.createElement("div");
+    container.innerHTML = renderer(text);
+    return container;
+}
+
+for (const [name, renderer] of Object.entries(RENDERERS)) {
+    describe(name, () => {
+        test("image alt text can't close its attribute and tag", () => {
+            const container = render(renderer, '![x"><img src=y onerror=alert(1)>](http://h/z.png)');
+            expect(container.querySelectorAll("img")).toHaveLength(1);
+            const img = container.querySelector("img");
+            expect(img.getAttribute("src")).toBe("http://h/z.png");
+            expect(img.getAttribute("alt")).toBe('x"><img src=y onerror=alert(1)>');
+        });
+
+        test("image alt text can't add attributes", () => {
+            const img = render(renderer, '![a" onerror="alert(1)](http://x/y.png)').querySelector("img");
+            expect(img.getAttributeNames().sort()).toEqual(["alt", "src"]);
+            expect(img.getAttribute("alt")).toBe('a" onerror="alert(1)');
+        });
+
+        test("link URL and title can't add attributes", () => {
+            const link = render(renderer, '[a](http://x/"onmouseover=alert(1) "t\\" onclick=\\"alert(1)")')
+                .querySelector("a");
+            expect(link.getAttributeNames().sort()).toEqual(["href", "title"]);
+            expect(link.getAttribute("title")).toBe('t" onclick="alert(1)');
+        });
+
+        test("links and images with unsafe URLs keep only their text", () => {
+            const container = render(renderer, "[a](javascript:alert(1)) ![b](JaVaScRiPt:alert(1))");
+            expect(container.querySelector("a, img")).toBe(null);
+            expect(container.textContent.trim()).toBe("a b");
+        });
+
+        test("raw HTML is limited to the allowed tags and attributes", () => {
+            const container = render(renderer, '<b onclick="alert(1)">ok</b><script>alert(1)</script>');
+            expect(container.innerHTML.trim()).toBe("<p><b>ok</b></p>");
+        });
+    });
+}
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+from . import test_ai_agent_conversation
+from . import test_ai_agent_embedding
+from . import test_ai_agent_entity
+from . import test_ai_agent_fulltext
+from . import test_ai_agent_inflight
+from . import test_ai_agent_job
+from . import test_ai_agent_params
+from . import test_ai_agent_rate_limit
+from . import test_ai_agent_response_cache
+from . import test_ai_agent_tool_batch
+from . import test_ai_agent_tool_token
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestAIAgentConversation(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env['ir.config_parameter'].sudo().set_param('ai_agent_odoo.keep_last_turns', 1)
+        cls.conversation = cls.env['ai.agent.conversation'].create({'token_budget': 4000})
+
+    def _add_turns(self, count):
+        for index in range(count):
+            self.conversation._add_message('user', "Question %s" % index)
+            self.conversation._add_message('assistant', "Answer %s" % index)
+
+    def test_compact_history_folds_old_turns(self):
+        self._add_turns(3)
+        self.conversation._add_message('user', "Latest question")
+
+        payload = self.conversation._prepare_agent_payload()
+
+        messages = self.conversation.message_ids
+        folded, verbatim = messages[:-2], messages[-2:]
+        self.assertTrue(all(folded.mapped('is_summarized')))
+        self.assertFalse(any(verbatim.mapped('is_summarized')))
+        contents = [item['content'] for item in payload['conversation_history']]
+        self.assertEqual(contents[1:], ["Answer 2", "Latest question"])
+        self.assertIn("Summary of the earlier conversation", contents[0])
+        self.assertIn("Question 0", self.conversation.summary)
+        self.assertEqual(payload['prompt'], "Latest question")
+
+    def test_compact_history_is_incremental(self):
+        self._add_turns(2)
+        self.conversation._add_message('user', "Latest question")
+        self.conversation._compact_history()
+        summary = self.conversation.summary
+
+        self.conversation._add_message('assistant', "Latest answer")
+        self.conversation._add_message('user', "Follow-up")
+        self.conversation._compact_history()
+
+        self.assertTrue(self.conversation.summary.startswith(summary))
+        self.assertEqual(self.conversation.summary.count("Question 0"), 1)
+
+    def test_compact_history_respects_token_budget(self):
+        self.conversation.token_budget = 40
+        self.conversation._add_message('user', "word " * 100)
+        self.conversation._add_message('assistant', "word " * 100)
+        self.conversation._add_message('user', "Latest question")
+
+        verbatim = self.conversation._compact_history()
+
+        self.assertEqual(verbatim.mapped('content'), ["Latest question"])
+        self.assertEqual(len(self.conversation.message_ids.filtered('is_summarized')), 2)
+
+    def test_token_count_is_stored_and_recomputed(self):
+        message = self.conversation._add_message('user', "one two four")
+        self.assertEqual(message.token_count, 3)
+
+        message.content = "one two four five six"
+        self.assertEqual(message.token_count, 5)
+
+        message.content = False
+        self.assertEqual(message.token_count, 0)
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import json
+
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestAIAgentEmbedding(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env['ir.config_parameter'].sudo().set_param(
+            'ai_agent_odoo.embedding_fields', json.dumps({'res.partner': ['name']}))
+        cls.Embedding = cls.env['ai.agent.embedding']
+
+    def setUp(self):
+        super().setUp()
+        # The cron commits its claims; keep everything in the test transaction.
+        self.patch(self.env.cr, 'commit', lambda: None)
+
+    def _state(self, partner):
+        self.env.cr.execute(
+            "SELECT state FROM ai_agent_embedding WHERE res_model = 'res.partner' AND res_id = %s", [partner.id])
+        return self.env.cr.fetchone()[0]
+
+    def test_hooks_flag_and_cron_indexes(self):
+        partner = self.env['res.partner'].create({'name': "Late deliveries complaint"})
+        self.assertEqual(self._state(partner), 'pending')
+
+        self.Embedding._process_pending()
+        self.assertEqual(self._state(partner), 'done')
+        self.assertEqual(self.Embedding._search_similar("late deliveries", limit=1)[0]['id'], partner.id)
+
+        partner.name = "Blue pallets"
+        self.assertEqual(self._state(partner), 'pending')
+        partner.unlink()
+        self.env.cr.execute("SELECT count(*) FROM ai_agent_embedding WHERE res_id = %s", [partner.id])
+        self.assertEqual(self.env.cr.fetchone()[0], 0)
+
+    def test_write_during_indexing_is_redone(self):
+        partner = self.env['res.partner'].create({'name': "Azure Interior"})
+        self.env.cr.execute("UPDATE ai_agent_embedding SET state = 'done' WHERE state = 'pending'")
+        partner.name = "Azure Interior (renamed)"
+
+        rows = self.Embedding._claim_pending(10)
+        self.assertEqual([row[2] for row in rows], [partner.id])
+        self.assertEqual(self._state(partner), 'processing')
+        # A user write lands while the batch is being embedded.
+        partner.name = "Azure Interior (renamed twice)"
+        self.Embedding._index_entries(rows)
+        self.assertEqual(self._state(partner), 'pending')
+
+        self.Embedding._process_pending()
+        self.assertEqual(self._state(partner), 'done')
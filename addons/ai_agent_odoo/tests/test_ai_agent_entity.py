@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import TransactionCase, new_test_user, tagged
+
+from ..tools.access import readable_matches
+
+
+@tagged('post_install', '-at_install')
+class TestAIAgentEntityResolver(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.partner = self.env['res.partner'].create({'name': "Zyxwv Trading"})
+
+    def test_unreadable_models_are_skipped(self):
+        user = new_test_user(self.env, login='ai_agent_entity_user', groups='base.group_user')
+        candidates = [('ai.agent.trace', 1, 0.9), ('res.partner', self.partner.id, 0.8)]
+        matches = readable_matches(self.env(user=user), candidates, 5)
+        self.assertEqual([(match['model'], match['id']) for match in matches], [('res.partner', self.partner.id)])
+
+    def test_cache_sees_changes_of_other_workers(self):
+        if not self.env.registry.has_trigram:
+            self.skipTest("pg_trgm is not available")
+        Resolver = self.env['ai.agent.entity.resolver']
+        self.assertEqual([match['id'] for match in Resolver._resolve("zyxwv", ['res.partner'])], [self.partner.id])
+        # Renamed by another worker, whose writes go through no hook of this one.
+        self.env.flush_all()
+        self.env.cr.execute("""
+            UPDATE res_partner
+               SET name = 'Renamed', complete_name = 'Renamed',
+                   write_date = (SELECT max(write_date) FROM res_partner) + interval '1 second'
+             WHERE id = %s
+        """, [self.partner.id])
+        self.env.invalidate_all()
+        self.assertEqual(Resolver._resolve("zyxwv", ['res.partner']), [])
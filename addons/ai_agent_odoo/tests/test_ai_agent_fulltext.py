@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import json
+
+from odoo.tests import TransactionCase, tagged
+from odoo.tools.sql import SQL
+
+from ..models.ai_agent_fulltext import _index_name
+
+
+@tagged('post_install', '-at_install')
+class TestAIAgentFulltext(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env['ir.config_parameter'].sudo().set_param(
+            'ai_agent_odoo.fts_fields', json.dumps({'res.partner': ['name', 'comment']}))
+        cls.Fulltext = cls.env['ai.agent.fulltext']
+        cls.partner = cls.env['res.partner'].create({
+            'name': "Blue Pallets Logistics", 'comment': "Ordered the blue pallets last week",
+        })
+
+    def _build_index(self, model_name):
+        """Builds the index as the cron does, but in the test transaction."""
+        model = self.env[model_name]
+        expression, signature = self.Fulltext._get_documents()[model]
+        index = _index_name(model._table)
+        self.env.cr.execute(SQL(
+            "CREATE INDEX %s ON %s USING gin ((%s))", SQL.identifier(index), SQL.identifier(model._table), expression,
+        ))
+        self.env.cr.execute(SQL("COMMENT ON INDEX %s IS %s", SQL.identifier(index), signature))
+
+    def test_models_without_index_are_skipped(self):
+        self.env['ir.config_parameter'].sudo().set_param('ai_agent_odoo.fts_fields', json.dumps({
+            'res.partner': ['name', 'comment'],
+            # No field that can be full-text indexed.
+            'res.currency': ['rounding'],
+            # No table of its own.
+            'mail.thread': ['message_ids'],
+        }))
+        with self.assertLogs('odoo.addons.ai_agent_odoo.models.ai_agent_fulltext', 'WARNING'):
+            self.assertEqual(list(self.Fulltext._get_documents()), [self.env['res.partner']])
+            # res.partner is configured but its index is not built yet.
+            self.assertEqual(self.Fulltext._search_fulltext("blue pallets"), [])
+            self.assertEqual(self.Fulltext._search_fulltext("euro", model_names=['res.currency', 'mail.thread']), [])
+
+    def test_search_uses_current_index(self):
+        self._build_index('res.partner')
+        results = self.Fulltext._search_fulltext("blue pallet", model_names=['res.partner'])
+        self.assertEqual([result['id'] for result in results], [self.partner.id])
+
+        # An index built on another expression is not used.
+        self.env['ir.config_parameter'].sudo().set_param(
+            'ai_agent_odoo.fts_fields', json.dumps({'res.partner': ['name']}))
+        self.assertEqual(self.Fulltext._search_fulltext("blue pallet"), [])
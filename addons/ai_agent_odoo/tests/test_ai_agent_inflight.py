@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+from unittest.mock import Mock, patch
+
+from odoo.tests import HttpCase, new_test_user, tagged
+from odoo.tools import mute_logger
+
+from ..models import ai_agent_inflight
+from ..tools import gateway
+
+
+@tagged('post_install', '-at_install')
+class TestAIAgentInflight(HttpCase):
+
+    def setUp(self):
+        super().setUp()
+        self.env['ir.config_parameter'].sudo().set_param('ai_agent_odoo.service_url', 'http://127.0.0.1:9')
+        self.authenticate('admin', 'admin')
+
+    def test_leader_failure_releases_followers(self):
+        response = Mock(ok=True, elapsed=timedelta(0), content=b'<html>')
+        response.json.side_effect = ValueError("Expecting value")
+
+        with patch.object(gateway, 'post', return_value=response), mute_logger('odoo.http'):
+            with self.assertRaises(Exception):
+                self.make_jsonrpc_request('/ai_agent_odoo/invoke', {'message': "Hello"})
+
+        inflight = self.env['ai.agent.inflight'].sudo().search([])
+        self.assertEqual(inflight.mapped('state'), ['failed'])
+        self.assertEqual(inflight.error, "The AI service request failed.")
+
+    def test_follower_receives_leader_response(self):
+        self.env['ir.config_parameter'].sudo().set_param('ai_agent_odoo.share_across_users', 'True')
+        leader = new_test_user(self.env, login='ai_agent_leader', groups='base.group_user')
+        new_test_user(self.env, login='ai_agent_follower', groups='base.group_user')
+        # A teammate's identical question is being answered.
+        leader_env = self.env(user=leader, context=leader.context_get())
+        conversation = leader_env['ai.agent.conversation'].create({})
+        conversation._add_message('user', "Top customers?")
+        key = self.env['ai.agent.response.cache'].sudo()._make_key(conversation, leader_env)
+        Inflight = self.env['ai.agent.inflight'].sudo()
+        self.assertTrue(Inflight._acquire(key, 60))
+
+        def answer_while_polling(_seconds):
+            Inflight._resolve(key, "Azure Interior")
+
+        self.authenticate('ai_agent_follower', 'ai_agent_follower')
+        with patch.object(gateway, 'post') as post, \
+                patch.object(ai_agent_inflight, 'time', Mock(sleep=answer_while_polling)):
+            result = self.make_jsonrpc_request('/ai_agent_odoo/invoke', {'message': "top customers"})
+
+        post.assert_not_called()
+        self.assertEqual(result['response'], "Azure Interior")
+        self.assertTrue(result['coalesced'])
+        messages = self.env['ai.agent.conversation'].browse(result['conversation_id']).message_ids
+        self.assertEqual(messages.mapped('content'), ["top customers", "Azure Interior"])
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+from unittest.mock import patch
+
+from odoo import SUPERUSER_ID, api, fields
+from odoo.tests import TransactionCase, new_test_user, tagged
+from odoo.tools import SQL, config
+
+from ..models.ai_agent_job import DEFAULT_RUNNER_MAX_SECONDS, RUNNER_TIME_MARGIN
+
+
+def _create_jobs(env, count, **values):
+    conversation = env['ai.agent.conversation'].create({})
+    message = conversation._add_message('user', "Hello")
+    return env['ai.agent.job'].create([{
+        'conversation_id': conversation.id,
+        'message_id': message.id,
+        'user_id': env.uid,
+        **values,
+    } for _index in range(count)])
+
+
+@tagged('post_install', '-at_install')
+class TestAIAgentJob(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        # The claim commits to release its row locks at once.
+        self.patch(self.env.cr, 'commit', lambda: None)
+        self.Job = self.env['ai.agent.job']
+
+    def test_runner_claim_seconds(self):
+        Job = self.env['ai.agent.job']
+        self.env['ir.config_parameter'].sudo().set_param('ai_agent_odoo.read_timeout', '60')
+        for options, expected in [
+            ({'workers': 0}, DEFAULT_RUNNER_MAX_SECONDS),
+            ({'workers': 2, 'limit_time_real_cron': 0}, DEFAULT_RUNNER_MAX_SECONDS),
+            ({'workers': 2, 'limit_time_real_cron': -1, 'limit_time_real': 120}, 120 - 60 - RUNNER_TIME_MARGIN),
+            ({'workers': 2, 'limit_time_real_cron': 200, 'limit_time_real': 120}, 200 - 60 - RUNNER_TIME_MARGIN),
+            ({'workers': 2, 'limit_time_real_cron': 3600}, DEFAULT_RUNNER_MAX_SECONDS),
+            ({'workers': 2, 'limit_time_real_cron': 60}, 0),
+        ]:
+            with self.subTest(**options), patch.dict(config.options, options):
+                self.assertEqual(Job._get_runner_claim_seconds(), expected)
+
+    def test_claim(self):
+        jobs = _create_jobs(self.env, 3)
+        claimed = self.Job._claim_jobs('interactive', 2)
+        self.assertEqual(claimed, jobs[:2])
+        self.assertEqual(claimed.mapped('state'), ['running', 'running'])
+        self.assertEqual(claimed.mapped('attempts'), [1, 1])
+        self.assertTrue(all(claimed.mapped('lease_expires_at')))
+        self.assertEqual(jobs[2].state, 'queued')
+        self.assertFalse(self.Job._claim_jobs('batch', 2))
+
+    def test_claim_skips_locked_jobs(self):
+        # Another runner's lock is only seen from another transaction, on
+        # committed jobs.
+        with self.registry.cursor() as cr:
+            jobs = _create_jobs(api.Environment(cr, SUPERUSER_ID, {}), 2)
+            job_ids, conversation_id = jobs.ids, jobs.conversation_id.id
+        self.addCleanup(self._delete_conversation, conversation_id)
+
+        with self.registry.cursor() as locker, self.registry.cursor() as cr:
+            locker.execute(SQL("SELECT id FROM ai_agent_job WHERE id = %s FOR UPDATE", job_ids[0]))
+            cr.execute("SET LOCAL lock_timeout = '5s'")
+            claimed = api.Environment(cr, SUPERUSER_ID, {})['ai.agent.job']._claim_jobs('interactive', 2)
+            self.assertNotIn(job_ids[0], claimed.ids)
+            self.assertIn(job_ids[1], claimed.ids)
+            locker.rollback()
+
+    def _delete_conversation(self, conversation_id):
+        with self.registry.cursor() as cr:
+            cr.execute(SQL("DELETE FROM ai_agent_conversation WHERE id = %s", conversation_id))
+
+    def test_requeue_expired_lease(self):
+        # now() is the start of the test's transaction, the leases are far
+        # enough on either side of it.
+        now = fields.Datetime.now()
+        expired = _create_jobs(self.env, 1, state='running', attempts=1, node='host',
+                               lease_expires_at=now - timedelta(days=1))
+        alive = _create_jobs(self.env, 1, state='running', attempts=1, node='host',
+                             lease_expires_at=now + timedelta(days=1))
+
+        self.assertEqual(self.Job._requeue_expired_jobs(), [(expired.id, 'queued')])
+        self.assertRecordValues(expired + alive, [
+            {'state': 'queued', 'attempts': 1, 'node': False, 'lease_expires_at': False},
+            {'state': 'running', 'attempts': 1, 'node': 'host', 'lease_expires_at': now + timedelta(days=1)},
+        ])
+        self.assertEqual(self.Job._claim_jobs('interactive', 1), expired)
+        self.assertRecordValues(expired, [{'state': 'running', 'attempts': 2}])
+
+    def test_fail_after_max_attempts(self):
+        self.env['ir.config_parameter'].sudo().set_param('ai_agent_odoo.job_max_attempts', '2')
+        expired_at = fields.Datetime.now() - timedelta(days=1)
+        retried = _create_jobs(self.env, 1, state='running', attempts=1, lease_expires_at=expired_at)
+        failed = _create_jobs(self.env, 1, state='running', attempts=2, lease_expires_at=expired_at)
+
+        self.assertEqual(sorted(self.Job._requeue_expired_jobs()), [(retried.id, 'queued'), (failed.id, 'failed')])
+        self.assertRecordValues(failed, [{'state': 'failed', 'error': "The job was interrupted too many times."}])
+        self.assertTrue(failed.finished_at)
+        self.assertEqual(self.Job._claim_jobs('interactive', 2), retried)
+
+    def test_lane_backlog_does_not_starve_other_lanes(self):
+        self.env['ir.config_parameter'].sudo().set_param('ai_agent_odoo.job_concurrency_batch', '2')
+        batch = _create_jobs(self.env, 20, lane='batch')
+        interactive = _create_jobs(self.env, 1, lane='interactive')
+
+        self.assertEqual(len(self.Job._claim_node_jobs('batch', 20)), 2)
+        self.assertFalse(self.Job._claim_node_jobs('batch', 20))
+        self.assertEqual(self.Job._claim_node_jobs('interactive', 4), interactive)
+        self.assertEqual(len(batch.filtered(lambda job: job.state == 'queued')), 18)
+
+    def test_user_weights(self):
+        heavy = new_test_user(self.env, login='heavy')
+        light = new_test_user(self.env, login='light')
+        self.env['ir.config_parameter'].sudo().set_param('ai_agent_odoo.job_user_weights', '{"heavy": 3}')
+        # Enqueued at the same time, so that only the weights order them.
+        now = fields.Datetime.now()
+        heavy_jobs = _create_jobs(self.env, 8, user_id=heavy.id, enqueued_at=now)
+        light_jobs = _create_jobs(self.env, 8, user_id=light.id, enqueued_at=now)
+
+        claimed = self.Job._claim_jobs('interactive', 4)
+        self.assertEqual(claimed, heavy_jobs[:3] + light_jobs[:1])
+        # The jobs a user already runs count against their share.
+        claimed = self.Job._claim_jobs('interactive', 4)
+        self.assertEqual(claimed, heavy_jobs[3:6] + light_jobs[1:2])
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import TransactionCase, new_test_user, tagged
+
+from ..tools import params
+from ..tools.access import readable_matches
+
+
+def _to_tuples(config):
+    return {key: tuple(value) for key, value in config.items()}
+
+
+@tagged('post_install', '-at_install')
+class TestAIAgentParams(TransactionCase):
+
+    def _set(self, key, value):
+        self.env['ir.config_parameter'].sudo().set_param('ai_agent_odoo.%s' % key, value)
+
+    def test_get_int(self):
+        self.assertEqual(params.get_int(self.env, 'ai_agent_odoo.unset', 7), 7)
+        self._set('test_int', '12')
+        self.assertEqual(params.get_int(self.env, 'ai_agent_odoo.test_int', 7), 12)
+        self._set('test_int', '0')
+        self.assertEqual(params.get_int(self.env, 'ai_agent_odoo.test_int', 7, minimum=1), 7)
+        self._set('test_int', 'twelve')
+        with self.assertLogs('odoo.addons.ai_agent_odoo.tools.params', 'WARNING'):
+            self.assertEqual(params.get_int(self.env, 'ai_agent_odoo.test_int', 7), 7)
+
+    def test_get_float(self):
+        self._set('test_float', '0.25')
+        self.assertEqual(params.get_float(self.env, 'ai_agent_odoo.test_float', 0.5), 0.25)
+        self._set('test_float', 'high')
+        with self.assertLogs('odoo.addons.ai_agent_odoo.tools.params', 'WARNING'):
+            self.assertEqual(params.get_float(self.env, 'ai_agent_odoo.test_float', 0.5), 0.5)
+
+    def test_get_json(self):
+        self.assertEqual(params.get_json(self.env, 'ai_agent_odoo.test_json', '{"a": 1}'), {'a': 1})
+        self._set('test_json', '{"b": ["x"]}')
+        self.assertEqual(params.get_json(self.env, 'ai_agent_odoo.test_json', convert=_to_tuples), {'b': ('x',)})
+        self._set('test_json', '{"b": ')
+        with self.assertLogs('odoo.addons.ai_agent_odoo.tools.params', 'WARNING'):
+            self.assertEqual(params.get_json(self.env, 'ai_agent_odoo.test_json'), {})
+
+    def test_readable_matches(self):
+        user = new_test_user(self.env, login='ai_agent_reader', groups='base.group_user')
+        other_company = self.env['res.company'].create({'name': "Other Company"})
+        own = self.env['res.partner'].create({'name': "Shared Partner"})
+        other = self.env['res.partner'].create({'name': "Other Partner", 'company_id': other_company.id})
+        candidates = [('res.partner', other.id, 0.9), ('res.partner', own.id, 0.87654), ('res.partner', 0, 0.5)]
+
+        self.assertEqual(readable_matches(self.env(user=user), candidates, 5), [{
+            'model': 'res.partner', 'id': own.id, 'display_name': own.display_name, 'score': 0.8765,
+        }])
+        results = readable_matches(self.env, candidates, 1, score_name='rank')
+        self.assertEqual([(result['id'], result['rank']) for result in results], [(other.id, 0.9)])
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import HttpCase, new_test_user, tagged
+
+from ..tools.ratelimit import RateLimitExceeded
+
+
+@tagged('post_install', '-at_install')
+class TestAIAgentRateLimit(HttpCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        ICP = cls.env['ir.config_parameter'].sudo()
+        ICP.set_param('ai_agent_odoo.service_url', 'http://127.0.0.1:9')
+        ICP.set_param('ai_agent_odoo.rate_limit_user', '1/3600')
+        cls.user = new_test_user(cls.env, login='ai_agent_limited', groups='base.group_user')
+
+    def test_invoke_returns_retry_after(self):
+        # Takes the user's only token.
+        self.env['ai.agent.rate.bucket'].sudo()._admit(self.env(user=self.user))
+        self.authenticate('ai_agent_limited', 'ai_agent_limited')
+
+        result = self.make_jsonrpc_request('/ai_agent_odoo/invoke', {'message': "Hello"})
+
+        self.assertEqual(result['error'], 'rate_limited')
+        self.assertGreater(result['retry_after'], 3500)
+        self.assertFalse(self.env['ai.agent.conversation'].search([('user_id', '=', self.user.id)]))
+
+    def test_backends(self):
+        Bucket = self.env['ai.agent.rate.bucket'].sudo()
+        user_env = self.env(user=self.user)
+        ICP = self.env['ir.config_parameter'].sudo()
+        for backend in ('database', 'memory'):
+            with self.subTest(backend=backend):
+                ICP.set_param('ai_agent_odoo.rate_limit_backend', backend)
+                Bucket._admit(user_env)
+                with self.assertRaises(RateLimitExceeded):
+                    Bucket._admit(user_env)
+                stored = Bucket.search([('key', '=', 'user:%s' % self.user.id)])
+                self.assertEqual(bool(stored), backend == 'database')
+                stored.unlink()
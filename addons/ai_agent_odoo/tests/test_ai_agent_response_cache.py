@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+from odoo import Command
+from odoo.tests import HttpCase, TransactionCase, new_test_user, tagged
+
+from ..controllers.main import TOOL_EXECUTE_ROUTE
+from ..tools import embeddings
+from ..tools.signing import sign_tool_token
+
+# Words of the stub embedder's dimensions; any other word counts in the last one.
+STUB_TOPICS = {
+    'top': 0, 'best': 0, 'biggest': 0,
+    'customers': 1, 'clients': 1,
+    'unpaid': 2, 'invoices': 2,
+}
+
+
+def stub_embedder(text):
+    """Deterministic bag-of-topics embedding: synonyms land on the same axis."""
+    vector = [0.0] * 4
+    for word in text.split():
+        vector[STUB_TOPICS.get(word, 3)] += 1.0
+    return vector
+
+
+@tagged('post_install', '-at_install')
+class TestAIAgentSemanticCache(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        ICP = cls.env['ir.config_parameter'].sudo()
+        ICP.set_param('ai_agent_odoo.semantic_cache', 'True')
+        ICP.set_param('ai_agent_odoo.semantic_cache_threshold', '0.9')
+        cls.Cache = cls.env['ai.agent.response.cache'].sudo()
+
+    def setUp(self):
+        super().setUp()
+        embeddings.register_embedder(stub_embedder)
+        self.addCleanup(embeddings.register_embedder, None)
+
+    def _key(self, prompt, env=None):
+        conversation = self.env['ai.agent.conversation'].create({})
+        conversation._add_message('user', prompt)
+        return self.Cache._make_key(conversation, env or self.env)
+
+    def _store(self, prompt, response, env=None):
+        self.Cache._store(self._key(prompt, env), response, prompt)
+
+    def _lookup(self, prompt, env=None):
+        return self.Cache._lookup(self._key(prompt, env), prompt)
+
+    def test_exact_hit(self):
+        self._store("Top customers?", "Azure Interior")
+        self.assertEqual(self._lookup("top   customers"), "Azure Interior")
+
+    def test_paraphrase_hits(self):
+        self._store("top customers", "Azure Interior")
+        self.assertEqual(self._lookup("best clients"), "Azure Interior")
+        self.assertEqual(self._lookup("biggest clients?"), "Azure Interior")
+
+    def test_below_threshold_misses(self):
+        self._store("top customers", "Azure Interior")
+        self.assertIsNone(self._lookup("unpaid invoices"))
+        # Shares a topic but is not close enough: cosine similarity of 0.5.
+        self.assertIsNone(self._lookup("top invoices"))
+
+    def test_disabled_semantic_tier_misses(self):
+        self._store("top customers", "Azure Interior")
+        self.env['ir.config_parameter'].sudo().set_param('ai_agent_odoo.semantic_cache', 'False')
+        self.assertIsNone(self._lookup("best clients"))
+
+    def test_access_context_isolation(self):
+        other_user = new_test_user(self.env, login='ai_agent_cache_user', groups='base.group_user')
+        other_company = self.env['res.company'].create({'name': "AI Agent Cache Company"})
+        self.env['res.lang']._activate_lang('fr_FR')
+        self._store("top customers", "Azure Interior")
+        for env in (
+            self.env(user=other_user),
+            self.env(context=dict(self.env.context, allowed_company_ids=other_company.ids)),
+            self.env(context=dict(self.env.context, lang='fr_FR')),
+        ):
+            with self.subTest(uid=env.uid, companies=env.companies.ids, lang=env.lang):
+                self.assertIsNone(self._lookup("top customers", env))
+                self.assertIsNone(self._lookup("best clients", env))
+        self.assertEqual(self._lookup("best clients"), "Azure Interior")
+
+    def test_changed_data_misses(self):
+        partner, other = self.env['res.partner'].create([{'name': "Azure Interior"}, {'name': "Deco Addict"}])
+        # The data is read in an earlier transaction than the lookups.
+        self.env.cr.execute("UPDATE res_partner SET write_date = write_date - interval '1 hour'")
+        freshness = self.Cache._get_freshness_token(['res.partner', 'no.such.model'])
+        self.assertEqual(list(freshness), ['res.partner'])
+        for prompt, change in [
+            ("top customers", lambda: partner.write({'name': "Azure Interior (renamed)"})),
+            ("best clients", other.unlink),
+        ]:
+            with self.subTest(prompt=prompt):
+                key = self._key(prompt)
+                self.Cache._store(key, "Azure Interior", prompt, freshness)
+                self.assertEqual(self.Cache._lookup(key, prompt), "Azure Interior")
+                change()
+                self.assertIsNone(self.Cache._lookup(key, prompt))
+                freshness = self.Cache._get_freshness_token(['res.partner'])
+
+    def test_shared_across_users(self):
+        first, second = (
+            self.env(user=new_test_user(self.env, login='ai_agent_team_%s' % i, groups='base.group_user'))
+            for i in range(2)
+        )
+        self.assertNotEqual(self._key("top customers", first), self._key("top customers", second))
+
+        self.env['ir.config_parameter'].sudo().set_param('ai_agent_odoo.share_across_users', 'True')
+        self.assertEqual(self._key("top customers", first), self._key("top customers", second))
+        # The answer depends on who asks.
+        self.assertNotEqual(self._key("my top customers", first), self._key("my top customers", second))
+
+        # Users of the same groups may now see different contacts.
+        self.env['ir.rule'].create({
+            'name': "Own contacts",
+            'model_id': self.env.ref('base.model_res_partner').id,
+            'groups': [Command.link(self.env.ref('base.group_user').id)],
+            'domain_force': "[('user_id', 'in', [user.id, False])]",
+        })
+        self.assertNotEqual(self._key("top customers", first), self._key("top customers", second))
+
+
+@tagged('post_install', '-at_install')
+class TestAIAgentToolWrite(HttpCase):
+
+    def setUp(self):
+        super().setUp()
+        self.conversation = self.env['ai.agent.conversation'].create({})
+        self.message = self.conversation._add_message('user', "Rename Azure Interior")
+        self.partner = self.env['res.partner'].create({'name': "Azure Interior"})
+
+    def _call_tool(self, method, args):
+        token = sign_tool_token(self.env, message_id=self.message.id)
+        return self.make_jsonrpc_request(
+            TOOL_EXECUTE_ROUTE, {'model': 'res.partner', 'method': method, 'args': args},
+            headers={'Authorization': 'Bearer %s' % token})
+
+    def _cached_keys(self):
+        return self.env['ai.agent.response.cache'].sudo().search([]).mapped('key')
+
+    def test_read_tool_turn_is_cached(self):
+        self._call_tool('read', [[self.partner.id], ['name']])
+        self.assertFalse(self.message.tool_write)
+
+        self.conversation._finish_turn(self.message, "Nothing changed", 'context:read')
+        self.assertIn('context:read', self._cached_keys())
+        self.assertEqual(list(self.message.read_models), ['res.partner'])
+
+        Cache = self.env['ai.agent.response.cache'].sudo()
+        self.assertEqual(Cache._lookup('context:read'), "Nothing changed")
+        self.partner.unlink()
+        self.assertIsNone(Cache._lookup('context:read'))
+
+    def test_write_tool_turn_is_not_cached(self):
+        self._call_tool('write', [[self.partner.id], {'name': "Azure Interior (renamed)"}])
+        self.message.invalidate_recordset(['tool_write'])
+        self.assertTrue(self.message.tool_write)
+
+        self.conversation._finish_turn(self.message, "Renamed", 'context:write')
+        self.assertNotIn('context:write', self._cached_keys())
+        self.assertEqual(self.conversation.message_ids[-1].content, "Renamed")
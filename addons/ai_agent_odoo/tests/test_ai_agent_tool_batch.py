@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import json
+
+from odoo.exceptions import UserError
+from odoo.tests import HttpCase, TransactionCase, tagged
+from odoo.tools import mute_logger
+
+from ..controllers.main import TOOL_BATCH_ROUTE, _resolve_references
+from ..tools.signing import sign_tool_token
+
+ORDERS = [
+    {'id': 1, 'partner_id': [7, "Azure Interior"], 'tag_ids': [1, 2]},
+    {'id': 2, 'partner_id': False, 'tag_ids': [3]},
+]
+
+
+@tagged('post_install', '-at_install')
+class TestAIAgentReferences(TransactionCase):
+
+    def test_path_is_applied_to_every_item(self):
+        results = [ORDERS]
+        self.assertEqual(_resolve_references({'$ref': 0, 'path': 'id'}, results), [1, 2])
+        # many2one pairs are reduced to ids, lists are flattened.
+        self.assertEqual(_resolve_references({'$ref': 0, 'path': 'partner_id'}, results), [7, False])
+        self.assertEqual(_resolve_references({'$ref': 0, 'path': 'tag_ids'}, results), [1, 2, 3])
+
+    def test_nested_references(self):
+        results = [[7, 8], {'count': 2}]
+        value = [[['id', 'in', {'$ref': 0}]], {'limit': {'$ref': 1, 'path': 'count'}}]
+        self.assertEqual(_resolve_references(value, results), [[['id', 'in', [7, 8]]], {'limit': 2}])
+
+    def test_missing_path(self):
+        self.assertEqual(_resolve_references({'$ref': 0, 'path': 'user_id'}, [ORDERS]), [None, None])
+        self.assertIsNone(_resolve_references({'$ref': 0, 'path': 'user_id'}, [{'id': 1}]))
+        with self.assertRaisesRegex(UserError, "Cannot read id"):
+            _resolve_references({'$ref': 0, 'path': 'id'}, [42])
+
+    def test_forward_references(self):
+        for index in (1, 2, -1, '0', None):
+            with self.subTest(index=index), self.assertRaisesRegex(UserError, "only earlier calls"):
+                _resolve_references({'$ref': index}, [ORDERS])
+
+
+@tagged('post_install', '-at_install')
+class TestAIAgentToolBatch(HttpCase):
+
+    def _batch(self, calls):
+        response = self.url_open(TOOL_BATCH_ROUTE, json.dumps({
+            'jsonrpc': '2.0', 'method': 'call', 'params': {'calls': calls},
+        }), headers={'Content-Type': 'application/json', 'Authorization': 'Bearer %s' % sign_tool_token(self.env)})
+        return response.json()
+
+    def test_references_to_earlier_results(self):
+        partner = self.env['res.partner'].create({'name': "Azure Interior"})
+        result = self._batch([
+            {'model': 'res.partner', 'method': 'search', 'args': [[('id', '=', partner.id)]]},
+            {'model': 'res.partner', 'method': 'read', 'args': [{'$ref': 0}, ['name']]},
+        ])
+        self.assertEqual(result['result']['results'][1], [{'id': partner.id, 'name': "Azure Interior"}])
+
+    def test_reference_to_failed_call(self):
+        calls = [
+            {'model': 'res.partner', 'method': 'create', 'args': [{'name': "AI Agent Batch Partner"}]},
+            {'model': 'no.such.model', 'method': 'search', 'args': [[]]},
+            {'model': 'res.partner', 'method': 'read', 'args': [{'$ref': 1}, ['name']]},
+        ]
+        with mute_logger('odoo.http'):
+            error = self._batch(calls)['error']
+        self.assertIn("Call 1 (no.such.model.search) failed", error['data']['message'])
+        # The batch stopped at the failed call, and was rolled back.
+        self.assertFalse(self.env['res.partner'].search([('name', '=', "AI Agent Batch Partner")]))
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import base64
+import json
+
+from odoo.tests import HttpCase, new_test_user, tagged
+from odoo.tools import mute_logger
+
+from ..controllers.main import TOOL_EXECUTE_ROUTE
+from ..tools.signing import sign_tool_token
+
+
+@tagged('post_install', '-at_install')
+class TestAIAgentToolToken(HttpCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = new_test_user(self.env, login='ai_agent_token_user', groups='base.group_user')
+        self.other_user = new_test_user(self.env, login='ai_agent_token_other', groups='base.group_user')
+        Conversation = self.env['ai.agent.conversation']
+        self.conversation = Conversation.with_user(self.user).create({'name': "Mine"})
+        Conversation.with_user(self.other_user).create({'name': "Someone else's"})
+
+    def _list_conversations(self, token):
+        return self.make_jsonrpc_request(TOOL_EXECUTE_ROUTE, {
+            'model': 'ai.agent.conversation', 'method': 'search_read', 'args': [[], ['name']],
+        }, headers={'Authorization': 'Bearer %s' % token})['result']
+
+    def _assert_rejected(self, token):
+        with mute_logger('odoo.http'), self.assertRaisesRegex(Exception, 'Unauthorized'):
+            self._list_conversations(token)
+
+    def test_valid_token_runs_as_its_user(self):
+        token = sign_tool_token(self.env(user=self.user))
+        self.assertEqual([row['name'] for row in self._list_conversations(token)], ["Mine"])
+
+    def test_expired_token(self):
+        self._assert_rejected(sign_tool_token(self.env(user=self.user), ttl=-1))
+
+    def test_tampered_signature(self):
+        data, _sep, signature = sign_tool_token(self.env(user=self.user)).partition('.')
+        tampered = signature[:-1] + ('0' if signature[-1] != '0' else '1')
+        self._assert_rejected('%s.%s' % (data, tampered))
+
+    def test_wrong_uid(self):
+        data, _sep, signature = sign_tool_token(self.env(user=self.user)).partition('.')
+        payload = json.loads(base64.urlsafe_b64decode(data))
+        payload['uid'] = self.other_user.id
+        forged = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+        self._assert_rejected('%s.%s' % (forged, signature))
+
+    def test_missing_token(self):
+        self._assert_rejected('')
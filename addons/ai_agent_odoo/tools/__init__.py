@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+from . import access
+from . import embeddings
+from . import gateway
+from . import indexes
+from . import lru
+from . import metrics
+from . import params
+from . import ratelimit
+from . import signing
+from . import tokens
+from . import tracing
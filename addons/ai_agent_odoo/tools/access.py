@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""Access filtering of the records found by the agent's search tools."""
+
+
+def readable_matches(env, candidates, limit, score_name='score'):
+    """
+    Returns the first ``limit`` of the ``(model name, id, score)`` candidates
+    that the user of ``env`` may read, with access rights and record rules
+    applied, as ``{"model", "id", "display_name", <score_name>}`` dicts.
+
+    Candidates usually come from SQL run without access checks, or from a
+    cache shared by several users, so this must be applied every time.
+    """
+    readable = {}
+    for model_name in {candidate[0] for candidate in candidates}:
+        if not env[model_name].has_access('read'):
+            continue
+        ids = [candidate[1] for candidate in candidates if candidate[0] == model_name]
+        readable.update({(model_name, record.id): record for record in env[model_name].search([('id', 'in', ids)])})
+    results = []
+    for model_name, res_id, score in candidates:
+        record = readable.get((model_name, res_id))
+        if record:
+            results.append({
+                'model': model_name,
+                'id': res_id,
+                'display_name': record.display_name,
+                score_name: round(float(score), 4),
+            })
+        if len(results) == limit:
+            break
+    return results
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Local text embeddings and similarity search over packed float32 vectors.
+
+A real embedding model can be plugged in with :func:`register_embedder`. The
+default embedder is a deterministic feature-hashing of words and character
+trigrams: it runs anywhere on CPU with no model files, which makes it suitable
+for tests, but it only captures lexical similarity.
+
+NumPy is used for scoring when it is installed, with a pure Python fallback.
+"""
+import math
+import re
+import zlib
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+DEFAULT_DIMENSIONS = 256
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+_embedder = None
+
+
+def register_embedder(embedder):
+    """
+    Uses ``embedder`` for all future embeddings. It must be a callable taking a
+    string and returning a sequence of floats, always of the same length; pass
+    ``None`` to go back to the hashing embedder. Vectors stored with another
+    embedder must be rebuilt.
+    """
+    global _embedder
+    _embedder = embedder
+
+
+def hashing_embedding(text, dimensions=DEFAULT_DIMENSIONS):
+    """Feature-hashing embedding of the words and character trigrams of ``text``."""
+    vector = [0.0] * dimensions
+    for word in _WORD_RE.findall((text or '').lower()):
+        padded = '#%s#' % word
+        features = [word] + [padded[i:i + 3] for i in range(len(padded) - 2)]
+        for feature in features:
+            digest = zlib.crc32(feature.encode())
+            vector[digest % dimensions] += 1.0 if digest & 0x80000000 else -1.0
+    return vector
+
+
+def embed(text):
+    """Returns the L2-normalised embedding of ``text`` as float32 bytes."""
+    vector = (_embedder or hashing_embedding)(text or '')
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return array('f', (value / norm for value in vector)).tobytes()
+
+
+def top_k(query, vectors, k=1):
+    """
+    Scores the packed ``query`` vector against the list of packed ``vectors``
+    (cosine similarity, vectors being normalised) and returns the ``k`` best
+    ``(index, score)`` pairs, best first.
+    """
+    if not vectors:
+        return []
+    if numpy is not None:
+        matrix = numpy.frombuffer(b''.join(vectors), dtype=numpy.float32).reshape(len(vectors), -1)
+        scores = matrix @ numpy.frombuffer(query, dtype=numpy.float32)
+        best = numpy.argsort(-scores)[:k]
+        return [(int(index), float(scores[index])) for index in best]
+    query = array('f', query)
+    scores = []
+    for index, data in enumerate(vectors):
+        vector = array('f', data)
+        scores.append((index, sum(a * b for a, b in zip(query, vector))))
+    scores.sort(key=lambda pair: -pair[1])
+    return scores[:k]
+
+
+def to_pgvector(vector):
+    """Formats a packed float32 vector as a pgvector literal, ``'[x, y, ...]'``."""
+    return '[%s]' % ','.join(repr(value) for value in array('f', vector))
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP gateway between Odoo and the external AI service.
+
+Each Odoo worker process keeps a ``requests.Session`` whose adapter holds a pool
+of keep-alive connections to the AI service, so consecutive turns reuse an open
+(TLS) connection instead of paying a new handshake every time. Sessions are
+created lazily, after the prefork server has forked, so pools are never shared
+between processes.
+"""
+import json
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import metrics, params, tracing
+
+INVOKE_PATH = '/api/v1/agent/invoke'
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 120
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+class GatewayConfig:
+    """Connection settings read from the ``ai_agent_odoo.*`` system parameters."""
+
+    def __init__(self, env):
+        get_param = env['ir.config_parameter'].sudo().get_param
+        self.dbname = env.cr.dbname
+        self.service_url = (get_param('ai_agent_odoo.service_url') or '').rstrip('/')
+        self.api_key = get_param('ai_agent_odoo.api_key') or ''
+        self.pool_size = params.get_int(env, 'ai_agent_odoo.pool_size', DEFAULT_POOL_SIZE, minimum=1)
+        self.timeout = (
+            params.get_int(env, 'ai_agent_odoo.connect_timeout', DEFAULT_CONNECT_TIMEOUT, minimum=1),
+            params.get_int(env, 'ai_agent_odoo.read_timeout', DEFAULT_READ_TIMEOUT, minimum=1),
+        )
+
+
+def get_session(pool_size=DEFAULT_POOL_SIZE):
+    """Returns this process' pooled session for the given pool size."""
+    session = _sessions.get(pool_size)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(pool_size)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _sessions[pool_size] = session
+    return session
+
+
+def post(config, path, payload, stream=False, headers=None):
+    """
+    Sends ``payload`` as JSON to ``path`` on the AI service over a pooled
+    keep-alive connection. The API key is added here and never leaves the server.
+    """
+    request_headers = {'api-Key': config.api_key, 'Content-Type': 'application/json'}
+    trace = tracing.current()
+    if trace:
+        # The AI service passes it on to its tool calls.
+        request_headers['traceparent'] = trace.traceparent()
+    request_headers.update(headers or {})
+    data = json.dumps(payload).encode()
+    metrics.increment(config.dbname, 'ai_agent_upstream_bytes_sent_total', len(data))
+    return get_session(config.pool_size).post(
+        '%s%s' % (config.service_url, path),
+        data=data,
+        headers=request_headers,
+        stream=stream,
+        timeout=config.timeout,
+    )
+
+
+def _extract_delta(data):
+    """
+    Pulls the text fragment out of one upstream event. The AI service may send
+    plain text or a JSON object using one of the common delta keys.
+    """
+    try:
+        value = json.loads(data)
+    except ValueError:
+        return data
+    if isinstance(value, dict):
+        for key in ('delta', 'token', 'content', 'response'):
+            if isinstance(value.get(key), str):
+                return value[key]
+        return ''
+    return value if isinstance(value, str) else ''
+
+
+def iter_deltas(response):
+    """
+    Yields text fragments from the upstream response as they arrive, whatever
+    framing the AI service uses (SSE, chunked plain text or a single JSON body).
+    """
+    content_type = response.headers.get('Content-Type', '')
+    if content_type.startswith('text/event-stream'):
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith('data:'):
+                continue
+            data = line[5:].strip()
+            if data == '[DONE]':
+                break
+            delta = _extract_delta(data)
+            if delta:
+                yield delta
+    elif content_type.startswith('application/json'):
+        yield response.json().get('response', '')
+    else:
+        response.encoding = response.encoding or 'utf-8'
+        for chunk in response.iter_content(chunk_size=None, decode_unicode=True):
+            if chunk:
+                yield chunk
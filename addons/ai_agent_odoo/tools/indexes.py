@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Concurrent builds of the indexes the AI Assistant adds to other modules' tables.
+
+``CREATE INDEX`` locks the table against writes for as long as the build
+takes, which on a large table stops the business. These indexes are built
+``CONCURRENTLY`` instead, by crons, which cannot be done in a transaction:
+the statements run on a connection of their own in autocommit mode.
+"""
+import hashlib
+import logging
+
+from contextlib import closing, contextmanager
+
+from odoo import sql_db
+from odoo.tools.sql import SQL
+
+_logger = logging.getLogger(__name__)
+
+
+def index_name(prefix, table):
+    """Returns ``prefix + table``, shortened to PostgreSQL's 63 characters limit."""
+    name = prefix + table
+    if len(name) > 63:
+        name = prefix + hashlib.sha1(table.encode()).hexdigest()[:16]
+    return name
+
+
+@contextmanager
+def autocommit_cursor(env):
+    """Yields a new cursor on ``env``'s database, in autocommit mode."""
+    with closing(sql_db.db_connect(env.cr.dbname).cursor()) as cr:
+        cr._cnx.autocommit = True
+        try:
+            yield cr
+        finally:
+            cr._cnx.autocommit = False
+
+
+def get_indexes(cr, prefix):
+    """Returns ``{index name: (table, comment, valid)}`` of the indexes named ``prefix...``."""
+    cr.execute(SQL(
+        """
+        SELECT c.relname, t.relname, obj_description(c.oid, 'pg_class'), i.indisvalid
+          FROM pg_index i
+          JOIN pg_class c ON c.oid = i.indexrelid
+          JOIN pg_class t ON t.oid = i.indrelid
+         WHERE c.relname LIKE %s AND c.relnamespace = current_schema()::regnamespace
+        """, prefix.replace('_', r'\_') + '%',
+    ))
+    return {index: (table, comment, valid) for index, table, comment, valid in cr.fetchall()}
+
+
+def create_index_concurrently(cr, name, table, definition, comment=None):
+    """
+    Builds the index ``name`` on ``table`` with the ``definition`` SQL (what
+    follows the table name, such as ``USING gin (...)``), on an autocommit
+    cursor. ``comment``, if given, is set on the index, to tell later whether
+    it is still up to date.
+    """
+    _logger.info("Building the AI Assistant index %s on %s", name, table)
+    cr.execute(SQL(
+        "CREATE INDEX CONCURRENTLY %s ON %s %s",
+        SQL.identifier(name), SQL.identifier(table), definition,
+    ))
+    if comment is not None:
+        cr.execute(SQL("COMMENT ON INDEX %s IS %s", SQL.identifier(name), comment))
+
+
+def drop_index_concurrently(cr, name):
+    cr.execute(SQL("DROP INDEX CONCURRENTLY IF EXISTS %s", SQL.identifier(name)))
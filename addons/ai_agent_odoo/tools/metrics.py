@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Process-wide counters, gauges and histograms of the AI Assistant's activity.
+
+Each worker buffers its measurements in memory, per database, and the
+``ai.agent.metric`` model periodically adds them to a shared table, so the
+metrics route can export the totals of all worker processes.
+
+Series are keyed on ``(name, labels, le)``: ``labels`` is a sorted tuple of
+label pairs and ``le`` the upper bound of a histogram bucket, or ``''``.
+Histogram buckets are not cumulative here; they are summed on export.
+Counters are named ``..._total``; other series without buckets are gauges,
+whose value is the sum of the workers' adjustments.
+"""
+import collections
+import contextlib
+import threading
+import time
+
+# Upper bounds of the latency histogram buckets, in seconds.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_lock = threading.Lock()
+_buffers = collections.defaultdict(collections.Counter)
+_last_flush = {}
+
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def increment(dbname, name, value=1, **labels):
+    """Adds ``value`` to the counter ``name`` with the given labels."""
+    with _lock:
+        _buffers[dbname][name, _labels(labels), ''] += value
+
+
+def adjust(dbname, name, value, **labels):
+    """Adds ``value``, which may be negative, to the gauge ``name`` with the given labels."""
+    with _lock:
+        _buffers[dbname][name, _labels(labels), ''] += value
+
+
+def observe(dbname, name, value, **labels):
+    """Records ``value`` in the histogram ``name`` with the given labels."""
+    labels = _labels(labels)
+    le = next((str(bound) for bound in LATENCY_BUCKETS if value <= bound), '+Inf')
+    with _lock:
+        buffer = _buffers[dbname]
+        buffer[name + '_bucket', labels, le] += 1
+        buffer[name + '_sum', labels, ''] += value
+        buffer[name + '_count', labels, ''] += 1
+
+
+@contextlib.contextmanager
+def timer(dbname, name, **labels):
+    """Observes the duration of the ``with`` block in the histogram ``name``."""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        observe(dbname, name, time.monotonic() - start, **labels)
+
+
+def timed_deltas(dbname, deltas, start, route):
+    """
+    Passes the upstream ``deltas`` through, recording the time to the first
+    one and to the last one since ``start``, and the bytes received.
+    """
+    received = 0
+    for delta in deltas:
+        if not received:
+            observe(dbname, 'ai_agent_upstream_first_token_seconds', time.monotonic() - start, route=route)
+        received += len(delta.encode())
+        yield delta
+    observe(dbname, 'ai_agent_upstream_seconds', time.monotonic() - start, route=route)
+    increment(dbname, 'ai_agent_upstream_bytes_received_total', received, route=route)
+
+
+def drain(dbname, interval=0):
+    """
+    Returns and clears the measurements buffered for ``dbname``, or returns
+    nothing if they were last drained less than ``interval`` seconds ago.
+    """
+    now = time.monotonic()
+    with _lock:
+        if now - _last_flush.get(dbname, 0) < interval:
+            return {}
+        _last_flush[dbname] = now
+        return _buffers.pop(dbname, {})
+
+
+def restore(dbname, series):
+    """Puts back measurements that could not be flushed."""
+    with _lock:
+        _buffers[dbname].update(series)
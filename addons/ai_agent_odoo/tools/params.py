@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+Typed reads of the ``ai_agent_odoo.*`` system parameters.
+
+Parameters are edited by hand in the technical settings: a value that does
+not parse is logged and replaced by the default instead of failing every
+request that reads it. JSON values are parsed once per distinct value.
+"""
+import functools
+import json
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def _get_param(env, key):
+    return env['ir.config_parameter'].sudo().get_param(key)
+
+
+def _get_number(env, key, convert, default, minimum):
+    value = _get_param(env, key)
+    if value in (None, False, ''):
+        return default
+    try:
+        value = convert(value)
+    except (TypeError, ValueError):
+        _logger.warning("Invalid %s parameter: %r", key, value)
+        return default
+    return default if minimum is not None and value < minimum else value
+
+
+def get_int(env, key, default, minimum=None):
+    """Integer value of ``key``, or ``default`` if unset, invalid or below ``minimum``."""
+    return _get_number(env, key, int, default, minimum)
+
+
+def get_float(env, key, default, minimum=None):
+    """Float value of ``key``, or ``default`` if unset, invalid or below ``minimum``."""
+    return _get_number(env, key, float, default, minimum)
+
+
+def get_json(env, key, default='', convert=None):
+    """
+    Parsed JSON value of ``key`` (``default`` is the raw value when unset),
+    passed through ``convert`` if given. An invalid value gives ``{}``.
+    The result is cached and shared: callers must not modify it.
+    """
+    return _parse_json(key, _get_param(env, key) or default, convert)
+
+
+@functools.lru_cache(maxsize=32)
+def _parse_json(key, raw, convert):
+    try:
+        value = json.loads(raw) if raw else {}
+        return convert(value) if convert else value
+    except (ValueError, TypeError, AttributeError):
+        _logger.warning("Invalid %s parameter: %r", key, raw)
+        return {}
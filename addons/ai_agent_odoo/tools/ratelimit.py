@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Token buckets for admission control of agent requests."""
+import math
+import threading
+import time
+
+from werkzeug.exceptions import TooManyRequests
+
+
+class RateLimitExceeded(TooManyRequests):
+    """Raised when a request is rejected; carries the ``Retry-After`` delay."""
+
+    def __init__(self, scope, retry_after):
+        self.scope = scope
+        retry_after = max(1, math.ceil(retry_after))
+        super().__init__(
+            description="Too many AI Assistant requests, please retry in %s seconds." % retry_after,
+            retry_after=retry_after,
+        )
+
+
+def parse_limit(raw):
+    """
+    Parses a ``"<requests>/<seconds>"`` limit into the bucket capacity and its
+    refill rate in tokens per second, or returns ``None`` if it is disabled.
+    """
+    try:
+        requests, _sep, seconds = (raw or '').partition('/')
+        capacity, seconds = float(requests), float(seconds or 60)
+    except ValueError:
+        return None
+    if capacity <= 0 or seconds <= 0:
+        return None
+    return capacity, capacity / seconds
+
+
+class LocalBuckets:
+    """
+    In-process token buckets, used when Odoo runs as a single process and the
+    buckets need not be shared with other workers.
+    """
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, limits):
+        """
+        Takes one token from each bucket of ``limits``, a list of ``(key,
+        capacity, rate)``, or from none of them. Returns ``None`` when
+        admitted, else the key of the most constrained bucket and the seconds
+        until it has a token again.
+        """
+        now = time.monotonic()
+        with self._lock:
+            levels = {}
+            wait = None
+            for key, capacity, rate in limits:
+                tokens, refilled_at = self._buckets.get(key, (capacity, now))
+                tokens = min(capacity, tokens + (now - refilled_at) * rate) - 1
+                levels[key] = tokens
+                if tokens < 0 and (wait is None or -tokens / rate > wait[1]):
+                    wait = (key, -tokens / rate)
+            if wait:
+                return wait
+            for key, tokens in levels.items():
+                self._buckets[key] = (tokens, now)
+            return None
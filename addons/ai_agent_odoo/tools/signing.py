@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Short-lived signed tokens authorising the AI service to run ORM tools as the
+user of the current turn, instead of sending the user's password over.
+
+A token is ``<base64 payload>.<hmac>``, the HMAC being keyed on the database
+secret, so it is only valid for the database that issued it.
+"""
+import base64
+import json
+import time
+
+from odoo.tools.misc import consteq, hmac
+
+TOOL_TOKEN_SCOPE = 'ai_agent_odoo.tool'
+DEFAULT_TOOL_TOKEN_TTL = 900
+
+
+def sign_tool_token(env, ttl=DEFAULT_TOOL_TOKEN_TTL, message_id=None):
+    """
+    Returns a token for ``env``'s user and companies, valid for ``ttl`` seconds.
+    ``message_id`` is the user message of the turn the token is issued for.
+    """
+    payload = {
+        'db': env.cr.dbname,
+        'uid': env.uid,
+        'cids': env.companies.ids,
+        'mid': message_id,
+        'exp': int(time.time()) + ttl,
+    }
+    data = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+    return '%s.%s' % (data, hmac(env, TOOL_TOKEN_SCOPE, data))
+
+
+def verify_tool_token(env, token):
+    """
+    Returns the token's payload, or ``None`` if it is malformed, forged, issued
+    by another database or expired.
+    """
+    data, _sep, signature = (token or '').partition('.')
+    if not data or not signature or not consteq(signature, hmac(env, TOOL_TOKEN_SCOPE, data)):
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(data.encode()))
+    except ValueError:
+        return None
+    if payload.get('db') != env.cr.dbname or payload.get('exp', 0) < time.time():
+        return None
+    return payload
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+Offline token counting for budgeting prompts.
+
+A real tokenizer can be plugged in with :func:`register_tokenizer` (for instance
+``tiktoken`` when its encoding files are available locally); otherwise a fast
+heuristic close to BPE tokenizers on English and code is used.
+"""
+import re
+
+# Words, numbers and single punctuation characters.
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+# Average number of characters per token within a long word.
+_CHARS_PER_TOKEN = 4
+
+_tokenizer = None
+
+
+def register_tokenizer(tokenizer):
+    """
+    Uses ``tokenizer`` for all future counts. It must be a callable taking a
+    string and returning its number of tokens; pass ``None`` to go back to the
+    heuristic.
+    """
+    global _tokenizer
+    _tokenizer = tokenizer
+
+
+def estimate_tokens(text):
+    """Heuristic count: one token per punctuation mark, one per ~4 word characters."""
+    return sum(-(-len(piece) // _CHARS_PER_TOKEN) for piece in _TOKEN_RE.findall(text))
+
+
+def count_tokens(text):
+    """Returns the number of tokens of ``text`` with the registered tokenizer, if any."""
+    if not text:
+        return 0
+    if _tokenizer is not None:
+        return int(_tokenizer(text))
+    return estimate_tokens(text)
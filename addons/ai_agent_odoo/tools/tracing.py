@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Lightweight tracing of agent turns.
+
+A :class:`Trace` collects the spans of one process' part of a turn in memory;
+the ``ai.agent.trace`` model stores them once that part is over. The trace id
+crosses process boundaries in a W3C ``traceparent`` header: the gateway sends
+it to the AI service, which passes it back on its tool calls, and background
+jobs keep it, so every part of a turn lands in the same trace.
+"""
+import contextlib
+import contextvars
+import random
+import re
+import secrets
+import time
+
+_TRACEPARENT_RE = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+_current = contextvars.ContextVar('ai_agent_trace', default=None)
+
+
+def parse_traceparent(header):
+    """Returns ``(trace_id, parent_span_id, sampled)``, or ``None`` if ``header`` is invalid."""
+    match = _TRACEPARENT_RE.match((header or '').strip().lower())
+    if not match or match.group(1) == '0' * 32:
+        return None
+    return match.group(1), match.group(2), bool(int(match.group(3), 16) & 1)
+
+
+class Trace:
+    """
+    Spans of a turn recorded by this process. The trace opens a root span
+    named ``name``, which parents the spans opened without another open span,
+    and is closed by :meth:`finish`.
+
+    ``cr`` is the cursor whose queries are counted in each span; spans may
+    override it when the work moves to another cursor.
+    """
+
+    def __init__(self, name, traceparent=None, sample_rate=0.0, cr=None, start=None):
+        parent = parse_traceparent(traceparent)
+        if parent:
+            self.trace_id, parent_span_id, self.sampled = parent
+        else:
+            self.trace_id, parent_span_id = secrets.token_hex(16), None
+            # Head sampling: decided once, at the start of the turn.
+            self.sampled = random.random() < sample_rate
+        self.cr = cr
+        self.error = None
+        self.spans = []
+        # Set when the turn goes on after the code that opened the trace
+        # returns, e.g. in a streamed response, which then finishes it.
+        self.deferred = False
+        # Values of the trace record, such as the user and the conversation.
+        self.info = {}
+        self.root = self._new_span(name, parent_span_id, start=start)
+        self._stack = [self.root]
+
+    def _new_span(self, name, parent_id, start=None, **attributes):
+        return {
+            'span_id': secrets.token_hex(8),
+            'parent_id': parent_id,
+            'name': name,
+            'start': start or time.time(),
+            'duration': None,
+            'sql_count': None,
+            'attributes': attributes,
+        }
+
+    @property
+    def start(self):
+        return self.root['start']
+
+    @property
+    def duration(self):
+        return time.time() - self.start if self.root['duration'] is None else self.root['duration']
+
+    def traceparent(self):
+        """Header value propagating this trace, with the innermost open span as parent."""
+        return '00-%s-%s-%s' % (self.trace_id, self._stack[-1]['span_id'], '01' if self.sampled else '00')
+
+    @contextlib.contextmanager
+    def span(self, name, cr=None, **attributes):
+        """Records the ``with`` block as a child of the innermost open span."""
+        span = self._new_span(name, self._stack[-1]['span_id'], **attributes)
+        cr = cr or self.cr
+        sql_start = cr.sql_log_count if cr is not None else None
+        self._stack.append(span)
+        try:
+            yield span
+        except Exception as e:
+            span['attributes']['error'] = str(e)
+            raise
+        finally:
+            self._stack.remove(span)
+            span['duration'] = time.time() - span['start']
+            if sql_start is not None:
+                span['sql_count'] = cr.sql_log_count - sql_start
+            self.spans.append(span)
+
+    def add_span(self, name, start, end, **attributes):
+        """Records a span that was not timed by this process, such as time spent queued."""
+        span = self._new_span(name, self._stack[-1]['span_id'], start=start, **attributes)
+        span['duration'] = max(0.0, end - start)
+        self.spans.append(span)
+
+    def finish(self, error=None):
+        """Closes the root span; ``error`` marks the turn as failed."""
+        if self.root['duration'] is None:
+            self.root['duration'] = time.time() - self.start
+            if error:
+                self.error = self.root['attributes']['error'] = str(error)
+            self.spans.append(self.root)
+
+
+def current():
+    """The trace active in this context, if any."""
+    return _current.get()
+
+
+@contextlib.contextmanager
+def activate(trace):
+    """Makes ``trace`` the current one for the ``with`` block."""
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+@contextlib.contextmanager
+def span(name, cr=None, **attributes):
+    """Records a span in the current trace, if there is one."""
+    trace = current()
+    if trace is None:
+        yield None
+        return
+    with trace.span(name, cr=cr, **attributes) as span_:
+        yield span_
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Compares two reports of ``run.py``, typically before and after a change.
+
+    python benchmarks/compare.py baseline.json candidate.json --threshold 10
+
+Exits with status 1 if the candidate's p95 latency, time to first token or
+queries per request grew, or its throughput dropped, by more than
+``--threshold`` percent.
+"""
+import argparse
+import json
+import sys
+
+# (label, path in the report, whether higher is better, gated by --threshold)
+MEASURES = [
+    ("throughput (req/s)", ('throughput_rps',), True, True),
+    ("latency p50 (ms)", ('latency_ms', 'p50'), False, False),
+    ("latency p95 (ms)", ('latency_ms', 'p95'), False, True),
+    ("latency p99 (ms)", ('latency_ms', 'p99'), False, False),
+    ("first token p50 (ms)", ('first_token_ms', 'p50'), False, False),
+    ("first token p95 (ms)", ('first_token_ms', 'p95'), False, True),
+    ("rejected requests", ('requests', 'rejected'), False, False),
+    ("failed requests", ('requests', 'errors'), False, False),
+    ("busy workers (mean)", ('worker_occupancy', 'busy_mean'), False, False),
+    ("running jobs (mean)", ('worker_occupancy', 'jobs_running_mean'), False, False),
+    ("SQL queries per request", ('sql', 'per_request'), False, True),
+]
+
+
+def lookup(report, path):
+    for key in path:
+        report = report.get(key) if isinstance(report, dict) else None
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10, help="Allowed regression, in percent (default: 10)")
+    options = parser.parse_args()
+    with open(options.baseline) as file:
+        baseline = json.load(file)
+    with open(options.candidate) as file:
+        candidate = json.load(file)
+
+    print("%-26s %14s %14s %9s" % ("", baseline.get('revision') or 'baseline',
+                                   candidate.get('revision') or 'candidate', "change"))
+    regressions = []
+    for label, path, higher_is_better, gated in MEASURES:
+        before, after = lookup(baseline, path), lookup(candidate, path)
+        if before is None and after is None:
+            continue
+        change = ''
+        if before and after is not None:
+            delta = 100 * (after - before) / before
+            change = '%+.1f%%' % delta
+            regression = -delta if higher_is_better else delta
+            if gated and regression > options.threshold:
+                regressions.append(label)
+                change += ' !'
+        print("%-26s %14s %14s %9s" % (label, before, after, change))
+
+    if regressions:
+        print("\nRegressed by more than %s%%: %s" % (options.threshold, ', '.join(regressions)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
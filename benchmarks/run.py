@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+Load test of the AI Assistant's controller routes.
+
+Drives concurrent simulated users through ``/ai_agent_odoo/invoke`` or
+``/ai_agent_odoo/stream`` of a running Odoo server, or through background jobs
+(``--route invoke-async``), optionally against the local stub AI service
+started in-process, and reports throughput, latency percentiles, time to
+first token, Odoo worker occupancy and SQL query counts as JSON, for
+comparison between versions with ``compare.py``.
+
+    python benchmarks/run.py --url http://localhost:8069 --db odoo \\
+        --credentials admin:admin --users 20 --turns 10 --route stream \\
+        --start-stub --configure --latency 0.5 --tool-calls execute,resolve \\
+        --output results.json
+
+Server-side counters are read from the metrics route when ``--metrics-token``
+is given, and its gauges are sampled for the worker occupancy: the HTTP
+requests in flight, and the jobs running. Without it, the occupancy is
+estimated from PostgreSQL when ``--dsn`` is given (``pg_stat_activity``),
+which misses the workers waiting on the AI service between transactions.
+``pg_stat_statements`` gives the query count, if the extension is installed.
+"""
+import argparse
+import concurrent.futures
+import datetime
+import json
+import math
+import os
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+import requests
+
+import stub_service
+
+CSRF_RE = re.compile(r'csrf_token\s*:\s*"([^"]+)"')
+SAMPLE_RE = re.compile(r'^([a-zA-Z_:][\w:]*)(\{[^}]*\})?\s+(\S+)$')
+
+
+def percentiles(values):
+    """Nearest-rank p50/p95/p99 plus mean and max of ``values``, in ms."""
+    if not values:
+        return None
+    values = sorted(values)
+
+    def rank(p):
+        return round(values[max(0, math.ceil(p / 100 * len(values)) - 1)], 2)
+
+    return {
+        'p50': rank(50), 'p95': rank(95), 'p99': rank(99),
+        'mean': round(statistics.fmean(values), 2), 'max': round(values[-1], 2),
+    }
+
+
+class OdooClient:
+    """A logged-in browser session of one simulated user."""
+
+    def __init__(self, url, db, login, password, timeout):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.conversation_id = None
+        self._rpc('/web/session/authenticate', {'db': db, 'login': login, 'password': password})
+        # The streaming route is a plain HTTP POST and needs the CSRF token
+        # the web client is rendered with.
+        match = CSRF_RE.search(self.session.get(self.url + '/odoo', timeout=timeout).text)
+        self.csrf_token = match and match.group(1)
+
+    def _rpc(self, path, params):
+        response = self.session.post(
+            self.url + path, json={'jsonrpc': '2.0', 'method': 'call', 'params': params}, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        if 'error' in data:
+            raise RuntimeError(data['error'].get('data', {}).get('message') or data['error'].get('message'))
+        return data.get('result')
+
+    def set_param(self, key, value):
+        self._rpc('/web/dataset/call_kw', {
+            'model': 'ir.config_parameter', 'method': 'set_param', 'args': [key, value], 'kwargs': {},
+        })
+
+    def invoke(self, message):
+        """
+        Returns ``(status, first_token_seconds)``; status is ok, rejected or
+        error. The answer comes in one piece, so there is no first token.
+        """
+        response = self.session.post(self.url + '/ai_agent_odoo/invoke', json={
+            'jsonrpc': '2.0', 'method': 'call',
+            'params': {'conversation_id': self.conversation_id, 'message': message},
+        }, timeout=self.timeout)
+        data = response.json()
+        if 'error' in data:
+            return 'error', None
+        if data['result'].get('error') == 'rate_limited':
+            return 'rejected', None
+        self.conversation_id = data['result'].get('conversation_id')
+        return 'ok', None
+
+    def invoke_async(self, message, lane='interactive', poll_interval=0.2):
+        """
+        Runs the turn as a background job, and waits for it by polling its
+        state; answers are pushed over the bus, which this client doesn't
+        listen to. The latency includes the time spent in the queue.
+        """
+        response = self.session.post(self.url + '/ai_agent_odoo/invoke', json={
+            'jsonrpc': '2.0', 'method': 'call',
+            'params': {'conversation_id': self.conversation_id, 'message': message, 'async': True, 'lane': lane},
+        }, timeout=self.timeout)
+        data = response.json()
+        if 'error' in data:
+            return 'error', None
+        if data['result'].get('error') == 'rate_limited':
+            return 'rejected', None
+        self.conversation_id = data['result'].get('conversation_id')
+        job_id = data['result'].get('job_id')
+        if not job_id:
+            # Answered from the cache.
+            return 'ok', None
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            time.sleep(poll_interval)
+            [job] = self._rpc('/web/dataset/call_kw', {
+                'model': 'ai.agent.job', 'method': 'read', 'args': [[job_id], ['state']], 'kwargs': {},
+            })
+            if job['state'] in ('done', 'failed'):
+                return ('ok' if job['state'] == 'done' else 'error'), None
+        return 'error', None
+
+    def stream(self, message):
+        start = time.monotonic()
+        first_token = None
+        with self.session.post(
+            self.url + '/ai_agent_odoo/stream', params={'csrf_token': self.csrf_token},
+            json={'conversation_id': self.conversation_id, 'message': message},
+            headers={'Accept': 'text/event-stream'}, stream=True, timeout=self.timeout,
+        ) as response:
+            if response.status_code == 429:
+                return 'rejected', None
+            if not response.ok:
+                return 'error', None
+            event = 'message'
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith('event:'):
+                    event = line[6:].strip()
+                elif line.startswith('data:'):
+                    data = json.loads(line[5:])
+                    if event == 'conversation':
+                        self.conversation_id = data['conversation_id']
+                    elif event == 'error':
+                        return 'error', first_token
+                    elif event == 'done':
+                        return 'ok', first_token
+                    elif first_token is None and data.get('delta'):
+                        first_token = time.monotonic() - start
+                elif not line:
+                    event = 'message'
+        return 'error', first_token
+
+
+class Sampler:
+    """Samples a measurement at a regular interval, in a background thread."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+
+    def sample(self):
+        raise NotImplementedError
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.samples.append(self.sample())
+            except Exception:  # noqa: BLE001 - a missed sample must not end the run
+                pass
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+class MetricsSampler(Sampler):
+    """
+    Samples the server's gauges from the metrics route: the turn requests in
+    flight, which hold an HTTP worker each, and the jobs running on cron
+    workers. Each scrape is served by an HTTP worker too, but is not counted.
+    """
+
+    def __init__(self, url, token, timeout, interval):
+        super().__init__(interval)
+        self.url, self.token, self.timeout = url, token, timeout
+
+    def sample(self):
+        samples = scrape_metrics(self.url, self.token, self.timeout)
+        return {
+            'requests': sum(value for key, value in samples.items()
+                            if key.startswith('ai_agent_requests_in_flight')),
+            'jobs': sum(value for key, value in samples.items()
+                        if key.startswith('ai_agent_jobs{') and 'state="running"' in key),
+        }
+
+    def occupancy(self, workers):
+        requests_ = [sample['requests'] for sample in self.samples]
+        jobs = [sample['jobs'] for sample in self.samples]
+        busy = statistics.fmean(requests_)
+        return {
+            'source': 'metrics',
+            'busy_mean': round(busy, 2),
+            'busy_max': max(requests_),
+            'workers': workers,
+            'ratio': round(busy / workers, 3) if workers else None,
+            'jobs_running_mean': round(statistics.fmean(jobs), 2),
+            'jobs_running_max': max(jobs),
+            'samples': len(self.samples),
+        }
+
+
+class PostgresSampler(Sampler):
+    """
+    Samples busy Odoo backends and counts queries through PostgreSQL
+    statistics. A worker waiting on the AI service between two transactions
+    holds an idle backend and is not seen as busy.
+    """
+
+    def __init__(self, dsn, db, interval):
+        import psycopg2  # Odoo's own driver, only needed with --dsn
+        self.connection = psycopg2.connect(dsn)
+        self.connection.autocommit = True
+        self.db = db
+        super().__init__(interval)
+
+    def _query(self, query, params=()):
+        with self.connection.cursor() as cr:
+            cr.execute(query, params)
+            return cr.fetchone()
+
+    def query_count(self):
+        try:
+            return int(self._query("SELECT sum(calls) FROM pg_stat_statements")[0] or 0)
+        except Exception:  # noqa: BLE001 - the extension is optional
+            return None
+
+    def sample(self):
+        # A worker busy with a request holds a backend that is running a
+        # query or is idle in an open transaction.
+        return self._query("""
+            SELECT count(*) FROM pg_stat_activity
+             WHERE datname = %s AND pid != pg_backend_pid()
+               AND state IN ('active', 'idle in transaction')
+        """, (self.db,))[0]
+
+    def occupancy(self, workers):
+        busy = statistics.fmean(self.samples)
+        return {
+            'source': 'postgres',
+            'busy_mean': round(busy, 2),
+            'busy_max': max(self.samples),
+            'workers': workers,
+            'ratio': round(busy / workers, 3) if workers else None,
+            'samples': len(self.samples),
+        }
+
+
+def scrape_metrics(url, token, timeout):
+    """Returns the counters and histogram sums of the metrics route, keyed on the sample line."""
+    response = requests.get(url.rstrip('/') + '/ai_agent_odoo/metrics',
+                            headers={'Authorization': 'Bearer %s' % token}, timeout=timeout)
+    response.raise_for_status()
+    samples = {}
+    for line in response.text.splitlines():
+        match = SAMPLE_RE.match(line)
+        if match and not match.group(1).endswith('_bucket'):
+            samples[match.group(1) + (match.group(2) or '')] = float(match.group(3))
+    return samples
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'describe', '--always', '--dirty'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def simulate_user(client, options, results, lock, deadline):
+    prompt = options.prompt
+    for turn in range(options.turns):
+        if deadline and time.monotonic() > deadline:
+            return
+        # Unique prompts unless --repeat-prompt, so answers aren't served from the cache.
+        message = prompt if options.repeat_prompt else '%s (%s)' % (prompt, uuid.uuid4().hex[:8])
+        start = time.monotonic()
+        try:
+            if options.route == 'invoke-async':
+                status, first_token = client.invoke_async(message, options.lane, options.poll_interval)
+            else:
+                status, first_token = getattr(client, options.route)(message)
+        except (requests.RequestException, ValueError, RuntimeError):
+            status, first_token = 'error', None
+        record = {'status': status, 'latency': time.monotonic() - start, 'first_token': first_token}
+        with lock:
+            results.append(record)
+        if options.think_time:
+            time.sleep(options.think_time)
+
+
+def run(options):
+    stub = None
+    if options.start_stub:
+        stub = stub_service.start_in_thread(options)
+    credentials = [tuple(item.split(':', 1)) for item in options.credentials.split(',')]
+    clients = [
+        OdooClient(options.url, options.db, *credentials[index % len(credentials)], timeout=options.timeout)
+        for index in range(options.users)
+    ]
+    if options.configure:
+        stub_url = options.stub_url or 'http://%s:%s' % (options.stub_host, options.stub_port)
+        clients[0].set_param('ai_agent_odoo.service_url', stub_url)
+        clients[0].set_param('ai_agent_odoo.api_key', 'benchmark')
+
+    sampler = PostgresSampler(options.dsn, options.db, options.sample_interval) if options.dsn else None
+    metrics_sampler = MetricsSampler(
+        options.url, options.metrics_token, options.timeout, options.metrics_interval,
+    ) if options.metrics_token else None
+    metrics_before = scrape_metrics(options.url, options.metrics_token, options.timeout) \
+        if options.metrics_token else None
+    queries_before = sampler.query_count() if sampler else None
+    for item in (sampler, metrics_sampler):
+        if item:
+            item.start()
+
+    results, lock = [], threading.Lock()
+    started_at = datetime.datetime.now(datetime.timezone.utc)
+    start = time.monotonic()
+    deadline = start + options.duration if options.duration else None
+    with concurrent.futures.ThreadPoolExecutor(max_workers=options.users) as executor:
+        futures = [
+            executor.submit(simulate_user, client, options, results, lock, deadline) for client in clients
+        ]
+        for future in futures:
+            future.result()
+    elapsed = time.monotonic() - start
+
+    for item in (sampler, metrics_sampler):
+        if item:
+            item.stop()
+    queries_after = sampler.query_count() if sampler else None
+    metrics_after = scrape_metrics(options.url, options.metrics_token, options.timeout) \
+        if options.metrics_token else None
+
+    ok = [record for record in results if record['status'] == 'ok']
+    report = {
+        'version': 1,
+        'revision': git_revision(),
+        'started_at': started_at.isoformat(),
+        'config': {
+            key: value for key, value in vars(options).items()
+            if key not in ('credentials', 'dsn', 'metrics_token', 'output')
+        },
+        'duration_s': round(elapsed, 3),
+        'requests': {
+            'total': len(results),
+            'ok': len(ok),
+            'rejected': sum(record['status'] == 'rejected' for record in results),
+            'errors': sum(record['status'] == 'error' for record in results),
+        },
+        'throughput_rps': round(len(ok) / elapsed, 3) if elapsed else None,
+        'latency_ms': percentiles([record['latency'] * 1000 for record in ok]),
+        'first_token_ms': percentiles([record['first_token'] * 1000 for record in ok if record['first_token']]),
+        'worker_occupancy': None,
+        'sql': None,
+        'server_metrics': None,
+        'stub': stub.stats.as_dict() if stub else None,
+    }
+    occupancy_sampler = next((item for item in (metrics_sampler, sampler) if item and item.samples), None)
+    if occupancy_sampler:
+        report['worker_occupancy'] = occupancy_sampler.occupancy(options.workers)
+    if queries_before is not None and queries_after is not None:
+        queries = queries_after - queries_before
+        report['sql'] = {
+            'queries': queries,
+            'per_request': round(queries / len(results), 1) if results else None,
+        }
+    if metrics_before is not None:
+        report['server_metrics'] = {
+            key: round(value - metrics_before.get(key, 0), 6)
+            for key, value in sorted(metrics_after.items()) if value != metrics_before.get(key, 0)
+        }
+    if stub:
+        stub.shutdown()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    group = parser.add_argument_group('load')
+    group.add_argument('--url', default='http://localhost:8069', help="Odoo base URL")
+    group.add_argument('--db', required=True, help="Odoo database")
+    group.add_argument('--credentials', default='admin:admin',
+                       help="Comma-separated login:password pairs, assigned to the users in turn")
+    group.add_argument('--users', type=int, default=10, help="Concurrent simulated users (default: 10)")
+    group.add_argument('--turns', type=int, default=10, help="Turns per user (default: 10)")
+    group.add_argument('--duration', type=float, help="Stop starting new turns after this many seconds")
+    group.add_argument('--route', choices=['invoke', 'stream', 'invoke-async'], default='stream',
+                       help="invoke-async runs the turns as background jobs (default: stream)")
+    group.add_argument('--lane', choices=['interactive', 'batch'], default='interactive',
+                       help="Job lane of invoke-async turns (default: interactive)")
+    group.add_argument('--poll-interval', type=float, default=0.2,
+                       help="Seconds between the polls of a job's state, with invoke-async (default: 0.2)")
+    group.add_argument('--prompt', default="How many sale orders are waiting for delivery?")
+    group.add_argument('--repeat-prompt', action='store_true',
+                       help="Send the same prompt every turn, to measure the cache and request coalescing")
+    group.add_argument('--think-time', type=float, default=0, help="Pause between the turns of a user, in seconds")
+    group.add_argument('--timeout', type=float, default=300)
+    group.add_argument('--configure', action='store_true',
+                       help="Point ai_agent_odoo.service_url at the stub (the first login must be an administrator)")
+    group.add_argument('--start-stub', action='store_true', help="Run the stub AI service in this process")
+    group.add_argument('--stub-url', help="AI service URL set by --configure, if not the local stub's")
+    group = parser.add_argument_group('measurements')
+    group.add_argument('--dsn', help="PostgreSQL DSN to sample worker occupancy and query counts")
+    group.add_argument('--workers', type=int, help="Number of Odoo HTTP workers, for the occupancy ratio")
+    group.add_argument('--sample-interval', type=float, default=0.1)
+    group.add_argument('--metrics-token', help="Bearer token of the /ai_agent_odoo/metrics route")
+    group.add_argument('--metrics-interval', type=float, default=1,
+                       help="Seconds between the samples of the server's gauges (default: 1)")
+    group.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+    stub_service.add_arguments(parser)
+    options = parser.parse_args()
+
+    report = run(options)
+    output = json.dumps(report, indent=2)
+    if options.output:
+        with open(options.output, 'w') as file:
+            file.write(output + '\n')
+        summary = report['latency_ms'] or {}
+        print("%s ok / %s requests, %s req/s, p50 %s ms, p95 %s ms, p99 %s ms" % (
+            report['requests']['ok'], report['requests']['total'], report['throughput_rps'],
+            summary.get('p50'), summary.get('p95'), summary.get('p99')), file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
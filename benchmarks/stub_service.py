@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the AI service's ``/api/v1/agent/invoke`` endpoint.
+
+It answers after a configurable latency, streams its answer at a given token
+rate when asked for Server-Sent Events, and can call Odoo's tool routes back
+with the credentials it receives, like the real agent would.
+
+    python benchmarks/stub_service.py --stub-port 8765 --latency 0.5 --token-rate 50 --tool-calls execute,resolve
+
+Tool call patterns are comma-separated names among ``execute``, ``batch``,
+``search``, ``similar``, ``resolve``, ``fields_get`` and ``schema``, each
+optionally repeated with ``xN`` (``execute x3``).
+"""
+import argparse
+import json
+import random
+import re
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+INVOKE_PATH = '/api/v1/agent/invoke'
+WORDS = (
+    "the customer order invoice partner product quantity delivery total amount "
+    "pending confirmed draft posted stock warehouse price discount tax"
+).split()
+
+# JSON-RPC parameters of each tool call, and the credential key of its URL.
+TOOL_CALLS = {
+    'execute': ('tool_url', {
+        'model': 'res.partner', 'method': 'search_read',
+        'args': [[]], 'kwargs': {'fields': ['name', 'email'], 'limit': 20},
+    }),
+    'batch': ('tool_batch_url', {'calls': [
+        {'model': 'res.partner', 'method': 'search', 'args': [[]], 'kwargs': {'limit': 10}},
+        {'model': 'res.partner', 'method': 'read', 'args': [{'$ref': 0}, ['name']]},
+    ]}),
+    'search': ('tool_search_url', {'query': 'order', 'limit': 10}),
+    'similar': ('tool_similar_url', {'query': 'late delivery', 'limit': 5}),
+    'resolve': ('tool_resolve_url', {'query': 'azure', 'limit': 5}),
+    'fields_get': ('fields_get_url', {'models': ['res.partner', 'sale.order']}),
+    'schema': ('schema_url', None),
+}
+
+
+def parse_tool_calls(spec):
+    """Expands ``"execute x2,resolve"`` into ``['execute', 'execute', 'resolve']``."""
+    calls = []
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        match = re.match(r'^([a-z_]+?)\s*(?:x\s*(\d+))?$', item)
+        if not match or match.group(1) not in TOOL_CALLS:
+            raise ValueError("Unknown tool call %r, expected one of %s" % (item, ', '.join(TOOL_CALLS)))
+        calls.extend([match.group(1)] * int(match.group(2) or 1))
+    return calls
+
+
+class StubStats:
+    """Thread-safe counters of what the stub did, for the benchmark report."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.invocations = 0
+        self.streamed = 0
+        self.tool_calls = 0
+        self.tool_errors = 0
+        self.tool_call_ms = []
+
+    def record_invocation(self, streamed):
+        with self._lock:
+            self.invocations += 1
+            self.streamed += int(streamed)
+
+    def record_tool_call(self, duration, ok):
+        with self._lock:
+            self.tool_calls += 1
+            self.tool_errors += int(not ok)
+            self.tool_call_ms.append(duration * 1000)
+
+    def as_dict(self):
+        with self._lock:
+            timings = sorted(self.tool_call_ms)
+            return {
+                'invocations': self.invocations,
+                'streamed': self.streamed,
+                'tool_calls': self.tool_calls,
+                'tool_errors': self.tool_errors,
+                'tool_call_ms': {
+                    'mean': round(statistics.fmean(timings), 2) if timings else None,
+                    'p95': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2) if timings else None,
+                },
+            }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'AIAgentStub/1.0'
+
+    def log_message(self, format, *args):
+        if self.server.options.verbose:
+            super().log_message(format, *args)
+
+    def do_POST(self):
+        if self.path != INVOKE_PATH:
+            self._send_json(404, {'detail': 'Not Found'})
+            return
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        options = self.server.options
+        streamed = bool(payload.get('stream')) or 'text/event-stream' in self.headers.get('Accept', '')
+        self.server.stats.record_invocation(streamed)
+
+        time.sleep(max(0.0, random.gauss(options.latency, options.latency_jitter)))
+        self._call_tools(payload.get('odoo_credentials') or {})
+        tokens = ['%s ' % random.choice(WORDS) for _i in range(options.tokens)]
+        if not streamed:
+            time.sleep(options.tokens / options.token_rate if options.token_rate else 0)
+            self._send_json(200, {'response': ''.join(tokens).strip()})
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        interval = 1 / options.token_rate if options.token_rate else 0
+        for token in tokens:
+            self._write_chunk(b'data: %s\n\n' % json.dumps({'delta': token}).encode())
+            time.sleep(interval)
+        self._write_chunk(b'data: [DONE]\n\n')
+        self._write_chunk(b'')
+
+    def _call_tools(self, credentials):
+        """Calls Odoo back through its tool routes, as the agent would."""
+        headers = {'Authorization': 'Bearer %s' % credentials.get('tool_token', '')}
+        if credentials.get('db'):
+            headers['X-Odoo-Database'] = credentials['db']
+        if self.headers.get('traceparent'):
+            headers['traceparent'] = self.headers['traceparent']
+        for name in self.server.tool_calls:
+            url_key, params = TOOL_CALLS[name]
+            url = credentials.get(url_key)
+            if not url:
+                continue
+            start = time.monotonic()
+            try:
+                if params is None:
+                    response = requests.get(url, headers=headers, timeout=30)
+                    ok = response.ok
+                else:
+                    response = requests.post(
+                        url, json={'jsonrpc': '2.0', 'method': 'call', 'params': params}, headers=headers, timeout=30)
+                    ok = response.ok and 'error' not in response.json()
+            except (requests.RequestException, ValueError):
+                ok = False
+            self.server.stats.record_tool_call(time.monotonic() - start, ok)
+
+    def _write_chunk(self, data):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def _send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def add_arguments(parser):
+    group = parser.add_argument_group('stub AI service')
+    group.add_argument('--stub-host', default='127.0.0.1')
+    group.add_argument('--stub-port', type=int, default=8765)
+    group.add_argument('--latency', type=float, default=0.5, help="Seconds before the first token (default: 0.5)")
+    group.add_argument('--latency-jitter', type=float, default=0.05, help="Standard deviation of the latency")
+    group.add_argument('--tokens', type=int, default=60, help="Tokens per answer (default: 60)")
+    group.add_argument('--token-rate', type=float, default=50, help="Tokens streamed per second (default: 50)")
+    group.add_argument('--tool-calls', default='', help="Tool calls made per turn, e.g. 'execute x2,resolve'")
+    group.add_argument('--verbose', action='store_true', help="Log every request the stub receives")
+
+
+def make_server(options):
+    server = ThreadingHTTPServer((options.stub_host, options.stub_port), StubHandler)
+    server.daemon_threads = True
+    server.options = options
+    server.tool_calls = parse_tool_calls(options.tool_calls)
+    server.stats = StubStats()
+    return server
+
+
+def start_in_thread(options):
+    """Starts the stub in a background thread and returns its server."""
+    server = make_server(options)
+    threading.Thread(target=server.serve_forever, name='ai-agent-stub', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    options = parser.parse_args()
+    server = make_server(options)
+    print("Stub AI service listening on http://%s:%s%s" % (options.stub_host, options.stub_port, INVOKE_PATH))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(server.stats.as_dict(), indent=2))
+
+
+if __name__ == '__main__':
+    main()